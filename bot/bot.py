@@ -6,6 +6,7 @@ from pydis_core.utils import scheduling
 from pydis_core.utils.logging import get_logger
 
 from bot import constants, exts
+from bot.utils.render import render_service
 
 log = get_logger(__name__)
 
@@ -58,6 +59,11 @@ class Bot(BotBase):
         # wait_until_guild_available in their cog_load method.
         scheduling.create_task(self.load_extensions(exts))
 
+    async def close(self) -> None:
+        """Shut down the render process pool along with the bot."""
+        render_service.shutdown()
+        await super().close()
+
     async def invoke_help_command(self, ctx: commands.Context) -> None:
         """Invoke the help command or default help command if help extensions is not loaded."""
         if "bot.exts.core.help" in ctx.bot.extensions:
@@ -1,5 +1,6 @@
 import enum
 from os import environ
+from pathlib import Path
 from types import MappingProxyType
 
 from pydantic import SecretStr
@@ -14,6 +15,7 @@ __all__ = (
     "PYTHON_PREFIX",
     "STAFF_ROLES",
     "WHITELISTED_CHANNELS",
+    "AvatarCache",
     "Categories",
     "Channels",
     "Client",
@@ -24,6 +26,7 @@ __all__ = (
     "Month",
     "Reddit",
     "Redis",
+    "Render",
     "Roles",
     "Tokens",
     "Wolfram",
@@ -295,6 +298,26 @@ class _Redis(EnvConfig, env_prefix="redis_"):
 Redis = _Redis()
 
 
+class _Render(EnvConfig, env_prefix="render_"):
+    max_workers: int = 2
+    max_queue: int = 8
+    # Per-job timeout, in seconds
+    timeout: float = 30
+
+
+Render = _Render()
+
+
+class _AvatarCache(EnvConfig, env_prefix="avatar_cache_"):
+    # Where avatar effect results evicted from memory are kept, or None to drop them
+    directory: Path | None = None
+    # Upper bound on the results kept on disk, in bytes
+    spill_size: int = 256 * 1024 ** 2
+
+
+AvatarCache = _AvatarCache()
+
+
 class _Reddit(EnvConfig, env_prefix="reddit_"):
     subreddits: tuple[str, ...] = ("r/Python",)
 
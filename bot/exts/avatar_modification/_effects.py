@@ -1,65 +1,215 @@
+import functools
 import math
-import random
-from collections.abc import Callable
+import time
+from collections.abc import Callable, Iterator
 from io import BytesIO
-from pathlib import Path
 
-import discord
-from PIL import Image, ImageDraw, ImageOps
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps, ImageSequence
 
 from bot.constants import Colours
+from bot.utils.assets import open_asset, resized_asset
+from bot.utils.image_encoding import encode_image
+
+# Caps for animated avatars, anything past these is cut off
+MAX_FRAMES = 120
+MAX_DURATION = 10_000  # milliseconds
+DEFAULT_FRAME_DURATION = 100  # milliseconds, for frames which don't specify their own
+
+# The size animated results must stay under, in bytes, leaving room under Discord's 10 MiB upload limit
+MAX_GIF_BYTES = 8 * 1024 ** 2
+# The smallest animated results are scaled down to, past which frames are dropped instead
+MIN_GIF_SIZE = 128
+
+# The palette index reserved for transparent pixels in GIF frames
+GIF_TRANSPARENT_INDEX = 255
+
+
+def _build_easter_lut() -> np.ndarray:
+    """
+    Build a lookup table from every 6-bit posterized RGB colour to its "easterified" colour.
+
+    The easterified colour is the half-way RGB value between the original colour and the closest
+    "easter" colour to it, by squared euclidean distance. Ties go to the first colour in
+    `Colours.easter_like_colours`.
+
+    The table is indexed by each channel shifted right by 2, giving an array of shape (64, 64, 64, 3).
+    """
+    levels = np.arange(0, 256, 4, dtype=np.int32)
+    rgb = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1)
+    easter_colours = np.array(Colours.easter_like_colours, dtype=np.int32)
+
+    distances = ((rgb[..., np.newaxis, :] - easter_colours) ** 2).sum(axis=-1)
+    closest_colours = easter_colours[distances.argmin(axis=-1)]
+    return ((rgb + closest_colours) // 2).astype(np.uint8)
+
+
+EASTER_LUT = _build_easter_lut()
 
 
 class PfpEffects:
     """
     Implements various image modifying effects, for the PfpModify cog.
 
-    All of these functions are slow, and blocking, so they should be ran in executors.
+    All of these functions are slow, and blocking, so they should be submitted to the render service.
     """
 
     @staticmethod
-    def apply_effect(image_bytes: bytes, effect: Callable, filename: str, *args) -> discord.File:
-        """Applies the given effect to the image passed to it."""
+    def open_image(image_bytes: bytes) -> Image.Image:
+        """Decodes the given image, and resizes it to the 1024x1024 RGBA image the effects work on."""
         im = Image.open(BytesIO(image_bytes))
         im = im.convert("RGBA")
-        im = im.resize((1024, 1024))
-        im = effect(im, *args)
+        return im.resize((1024, 1024))
 
-        bufferedio = BytesIO()
-        im.save(bufferedio, format="PNG")
-        bufferedio.seek(0)
+    @staticmethod
+    def open_frames(image_bytes: bytes) -> Iterator[Image.Image]:
+        """
+        Decodes the frames of an animated image one at a time, resizing them like `open_image`.
+
+        Stops after `MAX_FRAMES` frames or `MAX_DURATION` milliseconds, whichever comes first.
+        Each frame keeps only its duration in its `info` dict.
+        """
+        im = Image.open(BytesIO(image_bytes))
+        elapsed = 0
+        for index, frame in enumerate(ImageSequence.Iterator(im)):
+            if index >= MAX_FRAMES or elapsed >= MAX_DURATION:
+                break
+
+            duration = frame.info.get("duration") or DEFAULT_FRAME_DURATION
+            elapsed += duration
+
+            frame = frame.convert("RGBA").resize((1024, 1024))
+            # Drop the source's palette-specific metadata, such as the background index, which no longer applies.
+            frame.info = {"duration": duration}
+            yield frame
 
-        return discord.File(bufferedio, filename=filename)
+    @staticmethod
+    def run_effects(image: Image.Image, effects: list[tuple[Callable, tuple]], timings: list[float]) -> Image.Image:
+        """Applies each of the given (effect, args) pairs in turn to `image`, adding how long each took to `timings`."""
+        for index, (effect, args) in enumerate(effects):
+            start = time.perf_counter()
+            if image.mode != "RGBA":
+                # Some effects return other modes, but they all expect to be given an RGBA image.
+                image = image.convert("RGBA")
+            image = effect(image, *args)
+            timings[index] += time.perf_counter() - start
+        return image
 
     @staticmethod
-    def closest(x: tuple[int, int, int]) -> tuple[int, int, int]:
+    def apply_effects(
+        image: Image.Image,
+        effects: list[tuple[Callable, tuple]],
+    ) -> tuple[bytes, list[tuple[str, float]]]:
         """
-        Finds the closest "easter" colour to a given pixel.
+        Applies each of the given effects in turn to an image from `open_image`, encoding only the final result.
 
-        Returns a merge between the original colour and the closest colour.
+        `effects` is a list of (effect, args) pairs.
+        Returns the encoded image, along with the name and duration in seconds of every stage.
         """
-        r1, g1, b1 = x
+        timings = [0.0] * len(effects)
+        image = PfpEffects.run_effects(image, effects, timings)
+
+        start = time.perf_counter()
+        encoded = encode_image(image)
+        encode_time = time.perf_counter() - start
 
-        def distance(point: tuple[int, int, int]) -> int:
-            """Finds the difference between a pastel colour and the original pixel colour."""
-            r2, g2, b2 = point
-            return (r1 - r2) ** 2 + (g1 - g2) ** 2 + (b1 - b2) ** 2
+        names = (effect.__name__ for effect, _ in effects)
+        return encoded, [*zip(names, timings, strict=True), ("encode", encode_time)]
 
-        closest_colours = sorted(Colours.easter_like_colours, key=distance)
-        r2, g2, b2 = closest_colours[0]
-        r = (r1 + r2) // 2
-        g = (g1 + g2) // 2
-        b = (b1 + b2) // 2
+    @staticmethod
+    def to_gif_frame(image: Image.Image) -> Image.Image:
+        """
+        Converts an RGBA image to a palette image for a GIF, with the last palette index as the transparent colour.
 
-        return r, g, b
+        GIFs only support fully transparent or fully opaque pixels, so the alpha channel is thresholded at half.
+        Fast octree quantization is used as it's many times quicker than median cut on busy frames, for a barely visible
+        difference.
+        """
+        frame = image.convert("RGB").quantize(GIF_TRANSPARENT_INDEX, method=Image.Quantize.FASTOCTREE)
+        frame.paste(GIF_TRANSPARENT_INDEX, mask=image.getchannel("A").point(lambda alpha: 255 if alpha < 128 else 0))
+        frame.info["transparency"] = GIF_TRANSPARENT_INDEX
+        return frame
+
+    @staticmethod
+    def drop_frames(frames: list[Image.Image]) -> list[Image.Image]:
+        """Drops every other frame of an animation, adding their durations to the frames before them."""
+        kept = frames[::2]
+        for frame, dropped in zip(kept, frames[1::2], strict=False):
+            frame.info["duration"] += dropped.info["duration"]
+        return kept
+
+    @staticmethod
+    def encode_gif(frames: list[Image.Image]) -> bytes:
+        """Encodes frames from `to_gif_frame` as a looping GIF, using each frame's own duration."""
+        buffer = BytesIO()
+        frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], loop=0, disposal=2)
+        return buffer.getvalue()
+
+    @staticmethod
+    def apply_effects_animated(
+        image_bytes: bytes,
+        effects: list[tuple[Callable, tuple]],
+    ) -> tuple[bytes, list[tuple[str, float]]]:
+        """
+        Applies each of the given effects in turn to every frame of an animated image, encoding the result as a GIF.
+
+        The frames are streamed through the effects one at a time, and scaled down before being quantized, so only
+        the palette frames are held in memory. Static assets such as the pride rings are memoised, so they're shared
+        by every frame.
+
+        The GIF is kept within `MAX_GIF_BYTES`, by halving its size down to `MIN_GIF_SIZE` and then dropping every
+        other frame until it fits.
+
+        Returns the encoded GIF, along with the name and total duration in seconds of every stage across all frames.
+        """
+        frame_count = min(Image.open(BytesIO(image_bytes)).n_frames, MAX_FRAMES)
+        # Palette frames take about a byte per pixel once encoded, at worst, so start from the largest size which
+        # could fit rather than spending time on frames which are bound to be too big.
+        size = 1024
+        while size > MIN_GIF_SIZE and frame_count * size * size > MAX_GIF_BYTES:
+            size //= 2
+
+        timings = [0.0] * len(effects)
+        start = time.perf_counter()
+        frames = []
+        for frame in PfpEffects.open_frames(image_bytes):
+            duration = frame.info["duration"]
+            frame = PfpEffects.run_effects(frame, effects, timings).convert("RGBA")
+            if frame.size != (size, size):
+                frame = frame.resize((size, size))
+            frame = PfpEffects.to_gif_frame(frame)
+            frame.info["duration"] = duration
+            frames.append(frame)
+
+        encoded = PfpEffects.encode_gif(frames)
+        while len(encoded) > MAX_GIF_BYTES and (size > MIN_GIF_SIZE or len(frames) > 1):
+            if size > MIN_GIF_SIZE:
+                # Palette images are resized by nearest neighbour, which keeps their palette and transparent index.
+                size //= 2
+                frames = [frame.resize((size, size)) for frame in frames]
+            else:
+                frames = PfpEffects.drop_frames(frames)
+            encoded = PfpEffects.encode_gif(frames)
+        encode_time = time.perf_counter() - start - sum(timings)
+
+        return (
+            encoded,
+            [*zip((effect.__name__ for effect, _ in effects), timings, strict=True), ("encode", encode_time)]
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def circle_mask(size: tuple[int, int]) -> Image.Image:
+        """Returns a circular mask of the given size, memoised as every avatar uses the same one."""
+        mask = Image.new("L", size, 0)
+        draw = ImageDraw.Draw(mask)
+        draw.ellipse((0, 0) + size, fill=255)
+        return mask
 
     @staticmethod
     def crop_avatar_circle(avatar: Image.Image) -> Image.Image:
         """Crop the avatar given into a circle."""
-        mask = Image.new("L", avatar.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0) + avatar.size, fill=255)
-        avatar.putalpha(mask)
+        avatar.putalpha(PfpEffects.circle_mask(avatar.size))
         return avatar
 
     @staticmethod
@@ -72,16 +222,22 @@ class PfpEffects:
         ring.putalpha(mask)
         return ring
 
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def pride_ring(flag: str, pixels: int) -> Image.Image:
+        """
+        Returns the ring of the given flag and thickness, ready to be composited over an avatar.
+
+        The most recently used rings are memoised, so the result must never be modified in place.
+        """
+        ring = resized_asset(f"holidays/pride/flags/{flag}.png", (1024, 1024), "RGBA").copy()
+        return PfpEffects.crop_ring(ring, pixels)
+
     @staticmethod
     def pridify_effect(image: Image.Image, pixels: int, flag: str) -> Image.Image:
         """Applies the given pride effect to the given image."""
         image = PfpEffects.crop_avatar_circle(image)
-
-        ring = Image.open(Path(f"bot/resources/holidays/pride/flags/{flag}.png")).resize((1024, 1024))
-        ring = ring.convert("RGBA")
-        ring = PfpEffects.crop_ring(ring, pixels)
-
-        image.alpha_composite(ring, (0, 0))
+        image.alpha_composite(PfpEffects.pride_ring(flag, pixels), (0, 0))
         return image
 
     @staticmethod
@@ -125,163 +281,20 @@ class PfpEffects:
             ))
             overlay_image = overlay_image.convert("RGBA")
         else:
-            overlay_image = Image.open(Path("bot/resources/holidays/easter/chocolate_bunny.png"))
-
-        alpha = image.getchannel("A").getdata()
-        image = image.convert("RGB")
-        image = ImageOps.posterize(image, 6)
-
-        data = image.getdata()
-        data_set = set(data)
-        easterified_data_set = {}
-
-        for x in data_set:
-            easterified_data_set[x] = PfpEffects.closest(x)
-        new_pixel_data = [
-            (*easterified_data_set[x], alpha[i])
-            if x in easterified_data_set else x
-            for i, x in enumerate(data)
-        ]
-
-        im = Image.new("RGBA", image.size)
-        im.putdata(new_pixel_data)
+            overlay_image = open_asset("holidays/easter/chocolate_bunny.png")
+
+        alpha = np.asarray(image.getchannel("A"))
+        # Posterizing to 6 bits is the same as dropping the bottom 2 bits, which gives the LUT index directly.
+        rgb = np.asarray(image.convert("RGB")) >> 2
+        easterified = EASTER_LUT[rgb[..., 0], rgb[..., 1], rgb[..., 2]]
+
+        im = Image.fromarray(np.dstack((easterified, alpha)), "RGBA")
         im.alpha_composite(
             overlay_image,
             (im.width - overlay_image.width, (im.height - overlay_image.height) // 2)
         )
         return im
 
-    @staticmethod
-    def split_image(img: Image.Image, squares: int) -> list:
-        """
-        Split an image into a selection of squares, specified by the squares argument.
-
-        Explanation:
-
-        1. It gets the width and the height of the Image passed to the function.
-
-        2. It gets the root of a number of squares (number of squares) passed, which is called xy. Reason: if let's say
-        25 squares (number of squares) were passed, that is the total squares (split pieces) that the image is supposed
-        to be split into. As it is known, a 2D shape has a height and a width, and in this case the program thinks of it
-        as rows and columns. Rows multiplied by columns is equal to the passed squares (number of squares). To get rows
-        and columns, since in this case, each square (split piece) is identical, rows are equal to columns and the
-        program treats the image as a square-shaped, it gets the root out of the squares (number of squares) passed.
-
-        3. Now width and height are both of the original Image, Discord PFP, so when it comes to forming the squares,
-        the program divides the original image's height and width by the xy. In a case of 25 squares (number of squares)
-        passed, xy would be 5, so if an image was 250x300, x_frac would be 50 and y_frac - 60. Note:
-        x_frac stands for a fracture of width. The reason it's called that is because it is shorter to use x for width
-        in mind and then it's just half of the word fracture, same applies to y_frac, just height instead of width.
-        x_frac and y_frac are width and height of a single square (split piece).
-
-        4. With left, top, right, bottom, = 0, 0, x_frac, y_frac, the program sets these variables to create the initial
-        square (split piece). Explanation: all of these 4 variables start at the top left corner of the Image, by adding
-        value to right and bottom, it's creating the initial square (split piece).
-
-        5. In the for loop, it keeps adding those squares (split pieces) in a row and once (index + 1) % xy == 0 is
-        True, it adds to top and bottom to lower them and reset right and left to recreate the initial space between
-        them, forming a square (split piece), it also adds the newly created square (split piece) into the new_imgs list
-        where it stores them. The program keeps repeating this process till all 25 squares get added to the list.
-
-        6. It returns new_imgs, a list of squares (split pieces).
-        """
-        width, heigth = img.size
-
-        xy = math.sqrt(squares)
-
-        x_frac = width // xy
-        y_frac = heigth // xy
-
-        left, top, right, bottom, = 0, 0, x_frac, y_frac
-
-        new_imgs = []
-
-        for index in range(squares):
-            new_img = img.crop((left, top, right, bottom))
-            new_imgs.append(new_img)
-
-            if (index + 1) % xy == 0:
-                top += y_frac
-                bottom += y_frac
-                left = 0
-                right = x_frac
-            else:
-                left += x_frac
-                right += x_frac
-
-        return new_imgs
-
-    @staticmethod
-    def join_images(images: list[Image.Image]) -> Image.Image:
-        """
-        Stitches all the image squares into a new image.
-
-        Explanation:
-
-        1. Shuffles the passed images to randomize the pieces.
-
-        2. The program gets a single square (split piece) out of the list and defines single_width as the square's width
-        and single_height as the square's height.
-
-        3. It gets the root of type integer of the number of images (split pieces) in the list and calls it multiplier.
-        Program then proceeds to calculate total height and width of the new image that it's creating using the same
-        multiplier.
-
-        4. The program then defines new_image as the image that it's creating, using the previously obtained total_width
-        and total_height.
-
-        5. Now it defines width_multiplier as well as height with values of 0. These will be used to correctly position
-        squares (split pieces) onto the new_image canvas.
-
-        6. Similar to how in the split_image function, the program gets the root of number of images in the list.
-        In split_image function, it was the passed squares (number of squares) instead of a number of imgs in the
-        list that it got the square of here.
-
-        7. In the for loop, as it iterates, the program multiplies single_width by width_multiplier to correctly
-        position a square (split piece) width wise. It then proceeds to paste the newly positioned square (split piece)
-        onto the new_image. The program increases the width_multiplier by 1 every iteration so the image wouldn't get
-        pasted in the same spot and the positioning would move accordingly. It makes sure to increase the
-        width_multiplier before the check, which checks if the end of a row has been reached, -
-        (index + 1) % pieces == 0, so after it, if it was True, width_multiplier would have been reset to 0 (start of
-        the row). If the check returns True, the height gets increased by a single square's (split piece) height to
-        lower the positioning height wise and, as mentioned, the width_multiplier gets reset to 0 and width will
-        then be calculated from the start of the new row. The for loop finishes once all the squares (split pieces) were
-        positioned accordingly.
-
-        8. Finally, it returns the new_image, the randomized squares (split pieces) stitched back into the format of the
-        original image - user's PFP.
-        """
-        random.shuffle(images)
-        single_img = images[0]
-
-        single_wdith = single_img.size[0]
-        single_height = single_img.size[1]
-
-        multiplier = int(math.sqrt(len(images)))
-
-        total_width = multiplier * single_wdith
-        total_height = multiplier * single_height
-
-        new_image = Image.new("RGBA", (total_width, total_height), (250, 250, 250))
-
-        width_multiplier = 0
-        height = 0
-
-        squares = math.sqrt(len(images))
-
-        for index, image in enumerate(images):
-            width = single_wdith * width_multiplier
-
-            new_image.paste(image, (width, height))
-
-            width_multiplier += 1
-
-            if (index + 1) % squares == 0:
-                width_multiplier = 0
-                height += single_height
-
-        return new_image
-
     @staticmethod
     def mosaic_effect(image: Image.Image, squares: int) -> Image.Image:
         """
@@ -289,8 +302,34 @@ class PfpEffects:
 
         The "squares" argument specifies the number of squares to split
         the image into. This should be a square number.
+
+        The image is viewed as a grid of tiles, which are shuffled with a single array permutation.
+        If its sides don't divide evenly into the grid, the leftover pixels are cropped from its edges,
+        and images with fewer pixels than the grid are scaled up to one pixel per tile.
         """
-        img_squares = PfpEffects.split_image(image, squares)
-        new_img = PfpEffects.join_images(img_squares)
+        side = math.isqrt(squares)
+        image = image.convert("RGBA")
+        if min(image.size) < side:
+            image = image.resize((max(image.width, side), max(image.height, side)))
+
+        tile_width, tile_height = image.width // side, image.height // side
+        left, top = image.width % side // 2, image.height % side // 2
+        if image.size != (tile_width * side, tile_height * side):
+            image = image.crop((left, top, left + tile_width * side, top + tile_height * side))
+
+        # (rows, tile_height, columns, tile_width, channels) -> (tiles, tile_height, tile_width, channels)
+        tiles = (
+            np.asarray(image)
+            .reshape(side, tile_height, side, tile_width, 4)
+            .swapaxes(1, 2)
+            .reshape(side * side, tile_height, tile_width, 4)
+        )
+        tiles = tiles[np.random.permutation(side * side)]
 
-        return new_img
+        pixels = (
+            tiles
+            .reshape(side, side, tile_height, tile_width, 4)
+            .swapaxes(1, 2)
+            .reshape(side * tile_height, side * tile_width, 4)
+        )
+        return Image.fromarray(pixels, "RGBA")
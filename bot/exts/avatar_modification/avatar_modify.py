@@ -1,49 +1,56 @@
-import asyncio
 import json
 import math
 import string
+import time
 import unicodedata
 from collections.abc import Callable
-from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from typing import TypeVar
 
 import discord
+from PIL import Image
 from discord.ext import commands
 from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
-from bot.constants import Colours, Emojis
+from bot.constants import AvatarCache, Client, Colours, Emojis
 from bot.exts.avatar_modification._effects import PfpEffects
+from bot.utils.caching import LRUCache, image_size
 from bot.utils.halloween import spookifications
+from bot.utils.image_encoding import image_extension
+from bot.utils.render import render_service
 
 log = get_logger(__name__)
 
-_EXECUTOR = ThreadPoolExecutor(10)
-
-FILENAME_STRING = "{effect}_{author}.png"
+FILENAME_STRING = "{effect}_{author}"
 
 MAX_SQUARES = 10_000
 
-T = TypeVar("T")
+# Decoded and resized avatars, shared between effects
+SOURCE_CACHE_SIZE = 64 * 1024 ** 2
+# Encoded effect results, optionally spilling over to disk as configured in `AvatarCache`
+RESULT_CACHE_SIZE = 32 * 1024 ** 2
 
 GENDER_OPTIONS = json.loads(Path("bot/resources/holidays/pride/gender_options.json").read_text("utf8"))
 
+MAX_CHAIN_LENGTH = 5
 
-async def in_executor(func: Callable[..., T], *args) -> T:
-    """
-    Runs the given synchronous function `func` in an executor.
+# Effects which can be used in the chain command, with their default arguments
+CHAIN_EFFECTS = {
+    "8bitify": (PfpEffects.eight_bitify_effect, ()),
+    "reverse": (PfpEffects.flip_effect, ()),
+    "easterify": (PfpEffects.easterify_effect, ()),
+    "pride": (PfpEffects.pridify_effect, (64, GENDER_OPTIONS["lgbt"])),
+    "spookify": (spookifications.get_random_effect, ()),
+    "mosaic": (PfpEffects.mosaic_effect, (16,)),
+}
 
-    This is useful for running slow, blocking code within async
-    functions, so that they don't block the bot.
-    """
-    log.trace(f"Running {func.__name__} in an executor.")
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(_EXECUTOR, func, *args)
+# Effects with random output, which can't be cached or animated
+RANDOM_EFFECTS = {spookifications.get_random_effect, PfpEffects.mosaic_effect}
 
 
 def file_safe_name(effect: str, display_name: str) -> str:
-    """Returns a file safe filename based on the given effect and display name."""
+    """Returns a file safe filename, without an extension, based on the given effect and display name."""
     valid_filename_chars = f"-_. {string.ascii_letters}{string.digits}"
 
     file_name = FILENAME_STRING.format(effect=effect, author=display_name)
@@ -64,6 +71,12 @@ class AvatarModify(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
+        self.sources: LRUCache[tuple, Image.Image] = LRUCache(SOURCE_CACHE_SIZE, sizeof=image_size)
+        self.results: LRUCache[tuple, bytes] = LRUCache(
+            RESULT_CACHE_SIZE,
+            spill_directory=AvatarCache.directory,
+            max_spill_size=AvatarCache.spill_size,
+        )
 
     async def _fetch_user(self, user_id: int) -> discord.User | None:
         """
@@ -85,6 +98,85 @@ class AvatarModify(commands.Cog):
 
         return user
 
+    async def _apply_effects(
+        self,
+        user: discord.User,
+        file_name: str,
+        effects: list[tuple[Callable, tuple]],
+        *,
+        size: int = 1024,
+        cacheable: bool = True,
+        animate: bool = True,
+    ) -> tuple[discord.File, list[tuple[str, float]]]:
+        """
+        Applies each of the given effects in turn to the user's avatar in the render service.
+
+        `effects` is a list of (effect, args) pairs. Returns the encoded image as a file named `file_name`,
+        with the extension of whichever format it was encoded in, along with the name and duration
+        in seconds of every stage. The timings are empty if the result came from the cache.
+
+        Results are cached by the avatar's asset key, the effects and their arguments, so repeating an effect on
+        the same avatar doesn't render it again. Effects with random output must pass `cacheable=False`.
+        The decoded avatar is cached separately, so different effects on one avatar only download and decode it once.
+
+        Animated avatars have the effects applied to every frame, and are sent back as a GIF. Effects which
+        would look different on every frame, such as random ones, must pass `animate=False` to only use the first frame.
+        """
+        avatar = user.display_avatar.replace(size=size)
+        animated = animate and avatar.is_animated()
+        source_key = (avatar.key, size)
+        result_key = (*source_key, animated, tuple((effect.__qualname__, args) for effect, args in effects))
+
+        if cacheable and (result := self.results.get(result_key)) is not None:
+            log.trace(f"Using cached result for {user.id}: {result_key}.")
+            return discord.File(BytesIO(result), filename=f"{file_name}.{image_extension(result)}"), []
+
+        if animated:
+            # The frames are decoded as they're processed, so there's no decoded source to cache.
+            start = time.perf_counter()
+            image_bytes = await avatar.read()
+            timings = [("download", time.perf_counter() - start)]
+
+            result, effect_timings = await render_service.submit(
+                PfpEffects.apply_effects_animated, image_bytes, effects
+            )
+        else:
+            start = time.perf_counter()
+            image = self.sources.get(source_key)
+            if image is None:
+                image = await render_service.submit(PfpEffects.open_image, await avatar.read())
+                self.sources.set(source_key, image)
+            timings = [("download and decode", time.perf_counter() - start)]
+
+            result, effect_timings = await render_service.submit(PfpEffects.apply_effects, image, effects)
+        timings += effect_timings
+        log.debug(f"Applied {len(effects)} avatar effects for {user.id}: {timings}")
+
+        if cacheable:
+            self.results.set(result_key, result)
+        return discord.File(BytesIO(result), filename=f"{file_name}.{image_extension(result)}"), timings
+
+    async def _apply_effect(
+        self,
+        user: discord.User,
+        file_name: str,
+        effect: Callable,
+        *args,
+        size: int = 1024,
+        cacheable: bool = True,
+        animate: bool = True,
+    ) -> discord.File:
+        """Applies a single `effect` to the user's avatar, see `_apply_effects`."""
+        file, _ = await self._apply_effects(
+            user,
+            file_name,
+            [(effect, args)],
+            size=size,
+            cacheable=cacheable,
+            animate=animate,
+        )
+        return file
+
     @commands.group(aliases=("avatar_mod", "pfp_mod", "avatarmod", "pfpmod"))
     async def avatar_modify(self, ctx: commands.Context) -> None:
         """Groups all of the pfp modifying commands to allow a single concurrency limit."""
@@ -100,22 +192,16 @@ class AvatarModify(commands.Cog):
                 await ctx.send(f"{Emojis.cross_mark} Could not get user info.")
                 return
 
-            image_bytes = await user.display_avatar.replace(size=1024).read()
             file_name = file_safe_name("eightbit_avatar", ctx.author.display_name)
 
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                image_bytes,
-                PfpEffects.eight_bitify_effect,
-                file_name
-            )
+            file = await self._apply_effect(user, file_name, PfpEffects.eight_bitify_effect)
 
             embed = discord.Embed(
                 title="Your 8-bit avatar",
                 description="Here is your avatar. I think it looks all cool and 'retro'."
             )
 
-            embed.set_image(url=f"attachment://{file_name}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=user.display_avatar.url)
 
         await ctx.send(embed=embed, file=file)
@@ -137,22 +223,16 @@ class AvatarModify(commands.Cog):
                 await ctx.send(f"{Emojis.cross_mark} Could not get user info.")
                 return
 
-            image_bytes = await user.display_avatar.replace(size=1024).read()
             filename = file_safe_name("reverse_avatar", ctx.author.display_name)
 
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                image_bytes,
-                PfpEffects.flip_effect,
-                filename
-            )
+            file = await self._apply_effect(user, filename, PfpEffects.flip_effect)
 
             embed = discord.Embed(
                 title="Your reversed avatar.",
                 description="Here is your reversed avatar. I think it is a spitting image of you."
             )
 
-            embed.set_image(url=f"attachment://{filename}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=user.display_avatar.url)
 
             await ctx.send(embed=embed, file=file)
@@ -194,30 +274,31 @@ class AvatarModify(commands.Cog):
                     return
                 ctx.send = send_message  # Reassigns ctx.send
 
-            image_bytes = await user.display_avatar.replace(size=256).read()
             file_name = file_safe_name("easterified_avatar", ctx.author.display_name)
 
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                image_bytes,
-                PfpEffects.easterify_effect,
+            # Custom eggs use a random design, so only the default bunny can be cached.
+            file = await self._apply_effect(
+                user,
                 file_name,
-                egg
+                PfpEffects.easterify_effect,
+                egg,
+                size=256,
+                cacheable=egg is None
             )
 
             embed = discord.Embed(
                 title="Your Lovely Easterified Avatar!",
                 description="Here is your lovely avatar, all bright and colourful\nwith Easter pastel colours. Enjoy :D"
             )
-            embed.set_image(url=f"attachment://{file_name}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=user.display_avatar.url)
 
         await ctx.send(file=file, embed=embed)
 
-    @staticmethod
     async def send_pride_image(
+        self,
         ctx: commands.Context,
-        image_bytes: bytes,
+        user: discord.User,
         pixels: int,
         flag: str,
         option: str
@@ -226,20 +307,13 @@ class AvatarModify(commands.Cog):
         async with ctx.typing():
             file_name = file_safe_name("pride_avatar", ctx.author.display_name)
 
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                image_bytes,
-                PfpEffects.pridify_effect,
-                file_name,
-                pixels,
-                flag
-            )
+            file = await self._apply_effect(user, file_name, PfpEffects.pridify_effect, pixels, flag)
 
             embed = discord.Embed(
                 title="Your Lovely Pride Avatar!",
                 description=f"Here is your lovely avatar, surrounded by\n a beautiful {option} flag. Enjoy :D"
             )
-            embed.set_image(url=f"attachment://{file_name}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=ctx.author.display_avatar.url)
             await ctx.send(file=file, embed=embed)
 
@@ -269,8 +343,7 @@ class AvatarModify(commands.Cog):
             if not user:
                 await ctx.send(f"{Emojis.cross_mark} Could not get user info.")
                 return
-            image_bytes = await user.display_avatar.replace(size=1024).read()
-            await self.send_pride_image(ctx, image_bytes, pixels, flag, option)
+            await self.send_pride_image(ctx, user, pixels, flag, option)
 
     @prideavatar.command()
     async def flags(self, ctx: commands.Context) -> None:
@@ -297,22 +370,17 @@ class AvatarModify(commands.Cog):
             return
 
         async with ctx.typing():
-            image_bytes = await user.display_avatar.replace(size=1024).read()
-
             file_name = file_safe_name("spooky_avatar", ctx.author.display_name)
 
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                image_bytes,
-                spookifications.get_random_effect,
-                file_name
+            file = await self._apply_effect(
+                user, file_name, spookifications.get_random_effect, cacheable=False, animate=False
             )
 
             embed = discord.Embed(
                 title="Is this you or am I just really paranoid?",
                 colour=Colours.soft_red
             )
-            embed.set_image(url=f"attachment://{file_name}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=ctx.author.display_avatar.url)
 
             await ctx.send(file=file, embed=embed)
@@ -336,14 +404,14 @@ class AvatarModify(commands.Cog):
 
             file_name = file_safe_name("mosaic_avatar", ctx.author.display_name)
 
-            img_bytes = await user.display_avatar.replace(size=1024).read()
-
-            file = await in_executor(
-                PfpEffects.apply_effect,
-                img_bytes,
-                PfpEffects.mosaic_effect,
+            # The squares are shuffled randomly, so the result is different every time.
+            file = await self._apply_effect(
+                user,
                 file_name,
+                PfpEffects.mosaic_effect,
                 squares,
+                cacheable=False,
+                animate=False
             )
 
             if squares == 1:
@@ -362,11 +430,72 @@ class AvatarModify(commands.Cog):
                 colour=Colours.blue
             )
 
-            embed.set_image(url=f"attachment://{file_name}")
+            embed.set_image(url=f"attachment://{file.filename}")
             embed.set_footer(text=f"Made by {ctx.author.display_name}", icon_url=user.display_avatar.url)
 
             await ctx.send(file=file, embed=embed)
 
+    @staticmethod
+    def _parse_chain_step(step: str) -> tuple[Callable, tuple]:
+        """Converts a chain step, such as `reverse` or `pride:trans`, into an effect and its arguments."""
+        name, _, option = step.lower().partition(":")
+        if name not in CHAIN_EFFECTS:
+            raise commands.BadArgument(f"I don't know the effect `{name}`.")
+
+        effect, args = CHAIN_EFFECTS[name]
+        if not option:
+            return effect, args
+
+        if effect is not PfpEffects.pridify_effect:
+            raise commands.BadArgument(f"The `{name}` effect doesn't take an option.")
+        flag = GENDER_OPTIONS.get(option)
+        if flag is None:
+            raise commands.BadArgument(f"I don't have the flag `{option}`.")
+        return effect, (args[0], flag)
+
+    @avatar_modify.command(name="chain")
+    async def chain_command(self, ctx: commands.Context, *effects: str) -> None:
+        """
+        Applies several effects to your avatar at once, in the order given.
+
+        The available effects are 8bitify, reverse, easterify, pride, spookify and mosaic.
+        A flag can be given to the pride effect, for example `pride:trans`.
+        """
+        if not 1 <= len(effects) <= MAX_CHAIN_LENGTH:
+            raise commands.BadArgument(f"You must give between 1 and {MAX_CHAIN_LENGTH} effects.")
+        steps = [self._parse_chain_step(effect) for effect in effects]
+
+        async with ctx.typing():
+            user = await self._fetch_user(ctx.author.id)
+            if not user:
+                await ctx.send(f"{Emojis.cross_mark} Could not get user info.")
+                return
+
+            file_name = file_safe_name("chained_avatar", ctx.author.display_name)
+
+            deterministic = not any(effect in RANDOM_EFFECTS for effect, _ in steps)
+            file, timings = await self._apply_effects(
+                user,
+                file_name,
+                steps,
+                cacheable=deterministic,
+                animate=deterministic
+            )
+
+            embed = discord.Embed(
+                title="Your chained avatar",
+                description=f"Here is your avatar, with {', '.join(f'`{effect}`' for effect in effects)} applied.",
+                colour=Colours.blue
+            )
+            if Client.debug:
+                stages = "\n".join(f"{stage}: {seconds * 1000:.1f}ms" for stage, seconds in timings)
+                embed.add_field(name="Timings", value=stages or "Cached")
+
+            embed.set_image(url=f"attachment://{file.filename}")
+            embed.set_footer(text=f"Made by {ctx.author.display_name}.", icon_url=user.display_avatar.url)
+
+        await ctx.send(embed=embed, file=file)
+
 
 async def setup(bot: Bot) -> None:
     """Load the AvatarModify cog."""
@@ -1,4 +1,8 @@
+from bisect import bisect_left, insort
+from collections.abc import Callable, Coroutine
+from itertools import count
 from random import choice
+from typing import Any
 
 import discord.ui
 from discord import ButtonStyle, Embed, Interaction, Member
@@ -7,13 +11,52 @@ from discord.ui import Button, View
 from bot.bot import Bot
 from bot.constants import Colours, NEGATIVE_REPLIES
 
+# How many users are shown on each leaderboard
+LEADERBOARD_SIZE = 30
+
+
+class Ranking:
+    """
+    Users kept in order of a sort key, lowest first, so that a user's rank is found by binary search.
+
+    Users with the same key are ranked in the order they were first added, like a stable sort of the scores would.
+    """
+
+    def __init__(self):
+        self._order: list[tuple[float, int, int]] = []  # (key, when the user was added, user ID), in order
+        self._entries: dict[int, tuple[float, int, int]] = {}
+        self._added = count()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def update(self, user_id: int, key: float) -> None:
+        """Set the sort key of a user, moving them to their new place."""
+        if (entry := self._entries.get(user_id)) is not None:
+            del self._order[bisect_left(self._order, entry)]
+            added = entry[1]
+        else:
+            added = next(self._added)
+
+        entry = self._entries[user_id] = (key, added, user_id)
+        insort(self._order, entry)
+
+    def rank(self, user_id: int) -> int:
+        """The 1-indexed rank of a user, who must have been added."""
+        return bisect_left(self._order, self._entries[user_id]) + 1
+
+    def top(self, n: int) -> list[int]:
+        """The IDs of the first `n` users."""
+        return [user_id for _, _, user_id in self._order[:n]]
+
 
 class ScoreboardView(View):
     """View for the scoreboard."""
 
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, scoreboard: "Scoreboard"):
         super().__init__()
         self.bot = bot
+        self.scoreboard = scoreboard
 
     @staticmethod
     def _int_to_ordinal(number: int) -> str:
@@ -31,7 +74,7 @@ class ScoreboardView(View):
 
     async def create_main_leaderboard(self) -> Embed:
         """
-        Helper function that iterates through `self.points` to generate the main leaderboard embed.
+        Helper function that iterates through the top of the points ranking to generate the main leaderboard embed.
 
         The main leaderboard would be formatted like the following:
         **1**. @mention of the user (# of points)
@@ -39,13 +82,10 @@ class ScoreboardView(View):
         """
         formatted_string = ""
 
-        for current_placement, (user, points) in enumerate(self.points.items()):
-            if current_placement + 1 > 30:
-                break
-
-            user = await self.bot.fetch_user(int(user))
+        for current_placement, user_id in enumerate(self.scoreboard.points_ranking.top(LEADERBOARD_SIZE)):
+            user = await self.bot.fetch_user(user_id)
             formatted_string += f"**{current_placement + 1}.** {user.mention} "
-            formatted_string += f"({points:.1f} pts)\n"
+            formatted_string += f"({self.scoreboard.points[user_id]:.1f} pts)\n"
             if (current_placement + 1) % 10 == 0:
                 formatted_string += "⎯⎯⎯⎯⎯⎯⎯⎯\n"
 
@@ -59,7 +99,7 @@ class ScoreboardView(View):
 
     async def _create_speed_embed(self) -> Embed:
         """
-        Helper function that iterates through `self.speed` to generate a leaderboard embed.
+        Helper function that iterates through the top of the speed ranking to generate a leaderboard embed.
 
         The speed leaderboard would be formatted like the following:
         **1**. @mention of the user ([average speed as a float with the precision of one decimal point]s)
@@ -67,11 +107,9 @@ class ScoreboardView(View):
         """
         formatted_string = ""
 
-        for current_placement, (user, time_taken) in enumerate(self.speed.items()):
-            if current_placement + 1 > 30:
-                break
-
-            user = await self.bot.fetch_user(int(user))
+        for current_placement, user_id in enumerate(self.scoreboard.speed_ranking.top(LEADERBOARD_SIZE)):
+            user = await self.bot.fetch_user(user_id)
+            time_taken = self.scoreboard.speed[user_id]
             formatted_string += f"**{current_placement + 1}.** {user.mention} "
             formatted_string += f"({(time_taken[-1] / time_taken[0]):.1f}s)\n"
             if (current_placement + 1) % 10 == 0:
@@ -92,11 +130,8 @@ class ScoreboardView(View):
             - member: An instance of discord.Member representing the person who is trying to get their rank.
         """
         rank_embed = Embed(title=f"Ranks for {member.display_name}", color=Colours.python_blue)
-        # These are stored as strings so that the last digit can be determined to choose the suffix
-        try:
-            points_rank = str(list(self.points).index(member.id) + 1)
-            speed_rank = str(list(self.speed).index(member.id) + 1)
-        except ValueError:
+        points, speed = self.scoreboard.points_ranking, self.scoreboard.speed_ranking
+        if member.id not in points or member.id not in speed:
             return Embed(
                 title=choice(NEGATIVE_REPLIES),
                 description="It looks like you didn't participate in the Trivia Night event!",
@@ -106,8 +141,8 @@ class ScoreboardView(View):
         rank_embed.add_field(
             name="Total Points",
             value=(
-                f"You got {self._int_to_ordinal(int(points_rank))} place"
-                f" with {self.points[member.id]:.1f} points."
+                f"You got {self._int_to_ordinal(points.rank(member.id))} place"
+                f" with {self.scoreboard.points[member.id]:.1f} points."
             ),
             inline=False
         )
@@ -115,8 +150,8 @@ class ScoreboardView(View):
         rank_embed.add_field(
             name="Average Speed",
             value=(
-                f"You got {self._int_to_ordinal(int(speed_rank))} place"
-                f" with a time of {(self.speed[member.id][1] / self.speed[member.id][0]):.1f} seconds."
+                f"You got {self._int_to_ordinal(speed.rank(member.id))} place"
+                f" with a time of {self.scoreboard.average_speed(member.id):.1f} seconds."
             ),
             inline=False
         )
@@ -132,7 +167,7 @@ class ScoreboardView(View):
             and the button.
             - button: The discord.ui.Button instance representing the `Speed Leaderboard` button.
         """
-        await interaction.response.send_message(embed=await self._create_speed_embed(), ephemeral=True)
+        await interaction.response.send_message(embed=await self.scoreboard.speed_embed(self), ephemeral=True)
 
     @discord.ui.button(label="What's my rank?", style=ButtonStyle.blurple)
     async def rank_button(self, interaction: Interaction, _: Button) -> None:
@@ -152,8 +187,15 @@ class Scoreboard:
 
     def __init__(self, bot: Bot):
         self._bot = bot
-        self._points = {}
-        self._speed = {}
+        self.points: dict[int, float] = {}
+        self.speed: dict[int, list[int | float]] = {}  # user ID to [questions answered correctly, total time taken]
+
+        # Points are ranked highest first and average speeds lowest first, updated as they're assigned
+        self.points_ranking = Ranking()
+        self.speed_ranking = Ranking()
+
+        # The leaderboard embeds, which fetch every user on them, kept until the scores next change
+        self._embeds: dict[str, Embed] = {}
 
     def assign_points(self, user_id: int, *, points: int | None = None, speed: float | None = None) -> None:
         """
@@ -161,26 +203,49 @@ class Scoreboard:
 
         This method should be called once the question has finished and all answers have been registered.
         """
-        if points is not None and user_id not in self._points:
-            self._points[user_id] = points
+        if points is not None and user_id not in self.points:
+            self.points[user_id] = points
         elif points is not None:
-            self._points[user_id] += points
+            self.points[user_id] += points
 
-        if speed is not None and user_id not in self._speed:
-            self._speed[user_id] = [1, speed]
+        if speed is not None and user_id not in self.speed:
+            self.speed[user_id] = [1, speed]
         elif speed is not None:
-            self._speed[user_id] = [
-                self._speed[user_id][0] + 1, self._speed[user_id][1] + speed
+            self.speed[user_id] = [
+                self.speed[user_id][0] + 1, self.speed[user_id][1] + speed
             ]
 
+        if points is not None:
+            self.points_ranking.update(user_id, -self.points[user_id])
+        if speed is not None:
+            self.speed_ranking.update(user_id, self.average_speed(user_id))
+        if points is not None or speed is not None:
+            self._embeds.clear()
+
+    def average_speed(self, user_id: int) -> float:
+        """The average time a user took to answer the questions they got right."""
+        answered, time_taken = self.speed[user_id]
+        return time_taken / answered
+
+    async def _cached_embed(self, name: str, create: Callable[[], Coroutine[Any, Any, Embed]]) -> Embed:
+        """Returns the leaderboard embed called `name`, creating it if the scores have changed since it last was."""
+        if name not in self._embeds:
+            self._embeds[name] = await create()
+        return self._embeds[name]
+
+    async def main_embed(self, view: ScoreboardView) -> Embed:
+        """Returns the main leaderboard embed."""
+        return await self._cached_embed("main", view.create_main_leaderboard)
+
+    async def speed_embed(self, view: ScoreboardView) -> Embed:
+        """Returns the speed leaderboard embed."""
+        return await self._cached_embed("speed", view._create_speed_embed)
+
     async def display(self, speed_leaderboard: bool = False) -> tuple[Embed, View]:
         """Returns the embed of the main leaderboard along with the ScoreboardView."""
-        view = ScoreboardView(self._bot)
-
-        view.points = dict(sorted(self._points.items(), key=lambda item: item[-1], reverse=True))
-        view.speed = dict(sorted(self._speed.items(), key=lambda item: item[-1][1] / item[-1][0]))
+        view = ScoreboardView(self._bot, self)
 
         return (
-            await view.create_main_leaderboard(),
-            view if not speed_leaderboard else await view._create_speed_embed()
+            await self.main_embed(view),
+            view if not speed_leaderboard else await self.speed_embed(view)
         )
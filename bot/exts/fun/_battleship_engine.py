@@ -0,0 +1,165 @@
+"""
+Battleship grids as bitsets, and a computer player which targets by probability density.
+
+Squares are numbered row by row, so square `row * GRID_SIZE + column` is bit `row * GRID_SIZE + column` of a grid's
+integer masks. Where a ship could be placed is given by the mask of the squares it would cover.
+"""
+import functools
+import random
+
+import numpy as np
+
+GRID_SIZE = 10
+SQUARES = GRID_SIZE * GRID_SIZE
+
+# How much more likely a placement is for every unresolved hit it covers, when targeting.
+# Large enough that once there's a hit, the squares around it are always fired at before searching elsewhere.
+HIT_WEIGHT = 50
+
+
+@functools.cache
+def placements(size: int) -> tuple[int, ...]:
+    """The masks of every horizontal and vertical placement of a ship of `size` squares."""
+    horizontal = (1 << size) - 1
+    vertical = sum(1 << (i * GRID_SIZE) for i in range(size))
+    last_start = GRID_SIZE - size
+    return (
+        *(horizontal << (row * GRID_SIZE + column) for row in range(GRID_SIZE) for column in range(last_start + 1)),
+        *(vertical << (row * GRID_SIZE + column) for row in range(last_start + 1) for column in range(GRID_SIZE)),
+    )
+
+
+def square_name(square: int) -> str:
+    """The name of a square as players type it, such as A1."""
+    row, column = divmod(square, GRID_SIZE)
+    return f"{chr(ord('A') + column)}{row + 1}"
+
+
+class Grid:
+    """A player's grid, holding where their ships are and where their opponent has fired."""
+
+    def __init__(self, ships: dict[str, int]):
+        self.ships = ships  # ship name to the mask of its squares
+        self.occupied = 0
+        for mask in ships.values():
+            self.occupied |= mask
+        self.shots = 0
+
+    @classmethod
+    def random(cls, ships: dict[str, int]) -> "Grid":
+        """Places each of the given ships, a mapping of name to size, at random without overlapping."""
+        occupied = 0
+        placed = {}
+        for name, size in ships.items():
+            mask = random.choice([mask for mask in placements(size) if not mask & occupied])
+            placed[name] = mask
+            occupied |= mask
+        return cls(placed)
+
+    def is_ship(self, square: int) -> bool:
+        """Whether there's a ship on `square`."""
+        return bool(self.occupied >> square & 1)
+
+    def is_aimed(self, square: int) -> bool:
+        """Whether `square` has been fired at."""
+        return bool(self.shots >> square & 1)
+
+    def ship_at(self, square: int) -> str | None:
+        """The name of the ship on `square`, if there is one."""
+        for name, mask in self.ships.items():
+            if mask >> square & 1:
+                return name
+        return None
+
+    def fire(self, square: int) -> str | None:
+        """Fires at `square`, returning the name of the ship hit, if any."""
+        self.shots |= 1 << square
+        return self.ship_at(square)
+
+    def is_sunk(self, name: str) -> bool:
+        """Whether every square of the named ship has been hit."""
+        return not self.ships[name] & ~self.shots
+
+    def all_sunk(self) -> bool:
+        """Whether every ship has been sunk."""
+        return not self.occupied & ~self.shots
+
+
+class ProbabilityTargeter:
+    """
+    Chooses where to fire by how many placements of the remaining ships cover each square.
+
+    Every placement of every ship is a row of a placement-by-square matrix. Placements which overlap a miss or
+    a sunk ship are ruled out, and the others are weighted by `HIT_WEIGHT` to the power of the unresolved hits they
+    cover. The heatmap is the weighted sum of the rows, and after each shot only the rows covering the square shot at
+    are re-weighted and their change applied to it, in exact integer arithmetic.
+    """
+
+    def __init__(self, ships: dict[str, int]):
+        self.names = list(ships)
+        masks = [(index, mask) for index, size in enumerate(ships.values()) for mask in placements(size)]
+
+        self.ship = np.array([index for index, _ in masks])
+        self.covers = np.array(
+            [[mask >> square & 1 for square in range(SQUARES)] for _, mask in masks], dtype=bool
+        )
+        self.masks = [mask for _, mask in masks]
+
+        self.alive = np.ones(len(masks), dtype=bool)
+        self.hit_counts = np.zeros(len(masks), dtype=np.int64)
+        self.heat = self.weights().astype(np.int64) @ self.covers
+
+        self.fired = np.zeros(SQUARES, dtype=bool)
+        self.unresolved_hits = 0
+
+    def weights(self, rows: np.ndarray | slice = slice(None)) -> np.ndarray:
+        """The current weights of the given placements."""
+        return np.where(self.alive[rows], HIT_WEIGHT ** self.hit_counts[rows], 0)
+
+    def _update(self, rows: np.ndarray, alive: np.ndarray, hit_counts: np.ndarray) -> None:
+        """Sets the state of the given placements, applying the change in their weights to the heatmap."""
+        before = self.weights(rows)
+        self.alive[rows] = alive
+        self.hit_counts[rows] = hit_counts
+        self.heat += (self.weights(rows) - before) @ self.covers[rows]
+
+    def choose(self) -> int:
+        """Returns the unfired square most likely to hold a ship, breaking ties at random."""
+        heat = np.where(self.fired, -1, self.heat)
+        if heat.max() <= 0:
+            # Only possible if a sunk ship was resolved to the wrong squares, so fall back to any unfired square.
+            return int(random.choice(np.flatnonzero(~self.fired)))
+        return int(random.choice(np.flatnonzero(heat == heat.max())))
+
+    def record(self, square: int, hit: bool, sunk: str | None = None) -> None:
+        """Records the result of firing at `square`, along with the name of the ship it sank, if any."""
+        self.fired[square] = True
+        rows = np.flatnonzero(self.covers[:, square])
+
+        if not hit:
+            self._update(rows, False, self.hit_counts[rows])
+            return
+
+        self.unresolved_hits |= 1 << square
+        self._update(rows, self.alive[rows], self.hit_counts[rows] + 1)
+
+        if sunk is not None:
+            self._resolve_sunk(square, self.names.index(sunk))
+
+    def _resolve_sunk(self, square: int, ship: int) -> None:
+        """Works out which squares a ship sunk by firing at `square` was on, and rules out everything overlapping it."""
+        ship_rows = np.flatnonzero(self.ship == ship)
+        candidates = [
+            row for row in ship_rows
+            if self.alive[row] and self.covers[row, square] and not self.masks[row] & ~self.unresolved_hits
+        ]
+
+        if candidates:
+            # With several candidates the choice is a guess, but any of them is consistent with the hits so far.
+            resolved = self.masks[candidates[0]]
+            self.unresolved_hits &= ~resolved
+            cells = np.array([resolved >> cell & 1 for cell in range(SQUARES)], dtype=bool)
+            rows = np.flatnonzero(self.covers[:, cells].any(axis=1))
+            self._update(rows, False, self.hit_counts[rows])
+
+        self._update(ship_rows, False, self.hit_counts[ship_rows])
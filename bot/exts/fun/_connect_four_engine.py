@@ -0,0 +1,243 @@
+"""
+A bitboard Connect Four engine, with an iterative deepening alpha-beta search for the computer player.
+
+Boards are stored column by column, bottom to top, with one spare bit on top of each column, so that
+a board of `height` rows uses `height + 1` bits per column. The spare bits stop lines from wrapping
+around between columns, which lets whole lines be checked with a few shifts and masks.
+
+A position is given by two integers, the stones of the player to move and the mask of all stones.
+"""
+import math
+import time
+from typing import NamedTuple
+
+# Scores at or beyond this are forced wins or losses, with quicker wins scoring higher
+WIN_SCORE = 1_000_000
+
+# How many search nodes to visit between checks of the time budget
+TIME_CHECK_INTERVAL = 1024
+
+# Transposition table entries, after which it's cleared
+MAX_TABLE_SIZE = 1_000_000
+
+# Transposition table bounds
+EXACT, LOWER, UPPER = range(3)
+
+
+class SearchTimeoutError(Exception):
+    """Raised inside the search once its time budget has run out."""
+
+
+class SearchResult(NamedTuple):
+    """The outcome of a search for the best move."""
+
+    column: int
+    score: int
+    depth: int  # the deepest fully searched depth
+    nodes: int
+    elapsed: float  # seconds
+
+
+def connected_four(stones: int, height: int) -> bool:
+    """Returns whether the given stones contain four in a row, in any direction."""
+    # Vertical, horizontal, and both diagonals
+    for shift in (1, height + 1, height, height + 2):
+        pairs = stones & (stones >> shift)
+        if pairs & (pairs >> 2 * shift):
+            return True
+    return False
+
+
+def winning_cells(stones: int, height: int) -> int:
+    """Returns a mask of every cell (occupied or not) which would complete four in a row for the given stones."""
+    # Vertical
+    cells = (stones << 1) & (stones << 2) & (stones << 3)
+
+    for shift in (height + 1, height, height + 2):
+        pair = (stones << shift) & (stones << 2 * shift)
+        cells |= pair & (stones << 3 * shift)
+        cells |= pair & (stones >> shift)
+        pair = (stones >> shift) & (stones >> 2 * shift)
+        cells |= pair & (stones << shift)
+        cells |= pair & (stones >> 3 * shift)
+
+    return cells
+
+
+class Board:
+    """A Connect Four board of any size, with two players numbered 1 and 2."""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+        self.stones = [0, 0, 0]  # indexed by player number, the first is unused
+        self.mask = 0
+        self.moves = 0
+
+        bottom = sum(1 << (column * (height + 1)) for column in range(width))
+        self.full = bottom * ((1 << height) - 1)
+
+    def bottom_mask(self, column: int) -> int:
+        """The bit of the bottom cell of `column`."""
+        return 1 << (column * (self.height + 1))
+
+    def top_mask(self, column: int) -> int:
+        """The bit of the top cell of `column`."""
+        return 1 << (self.height - 1 + column * (self.height + 1))
+
+    def can_play(self, column: int) -> bool:
+        """Whether `column` has space for another stone."""
+        return not self.mask & self.top_mask(column)
+
+    def playable_columns(self) -> list[int]:
+        """All columns with space for another stone."""
+        return [column for column in range(self.width) if self.can_play(column)]
+
+    def is_full(self) -> bool:
+        """Whether every cell has been played."""
+        return self.mask == self.full
+
+    def play(self, column: int, player: int) -> int:
+        """Drops a stone for `player` into `column`, returning the row it landed in, counted from the top."""
+        # Adding the bottom bit carries through the column's stones into its lowest empty cell.
+        move = (self.mask + self.bottom_mask(column)) & self.column_mask(column)
+        self.stones[player] |= move
+        self.mask |= move
+        self.moves += 1
+        return self.height - 1 - (move.bit_length() - 1) % (self.height + 1)
+
+    def column_mask(self, column: int) -> int:
+        """The bits of every cell in `column`."""
+        return ((1 << self.height) - 1) << (column * (self.height + 1))
+
+    def has_won(self, player: int) -> bool:
+        """Whether `player` has four in a row."""
+        return connected_four(self.stones[player], self.height)
+
+    def best_move(self, player: int, max_depth: int, time_budget: float) -> SearchResult:
+        """Searches for the best column for `player` to play in; see `search`."""
+        return search(self.stones[player], self.mask, self.moves, self.width, self.height, max_depth, time_budget)
+
+
+class _Search:
+    """The state of a single search: the position's dimensions, the transposition table, and the node budget."""
+
+    def __init__(self, width: int, height: int, deadline: float):
+        self.width = width
+        self.height = height
+        self.deadline = deadline
+        self.nodes = 0
+        self.table: dict[int, tuple[int, int, int, int]] = {}
+
+        column_height = height + 1
+        self.full = sum(1 << (column * column_height) for column in range(width)) * ((1 << height) - 1)
+        self.bottom_masks = [1 << (column * column_height) for column in range(width)]
+        self.column_masks = [((1 << height) - 1) << (column * column_height) for column in range(width)]
+        self.top_masks = [1 << (height - 1 + column * column_height) for column in range(width)]
+
+        # Central columns take part in more lines, so they're searched first for better pruning.
+        self.order = sorted(range(width), key=lambda column: abs(2 * column - (width - 1)))
+
+    def evaluate(self, stones: int, mask: int) -> int:
+        """Scores a position for the player to move, by the number of open cells completing four for each side."""
+        empty = self.full & ~mask
+        opponent = stones ^ mask
+        own_threats = (winning_cells(stones, self.height) & empty).bit_count()
+        opponent_threats = (winning_cells(opponent, self.height) & empty).bit_count()
+        return own_threats - opponent_threats
+
+    def negamax(self, stones: int, mask: int, moves: int, depth: int, alpha: int, beta: int) -> tuple[int, int]:
+        """
+        Returns the score of the position for the player to move, along with the best column to play.
+
+        `stones` are the stones of the player to move, and `mask` holds every stone on the board.
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeoutError
+
+        playable = [column for column in self.order if not mask & self.top_masks[column]]
+        if not playable:
+            return 0, -1
+
+        for column in playable:
+            move = (mask + self.bottom_masks[column]) & self.column_masks[column]
+            if connected_four(stones | move, self.height):
+                return WIN_SCORE - moves, column
+
+        if depth == 0:
+            return self.evaluate(stones, mask), playable[0]
+
+        key = stones + mask  # unique for each position, given the spare bit on top of every column
+        original_alpha = alpha
+        entry = self.table.get(key)
+        best_column = playable[0]
+        if entry is not None:
+            entry_depth, bound, value, best_column = entry
+            if entry_depth >= depth:
+                if bound == EXACT:
+                    return value, best_column
+                if bound == LOWER:
+                    alpha = max(alpha, value)
+                elif bound == UPPER:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value, best_column
+            # Try the previously best move first, it's the most likely to cause a cutoff.
+            playable.remove(best_column)
+            playable.insert(0, best_column)
+
+        best_score = -WIN_SCORE * 2
+        for column in playable:
+            move = (mask + self.bottom_masks[column]) & self.column_masks[column]
+            score, _ = self.negamax(stones ^ mask, mask | move, moves + 1, depth - 1, -beta, -alpha)
+            score = -score
+            if score > best_score:
+                best_score, best_column = score, column
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+
+        if len(self.table) >= MAX_TABLE_SIZE:
+            self.table.clear()
+        self.table[key] = (depth, bound, best_score, best_column)
+        return best_score, best_column
+
+
+def search(
+    stones: int, mask: int, moves: int, width: int, height: int, max_depth: int, time_budget: float
+) -> SearchResult:
+    """
+    Finds the best column for the player to move, searching up to `max_depth` moves ahead within `time_budget` seconds.
+
+    The search deepens one move at a time, and the result of the deepest search finished in time is returned.
+    It always completes at least depth 1, however long that takes, so there is always a move to play.
+    The position must have at least one playable column.
+
+    Module level and working on plain integers, so it can be submitted to the render service.
+    """
+    start = time.perf_counter()
+    state = _Search(width, height, start + time_budget)
+
+    result = None
+    for depth in range(1, max_depth + 1):
+        state.deadline = start + time_budget if depth > 1 else math.inf
+        try:
+            score, column = state.negamax(stones, mask, moves, depth, -WIN_SCORE * 2, WIN_SCORE * 2)
+        except SearchTimeoutError:
+            break
+
+        result = SearchResult(column, score, depth, state.nodes, time.perf_counter() - start)
+        if abs(score) >= WIN_SCORE - width * height or moves + depth >= width * height:
+            # The outcome is decided, or the whole game has been searched, so searching deeper won't change anything.
+            break
+
+    return result._replace(nodes=state.nodes, elapsed=time.perf_counter() - start)
@@ -0,0 +1,120 @@
+"""
+An array-backed Minesweeper board of any size.
+
+The mines, the number of mines around each cell and the state of each cell are numpy arrays indexed by [y, x].
+The number of safe cells left to reveal is kept as a running count, so checking for a win doesn't scan the board.
+"""
+import numpy as np
+
+# Cell states
+HIDDEN, REVEALED, FLAGGED = range(3)
+
+# Codes of the cells in `Board.view`, after the neighbouring mine counts 0 to 8
+HIDDEN_CELL = 9
+FLAG_CELL = 10
+MINE_CELL = 11
+EXPLODED_CELL = 12
+CELL_CODES = 13
+
+NEIGHBOUR_OFFSETS = tuple((dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy)
+
+
+def neighbour_counts(mines: np.ndarray) -> np.ndarray:
+    """Returns the number of mines around every cell, by summing the eight shifted copies of the padded mine array."""
+    height, width = mines.shape
+    padded = np.pad(mines.astype(np.int8), 1)
+    counts = np.zeros(mines.shape, dtype=np.int8)
+    for dx, dy in NEIGHBOUR_OFFSETS:
+        counts += padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+    return counts
+
+
+class Board:
+    """A Minesweeper board, with the mines placed up front."""
+
+    def __init__(self, mines: np.ndarray):
+        self.mines = mines.astype(bool)
+        self.height, self.width = mines.shape
+        self.counts = neighbour_counts(self.mines)
+        self.state = np.full(mines.shape, HIDDEN, dtype=np.int8)
+
+        self.safe_remaining = int(self.mines.size - self.mines.sum())
+        self.exploded: tuple[int, int] | None = None
+
+    @classmethod
+    def generate(
+        cls, width: int, height: int, mine_chance: float, rng: np.random.Generator | None = None
+    ) -> "Board":
+        """Generates a board where each cell has a `mine_chance` chance of being a mine, with at least one safe cell."""
+        rng = rng or np.random.default_rng()
+        mines = rng.random((height, width)) <= mine_chance
+        # make sure there is always a free cell
+        mines[rng.integers(height), rng.integers(width)] = False
+        return cls(mines)
+
+    @property
+    def lost(self) -> bool:
+        """Whether a mine has been revealed."""
+        return self.exploded is not None
+
+    @property
+    def won(self) -> bool:
+        """Whether every safe cell has been revealed."""
+        return self.safe_remaining == 0 and not self.lost
+
+    def contains(self, x: int, y: int) -> bool:
+        """Whether (x, y) is on the board."""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def flag(self, x: int, y: int) -> None:
+        """Flags the cell at (x, y), if it's hidden."""
+        if self.state[y, x] == HIDDEN:
+            self.state[y, x] = FLAGGED
+
+    def reveal(self, x: int, y: int) -> bool:
+        """
+        Reveals the cell at (x, y), even if it's flagged, returning whether it was a mine.
+
+        Revealing a cell with no neighbouring mines also reveals the cells around it, spreading through
+        every connected cell without neighbouring mines. Flagged cells are left as they are by the spread.
+        On revealing a mine, every other mine is revealed too.
+        """
+        if self.state[y, x] == REVEALED:
+            return False
+
+        if self.mines[y, x]:
+            self.exploded = (x, y)
+            self.state[self.mines] = REVEALED
+            return True
+
+        self._uncover(x, y)
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
+            if self.counts[y, x]:
+                continue
+            for dx, dy in NEIGHBOUR_OFFSETS:
+                x_, y_ = x + dx, y + dy
+                if self.contains(x_, y_) and self.state[y_, x_] == HIDDEN:
+                    self._uncover(x_, y_)
+                    stack.append((x_, y_))
+        return False
+
+    def _uncover(self, x: int, y: int) -> None:
+        """Marks a safe cell as revealed."""
+        self.state[y, x] = REVEALED
+        self.safe_remaining -= 1
+
+    def reveal_all(self) -> None:
+        """Reveals every cell, when the game is over."""
+        self.state[:] = REVEALED
+
+    def view(self) -> np.ndarray:
+        """Returns the board as the player sees it, as an array of the cell codes above."""
+        view = np.where(self.mines, MINE_CELL, self.counts).astype(np.int8)
+        view[self.state == HIDDEN] = HIDDEN_CELL
+        view[self.state == FLAGGED] = FLAG_CELL
+        if self.exploded is not None:
+            x, y = self.exploded
+            view[y, x] = EXPLODED_CELL
+        return view
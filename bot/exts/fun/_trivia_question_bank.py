@@ -0,0 +1,90 @@
+"""
+The trivia quiz's questions, loaded once and grouped by category.
+
+Each category is a tuple of question dicts, so a game draws its questions through a shuffled permutation of
+indexes into it rather than picking at random and retrying on repeats. The file is checked for changes whenever
+a game starts and reloaded if it has been edited, while categories added at runtime (such as the Wikipedia
+questions) are kept across reloads.
+"""
+import json
+import random
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from pydis_core.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+QUESTIONS_PATH = Path("bot", "resources", "fun", "trivia_quiz.json")
+
+
+def _deep_size(value: object) -> int:
+    """An estimate of the memory used by `value` and the containers and strings inside it, in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(key) + _deep_size(item) for key, item in value.items())
+    elif isinstance(value, list | tuple):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+
+class QuestionBank:
+    """The trivia questions of every category, reloaded from `path` when the file changes."""
+
+    def __init__(self, path: Path = QUESTIONS_PATH):
+        self.path = path
+        self._mtime_ns: int | None = None
+        self._loaded: dict[str, tuple[dict, ...]] = {}
+        self._extra: dict[str, tuple[dict, ...]] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Loads the questions from the file, logging how many there are, how long it took and their size."""
+        start = time.perf_counter()
+        mtime_ns = self.path.stat().st_mtime_ns
+        raw = json.loads(self.path.read_text(encoding="utf-8"))
+        self._loaded = {category: tuple(questions) for category, questions in raw.items()}
+        self._mtime_ns = mtime_ns
+        elapsed = time.perf_counter() - start
+
+        log.info(
+            f"Loaded {sum(map(len, self._loaded.values()))} trivia questions in {len(self._loaded)} categories "
+            f"from {self.path} in {elapsed * 1000:.1f}ms, using about {_deep_size(self._loaded) / 1024:.0f} KiB."
+        )
+
+    def reload_if_changed(self) -> bool:
+        """Reloads the questions if the file has been modified since they were loaded, returning whether it was."""
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except OSError:
+            log.exception(f"Couldn't check {self.path} for changes, keeping the loaded questions.")
+            return False
+        if mtime_ns == self._mtime_ns:
+            return False
+
+        try:
+            self.load()
+        except (OSError, ValueError):
+            log.exception(f"Couldn't reload {self.path}, keeping the previously loaded questions.")
+            return False
+        return True
+
+    def set_category(self, category: str, questions: list[dict]) -> None:
+        """Sets the questions of a category which isn't in the file, keeping it across reloads."""
+        self._extra[category] = tuple(questions)
+
+    def __contains__(self, category: str) -> bool:
+        return category in self._extra or category in self._loaded
+
+    def __getitem__(self, category: str) -> tuple[dict, ...]:
+        if category in self._extra:
+            return self._extra[category]
+        return self._loaded[category]
+
+    def draw(self, category: str, count: int) -> Iterator[dict]:
+        """Yields `count` different questions of `category` in a random order, without any of them repeating."""
+        questions = self[category]
+        for index in random.sample(range(len(questions)), count):
+            yield questions[index]
@@ -1,6 +1,6 @@
 import asyncio
-import json
 import random
+from collections import defaultdict
 from pathlib import Path
 
 import discord
@@ -14,9 +14,65 @@ log = get_logger(__name__)
 
 TIME_LIMIT = 60
 
-# anagram.json file contains all the anagrams
-with open(Path("bot/resources/fun/anagram.json")) as f:
-    ANAGRAMS_ALL = json.load(f)
+# One group of anagrams per line, separated by spaces
+WORDS_PATH = Path("bot/resources/fun/anagram_words.txt")
+
+# Attempts at scrambling a word's letters into something other than one of its anagrams
+SCRAMBLE_ATTEMPTS = 10
+
+
+def signature(word: str) -> str:
+    """The letters of `word` in sorted order, which all of its anagrams share."""
+    return "".join(sorted(word.lower()))
+
+
+class AnagramIndex:
+    """
+    A word list indexed by signature, so that every anagram of some letters is a single lookup.
+
+    Signatures are also indexed by length, for picking puzzles of a given size.
+    """
+
+    def __init__(self, groups: dict[str, tuple[str, ...]]):
+        self.groups = groups
+        self.by_length: defaultdict[int, list[str]] = defaultdict(list)
+        for key in groups:
+            self.by_length[len(key)].append(key)
+
+    @classmethod
+    def load(cls, path: Path) -> "AnagramIndex":
+        """Load the index from a file with one group of anagrams per line."""
+        groups = {}
+        for line in path.read_text("utf8").splitlines():
+            words = tuple(line.split())
+            if words:
+                groups[signature(words[0])] = words
+        return cls(groups)
+
+    def puzzles(
+        self,
+        length: int | None = None,
+        min_solutions: int = 1,
+        max_solutions: int | None = None,
+    ) -> list[str]:
+        """The signatures of every group of the given word length, with a number of words in the given range."""
+        keys = self.by_length.get(length, []) if length is not None else self.groups
+        return [
+            key for key in keys
+            if len(self.groups[key]) >= min_solutions
+            and (max_solutions is None or len(self.groups[key]) <= max_solutions)
+        ]
+
+    def scramble(self, key: str) -> str:
+        """Shuffle the letters of a signature, avoiding any of its anagrams where possible."""
+        for _ in range(SCRAMBLE_ATTEMPTS):
+            scrambled = "".join(random.sample(key, len(key)))
+            if scrambled not in self.groups[key]:
+                return scrambled
+        return scrambled
+
+
+ANAGRAMS = AnagramIndex.load(WORDS_PATH)
 
 
 class AnagramGame:
@@ -27,8 +83,9 @@ class AnagramGame:
     can be used for keeping track of each anagram game.
     """
 
-    def __init__(self, scrambled: str, correct: list[str]) -> None:
+    def __init__(self, scrambled: str, correct: tuple[str, ...]) -> None:
         self.scrambled = scrambled
+        self.answers = correct
         self.correct = set(correct)
 
         self.winners = set()
@@ -49,21 +106,31 @@ class Anagram(commands.Cog):
         self.games: dict[int, AnagramGame] = {}
 
     @commands.command(name="anagram", aliases=("anag", "gram", "ag"))
-    async def anagram_command(self, ctx: commands.Context) -> None:
+    async def anagram_command(
+        self, ctx: commands.Context, length: int | None = None, min_solutions: int = 2
+    ) -> None:
         """
         Given shuffled letters, rearrange them into anagrams.
 
         Show an embed with scrambled letters which if rearranged can form words.
         After a specific amount of time, list the correct answers and whether someone provided a
         correct answer.
+
+        Optionally pick the number of letters, and the minimum number of words they can make.
         """
         if self.games.get(ctx.channel.id):
             await ctx.send("An anagram is already being solved in this channel!")
             return
 
-        scrambled_letters, correct = random.choice(list(ANAGRAMS_ALL.items()))
+        puzzles = ANAGRAMS.puzzles(length, min_solutions)
+        if not puzzles:
+            await ctx.send("Sorry, I don't have any anagrams like that!")
+            return
+
+        key = random.choice(puzzles)
+        scrambled_letters = ANAGRAMS.scramble(key)
 
-        game = AnagramGame(scrambled_letters, correct)
+        game = AnagramGame(scrambled_letters, ANAGRAMS.groups[key])
         self.games[ctx.channel.id] = game
 
         anagram_embed = discord.Embed(
@@ -82,7 +149,7 @@ class Anagram(commands.Cog):
             content = "Nobody got it right."
 
         answer_embed = discord.Embed(
-            title=f"The words were:  `{'`, `'.join(ANAGRAMS_ALL[game.scrambled])}`!",
+            title=f"The words were:  `{'`, `'.join(game.answers)}`!",
             colour=Colours.pink,
         )
 
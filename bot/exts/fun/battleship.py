@@ -1,4 +1,4 @@
-import random
+import asyncio
 import re
 from dataclasses import dataclass
 from functools import partial
@@ -9,30 +9,24 @@ from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.constants import Colours, Emojis
+from bot.exts.fun._battleship_engine import GRID_SIZE, Grid, ProbabilityTargeter, square_name
+from bot.utils.sessions import SessionRegistry
 
 log = get_logger(__name__)
 
 
-@dataclass
-class Square:
-    """Each square on the battleship grid - if they contain a boat and if they've been aimed at."""
-
-    boat: str | None
-    aimed: bool
-
-
-Grid = list[list[Square]]
 EmojiSet = dict[tuple[bool, bool], str]
 
 
 @dataclass
 class Player:
-    """Each player in the game - their messages for the boards and their current grid."""
+    """Each player in the game - their messages for the boards, their current grid, and their aim if they're the bot."""
 
     user: discord.Member | None
     board: discord.Message | None
     opponent_board: discord.Message
     grid: Grid
+    targeter: ProbabilityTargeter | None = None
 
 
 # The name of the ship and its size
@@ -87,6 +81,12 @@ NUMBERS = [
 
 CROSS_EMOJI = "\u274e"
 
+# Games last at most 200 turns of a minute, so any older game has been abandoned
+GAME_TTL = 4 * 60 * 60  # seconds
+
+# How long the bot waits before taking its turn, so its shots don't all arrive at once
+AI_TURN_DELAY = 1.5  # seconds
+
 
 class Game:
     """A Battleship Game."""
@@ -96,14 +96,18 @@ class Game:
         bot: Bot,
         channel: discord.TextChannel,
         player1: discord.Member,
-        player2: discord.Member
+        player2: discord.Member,
+        *,
+        against_bot: bool = False,
     ):
 
         self.bot = bot
         self.public_channel = channel
 
-        self.p1 = Player(player1, None, None, self.generate_grid())
-        self.p2 = Player(player2, None, None, self.generate_grid())
+        self.p1 = Player(player1, None, None, Grid.random(SHIPS))
+        self.p2 = Player(
+            player2, None, None, Grid.random(SHIPS), ProbabilityTargeter(SHIPS) if against_bot else None
+        )
 
         self.gameover: bool = False
 
@@ -113,13 +117,6 @@ class Game:
         self.match: re.Match | None = None
         self.surrender: bool = False
 
-        self.setup_grids()
-
-    @staticmethod
-    def generate_grid() -> Grid:
-        """Generates a grid by instantiating the Squares."""
-        return [[Square(None, False) for _ in range(10)] for _ in range(10)]
-
     @staticmethod
     def format_grid(player: Player, emojiset: EmojiSet) -> str:
         """
@@ -127,21 +124,30 @@ class Game:
 
         Also adds the Letter and Number indexes.
         """
-        grid = [
-            [emojiset[bool(square.boat), square.aimed] for square in row]
-            for row in player.grid
+        grid = player.grid
+        rows = [
+            "".join([number] + [
+                emojiset[grid.is_ship(square), grid.is_aimed(square)]
+                for square in range(row * GRID_SIZE, (row + 1) * GRID_SIZE)
+            ])
+            for row, number in enumerate(NUMBERS)
         ]
-
-        rows = ["".join([number] + row) for number, row in zip(NUMBERS, grid, strict=True)]
         return "\n".join([LETTERS] + rows)
 
     @staticmethod
-    def get_square(grid: Grid, square: str) -> Square:
-        """Grabs a square from a grid with an inputted key."""
-        index = ord(square[0].upper()) - ord("A")
-        number = int(square[1:])
+    def get_square(square: str) -> int:
+        """Gets the index of a square on the grid from an inputted key."""
+        column = ord(square[0].upper()) - ord("A")
+        row = int(square[1:]) - 1  # -1 since squares are indexed from 0
 
-        return grid[number-1][index]  # -1 since lists are indexed from 0
+        return row * GRID_SIZE + column
+
+    @staticmethod
+    async def send(player: Player, content: str, **kwargs) -> discord.Message | None:
+        """DMs a player, unless they're the bot."""
+        if player.targeter is not None:
+            return None
+        return await player.user.send(content, **kwargs)
 
     async def game_over(
         self,
@@ -156,47 +162,6 @@ class Game:
             grid = self.format_grid(player, SHIP_EMOJIS)
             await self.public_channel.send(f"{player.user}'s Board:\n{grid}")
 
-    @staticmethod
-    def check_sink(grid: Grid, boat: str) -> bool:
-        """Checks if all squares containing a given boat have sunk."""
-        return all(square.aimed for row in grid for square in row if square.boat == boat)
-
-    @staticmethod
-    def check_gameover(grid: Grid) -> bool:
-        """Checks if all boats have been sunk."""
-        return all(square.aimed for row in grid for square in row if square.boat)
-
-    def setup_grids(self) -> None:
-        """Places the boats on the grids to initialise the game."""
-        for player in (self.p1, self.p2):
-            for name, size in SHIPS.items():
-                while True:  # Repeats if about to overwrite another boat
-                    ship_collision = False
-                    coords = []
-
-                    coord1 = random.randint(0, 9)
-                    coord2 = random.randint(0, 10 - size)
-
-                    if random.choice((True, False)):  # Vertical or Horizontal
-                        x, y = coord1, coord2
-                        xincr, yincr = 0, 1
-                    else:
-                        x, y = coord2, coord1
-                        xincr, yincr = 1, 0
-
-                    for i in range(size):
-                        new_x = x + (xincr * i)
-                        new_y = y + (yincr * i)
-                        if player.grid[new_x][new_y].boat:  # Check if there's already a boat
-                            ship_collision = True
-                            break
-                        coords.append((new_x, new_y))
-                    if not ship_collision:  # If not overwriting any other boat spaces, break loop
-                        break
-
-                for x, y in coords:
-                    player.grid[x][y].boat = name
-
     async def print_grids(self) -> None:
         """Prints grids to the DM channels."""
         # Convert squares into Emoji
@@ -214,6 +179,8 @@ class Game:
 
         for board, location in zip(boards, locations, strict=True):
             player, attr = location
+            if player.targeter is not None:
+                continue
             if getattr(player, attr):
                 await getattr(player, attr).edit(content=board)
             else:
@@ -231,58 +198,64 @@ class Game:
             return bool(self.match)
         return None
 
-    async def take_turn(self) -> Square | None:
+    async def take_turn(self) -> int | None:
         """Lets the player who's turn it is choose a square."""
+        if self.turn.targeter is not None:
+            await asyncio.sleep(AI_TURN_DELAY)
+            return self.turn.targeter.choose()
+
         square = None
         turn_message = await self.turn.user.send(
             "It's your turn! Type the square you want to fire at. Format it like this: A1\n"
             "Type `surrender` to give up."
         )
-        await self.next.user.send("Their turn", delete_after=3.0)
+        await self.send(self.next, "Their turn", delete_after=3.0)
         while True:
             try:
                 await self.bot.wait_for("message", check=self.predicate, timeout=60.0)
             except TimeoutError:
                 await self.turn.user.send("You took too long. Game over!")
-                await self.next.user.send(f"{self.turn.user} took too long. Game over!")
+                await self.send(self.next, f"{self.turn.user} took too long. Game over!")
                 await self.public_channel.send(
                     f"Game over! {self.turn.user.mention} timed out so {self.next.user.mention} wins!"
                 )
                 self.gameover = True
+                square = None
                 break
             else:
                 if self.surrender:
-                    await self.next.user.send(f"{self.turn.user} surrendered. Game over!")
+                    await self.send(self.next, f"{self.turn.user} surrendered. Game over!")
                     await self.public_channel.send(
                         f"Game over! {self.turn.user.mention} surrendered to {self.next.user.mention}!"
                     )
                     self.gameover = True
+                    square = None
                     break
-                square = self.get_square(self.next.grid, self.match.string)
-                if square.aimed:
+                square = self.get_square(self.match.string.replace(" ", ""))
+                if self.next.grid.is_aimed(square):
                     await self.turn.user.send("You've already aimed at this square!", delete_after=3.0)
                 else:
                     break
         await turn_message.delete()
         return square
 
-    async def hit(self, square: Square, alert_messages: list[discord.Message]) -> None:
+    async def hit(self, boat: str, alert_messages: list[discord.Message]) -> None:
         """Occurs when a player successfully aims for a ship."""
-        await self.turn.user.send("Hit!", delete_after=3.0)
-        alert_messages.append(await self.next.user.send("Hit!"))
-        if self.check_sink(self.next.grid, square.boat):
-            await self.turn.user.send(f"You've sunk their {square.boat} ship!", delete_after=3.0)
-            alert_messages.append(await self.next.user.send(f"Oh no! Your {square.boat} ship sunk!"))
-            if self.check_gameover(self.next.grid):
-                await self.turn.user.send("You win!")
-                await self.next.user.send("You lose!")
+        await self.send(self.turn, "Hit!", delete_after=3.0)
+        alert_messages.append(await self.send(self.next, "Hit!"))
+        if self.next.grid.is_sunk(boat):
+            await self.send(self.turn, f"You've sunk their {boat} ship!", delete_after=3.0)
+            alert_messages.append(await self.send(self.next, f"Oh no! Your {boat} ship sunk!"))
+            if self.next.grid.all_sunk():
+                await self.send(self.turn, "You win!")
+                await self.send(self.next, "You lose!")
                 self.gameover = True
                 await self.game_over(winner=self.turn.user, loser=self.next.user)
 
     async def start_game(self) -> None:
         """Begins the game."""
-        await self.p1.user.send(f"You're playing battleship with {self.p2.user}.")
-        await self.p2.user.send(f"You're playing battleship with {self.p1.user}.")
+        await self.send(self.p1, f"You're playing battleship with {self.p2.user}.")
+        await self.send(self.p2, f"You're playing battleship with {self.p1.user}.")
 
         alert_messages = []
 
@@ -296,23 +269,27 @@ class Game:
                 return
 
             square = await self.take_turn()
-            if not square:
+            if square is None:
                 return
-            square.aimed = True
+            boat = self.next.grid.fire(square)
+            if self.turn.targeter is not None:
+                sunk = boat if boat is not None and self.next.grid.is_sunk(boat) else None
+                self.turn.targeter.record(square, hit=boat is not None, sunk=sunk)
 
             for message in alert_messages:
-                await message.delete()
+                if message is not None:
+                    await message.delete()
 
             alert_messages = []
-            alert_messages.append(await self.next.user.send(f"{self.turn.user} aimed at {self.match.string}!"))
+            alert_messages.append(await self.send(self.next, f"{self.turn.user} aimed at {square_name(square)}!"))
 
-            if square.boat:
-                await self.hit(square, alert_messages)
+            if boat:
+                await self.hit(boat, alert_messages)
                 if self.gameover:
                     return
             else:
-                await self.turn.user.send("Miss!", delete_after=3.0)
-                alert_messages.append(await self.next.user.send("Miss!"))
+                await self.send(self.turn, "Miss!", delete_after=3.0)
+                alert_messages.append(await self.send(self.next, "Miss!"))
 
             self.turn, self.next = self.next, self.turn
 
@@ -322,7 +299,7 @@ class Battleship(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.games: list[Game] = []
+        self.games: SessionRegistry[Game] = SessionRegistry(ttl=GAME_TTL)
         self.waiting: list[discord.Member] = []
 
     def predicate(
@@ -362,7 +339,7 @@ class Battleship(commands.Cog):
 
     def already_playing(self, player: discord.Member) -> bool:
         """Check if someone is already in a game."""
-        return any(player in (game.p1.user, game.p2.user) for game in self.games)
+        return self.games.is_playing(player.id)
 
     @commands.group(invoke_without_command=True)
     async def battleship(self, ctx: commands.Context) -> None:
@@ -413,21 +390,45 @@ class Battleship(commands.Cog):
         if self.already_playing(ctx.author):
             return
         game = Game(self.bot, ctx.channel, ctx.author, user)
-        self.games.append(game)
+        await self.run_game(ctx, game, [ctx.author, user])
+
+    @battleship.command(name="ai", aliases=("bot", "computer"))
+    async def battleship_ai(self, ctx: commands.Context) -> None:
+        """
+        Play a game of Battleship against the bot!
+
+        The bot fires wherever the remaining ships are most likely to be, given its hits and misses so far.
+        The game takes place entirely in DMs.
+        Make sure you have your DMs open so that the bot can message you.
+        """
+        if self.already_playing(ctx.author):
+            await ctx.send("You're already playing a game!")
+            return
+
+        if ctx.author in self.waiting:
+            await ctx.send("You've already sent out a request for a player 2.")
+            return
+
+        game = Game(self.bot, ctx.channel, ctx.author, ctx.me, against_bot=True)
+        await self.run_game(ctx, game, [ctx.author])
+
+    async def run_game(self, ctx: commands.Context, game: Game, players: list[discord.Member]) -> None:
+        """Play the game through, keeping its players registered as playing until it ends."""
+        mentions = " ".join(player.mention for player in players)
+        self.games.add(game, players=[player.id for player in players])
         try:
             await game.start_game()
-            self.games.remove(game)
         except discord.Forbidden:
             await ctx.send(
-                f"{ctx.author.mention} {user.mention} "
+                f"{mentions} "
                 "Game failed. This is likely due to you not having your DMs open. Check and try again."
             )
-            self.games.remove(game)
         except Exception:
             # End the game in the event of an unforseen error so the players aren't stuck in a game
-            await ctx.send(f"{ctx.author.mention} {user.mention} An error occurred. Game failed.")
-            self.games.remove(game)
+            await ctx.send(f"{mentions} An error occurred. Game failed.")
             raise
+        finally:
+            self.games.finish(game, record=False)
 
     @battleship.command(name="ships", aliases=("boats",))
     async def battleship_ships(self, ctx: commands.Context) -> None:
@@ -1,17 +1,43 @@
 import random
 from functools import partial
+from typing import Literal
 
 import discord
 import emojis
 from discord import ClientUser, Member
 from discord.ext import commands
+from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.constants import Emojis
+from bot.exts.fun import _connect_four_engine as engine
+from bot.utils.exceptions import RenderServiceBusyError, RenderTimeoutError
+from bot.utils.render import render_service
+from bot.utils.sessions import SessionRegistry
+
+log = get_logger(__name__)
 
 NUMBERS = list(Emojis.number_emojis.values())
 CROSS_EMOJI = Emojis.incident_unactioned
 
+# How many moves ahead the computer player looks, for each difficulty
+DIFFICULTY_DEPTHS = {
+    "easy": 1,
+    "normal": 4,
+    "hard": 42,
+}
+# How often the computer player drops into a random column instead of searching, for each difficulty.
+# Looking one move ahead already takes every win and blocks every loss, so easy has to make mistakes to be beatable.
+MISTAKE_RATES = {
+    "easy": 0.4,
+    "normal": 0,
+    "hard": 0,
+}
+MOVE_TIME_BUDGET = 2  # seconds the computer player may spend searching for each move
+
+# Games on the biggest board last at most 81 moves of 30 seconds, so any older game has been abandoned
+GAME_TTL = 60 * 60  # seconds
+
 Coordinate = tuple[int, int] | None
 EMOJI_CHECK = discord.Emoji | str
 
@@ -26,16 +52,18 @@ class Game:
         player1: discord.Member,
         player2: discord.Member | None,
         tokens: list[str],
-        size: int = 7
+        size: int = 7,
+        difficulty: str = "normal"
     ):
         self.bot = bot
         self.channel = channel
         self.player1 = player1
-        self.player2 = player2 or AI(self.bot, game=self)
+        self.player2 = player2 or AI(self.bot, game=self, difficulty=difficulty)
         self.tokens = tokens
 
         self.grid = self.generate_board(size)
         self.grid_size = size
+        self.board = engine.Board(size, size)
 
         self.unicode_numbers = NUMBERS[:self.grid_size]
 
@@ -90,7 +118,7 @@ class Game:
             await self.print_grid()
 
             if isinstance(self.player_active, AI):
-                coords = self.player_active.play()
+                coords = await self.player_active.play()
                 if not coords:
                     await self.game_over(
                         "draw",
@@ -103,7 +131,7 @@ class Game:
             if not coords:
                 return
 
-            if self.check_win(coords, 1 if self.player_active == self.player1 else 2):
+            if self.board.has_won(1 if self.player_active == self.player1 else 2):
                 await self.game_over(
                     "win",
                     self.bot.user if isinstance(self.player_active, AI) else self.player_active,
@@ -142,116 +170,52 @@ class Game:
                 await self.message.remove_reaction(reaction, user)
 
                 column_num = self.unicode_numbers.index(str(reaction.emoji))
-                column = [row[column_num] for row in self.grid]
-
-                for row_num, square in reversed(list(enumerate(column))):
-                    if not square:
-                        self.grid[row_num][column_num] = player_num
-                        return row_num, column_num
+                if self.board.can_play(column_num):
+                    return self.place(column_num, player_num)
                 message = await self.channel.send(f"Column {column_num + 1} is full. Try again")
 
-    def check_win(self, coords: Coordinate, player_num: int) -> bool:
-        """Check that placing a counter here would cause the player to win."""
-        vertical = [(-1, 0), (1, 0)]
-        horizontal = [(0, 1), (0, -1)]
-        forward_diag = [(-1, 1), (1, -1)]
-        backward_diag = [(-1, -1), (1, 1)]
-        axes = [vertical, horizontal, forward_diag, backward_diag]
-
-        for axis in axes:
-            counters_in_a_row = 1  # The initial counter that is compared to
-            for (row_incr, column_incr) in axis:
-                row, column = coords
-                row += row_incr
-                column += column_incr
-
-                while 0 <= row < self.grid_size and 0 <= column < self.grid_size:
-                    if self.grid[row][column] == player_num:
-                        counters_in_a_row += 1
-                        row += row_incr
-                        column += column_incr
-                    else:
-                        break
-            if counters_in_a_row >= 4:
-                return True
-        return False
+    def place(self, column_num: int, player_num: int) -> Coordinate:
+        """Drop a counter for the player into the column, returning where it landed."""
+        row_num = self.board.play(column_num, player_num)
+        self.grid[row_num][column_num] = player_num
+        return row_num, column_num
 
 
 class AI:
     """The Computer Player for Single-Player games."""
 
-    def __init__(self, bot: Bot, game: Game):
+    def __init__(self, bot: Bot, game: Game, difficulty: str = "normal"):
         self.game = game
         self.mention = bot.user.mention
+        self.depth = DIFFICULTY_DEPTHS[difficulty]
+        self.mistake_rate = MISTAKE_RATES[difficulty]
 
-    def get_possible_places(self) -> list[Coordinate]:
-        """Gets all the coordinates where the AI could possibly place a counter."""
-        possible_coords = []
-        for column_num in range(self.game.grid_size):
-            column = [row[column_num] for row in self.game.grid]
-            for row_num, square in reversed(list(enumerate(column))):
-                if not square:
-                    possible_coords.append((row_num, column_num))
-                    break
-        return possible_coords
-
-    def check_ai_win(self, coord_list: list[Coordinate]) -> Coordinate:
-        """
-        Check AI win.
-
-        Check if placing a counter in any possible coordinate would cause the AI to win
-        with 10% chance of not winning and returning None
-        """
-        if random.randint(1, 10) == 1:
-            return None
-        for coords in coord_list:
-            if self.game.check_win(coords, 2):
-                return coords
-        return None
-
-    def check_player_win(self, coord_list: list[Coordinate]) -> Coordinate | None:
-        """
-        Check Player win.
-
-        Check if placing a counter in possible coordinates would stop the player
-        from winning with 25% of not blocking them  and returning None.
-        """
-        if random.randint(1, 4) == 1:
-            return None
-        for coords in coord_list:
-            if self.game.check_win(coords, 1):
-                return coords
-        return None
-
-    @staticmethod
-    def random_coords(coord_list: list[Coordinate]) -> Coordinate:
-        """Picks a random coordinate from the possible ones."""
-        return random.choice(coord_list)
-
-    def play(self) -> Coordinate | bool:
+    async def play(self) -> Coordinate | bool:
         """
         Plays for the AI.
 
-        Gets all possible coords, and determins the move:
-        1. coords where it can win.
-        2. coords where the player can win.
-        3. Random coord
-        The first possible value is choosen.
+        Searches for the best column with alpha-beta pruning, looking ahead as many moves as the difficulty allows
+        within the time budget. The search runs in the render service, so it doesn't block the bot.
+        Returns False if the board is full.
         """
-        possible_coords = self.get_possible_places()
-
-        if not possible_coords:
+        board = self.game.board
+        if board.is_full():
             return False
 
-        coords = (
-            self.check_ai_win(possible_coords)
-            or self.check_player_win(possible_coords)
-            or self.random_coords(possible_coords)
-        )
+        if random.random() < self.mistake_rate:
+            return self.game.place(random.choice(board.playable_columns()), 2)
+
+        args = (board.stones[2], board.mask, board.moves, board.width, board.height)
+        try:
+            result = await render_service.submit(
+                engine.search, *args, self.depth, MOVE_TIME_BUDGET, timeout=MOVE_TIME_BUDGET * 5
+            )
+        except (RenderServiceBusyError, RenderTimeoutError):
+            # A single move ahead is quick enough to work out here, and still takes wins and blocks losses.
+            log.info("Falling back to a shallow Connect Four search, the render service is unavailable.")
+            result = engine.search(*args, 1, MOVE_TIME_BUDGET)
 
-        row, column = coords
-        self.game.grid[row][column] = 2
-        return coords
+        return self.game.place(result.column, 2)
 
 
 class ConnectFour(commands.Cog):
@@ -259,7 +223,7 @@ class ConnectFour(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.games: list[Game] = []
+        self.games: SessionRegistry[Game] = SessionRegistry(ttl=GAME_TTL)
         self.waiting: list[discord.Member] = []
 
         self.tokens = [":white_circle:", ":blue_circle:", ":red_circle:"]
@@ -324,7 +288,7 @@ class ConnectFour(commands.Cog):
 
     def already_playing(self, player: discord.Member) -> bool:
         """Check if someone is already in a game."""
-        return any(player in (game.player1, game.player2) for game in self.games)
+        return self.games.is_playing(player.id)
 
     @staticmethod
     def check_emojis(
@@ -343,23 +307,24 @@ class ConnectFour(commands.Cog):
         user: discord.Member | None,
         board_size: int,
         emoji1: str,
-        emoji2: str
+        emoji2: str,
+        difficulty: str = "normal"
     ) -> None:
         """Helper for playing a game of connect four."""
         self.tokens = [":white_circle:", str(emoji1), str(emoji2)]
         game = None  # if game fails to intialize in try...except
 
         try:
-            game = Game(self.bot, ctx.channel, ctx.author, user, self.tokens, size=board_size)
-            self.games.append(game)
+            game = Game(self.bot, ctx.channel, ctx.author, user, self.tokens, size=board_size, difficulty=difficulty)
+            self.games.add(game, players=[ctx.author.id] + ([user.id] if user else []))
             await game.start_game()
-            self.games.remove(game)
         except Exception:
             # End the game in the event of an unforeseen error so the players aren't stuck in a game
             await ctx.send(f"{ctx.author.mention} {user.mention if user else ''} An error occurred. Game failed.")
-            if game in self.games:
-                self.games.remove(game)
             raise
+        finally:
+            if game is not None:
+                self.games.finish(game, record=False)
 
     @commands.group(
         invoke_without_command=True,
@@ -429,11 +394,18 @@ class ConnectFour(commands.Cog):
     async def ai(
         self,
         ctx: commands.Context,
+        difficulty: Literal["easy", "normal", "hard"] | None = None,
         board_size: int = 7,
         emoji1: EMOJI_CHECK = "\U0001f535",
-        emoji2: EMOJI_CHECK = "\U0001f534"
+        emoji2: EMOJI_CHECK = "\U0001f534",
     ) -> None:
-        """Play Connect Four against a computer player."""
+        """
+        Play Connect Four against a computer player.
+
+        The difficulty sets how far ahead the computer looks: easy, normal (the default) or hard.
+        It can be left out, so `.c4 ai hard`, `.c4 ai 6` and `.c4 ai easy 6` all work.
+        """
+        difficulty = difficulty or "normal"
         check, emoji = self.check_emojis(emoji1, emoji2)
         if not check:
             raise commands.EmojiNotFound(emoji)
@@ -442,7 +414,7 @@ class ConnectFour(commands.Cog):
         if not check_author_result:
             return
 
-        await self._play_game(ctx, None, board_size, str(emoji1), str(emoji2))
+        await self._play_game(ctx, None, board_size, str(emoji1), str(emoji2), difficulty)
 
 
 async def setup(bot: Bot) -> None:
@@ -1,9 +1,9 @@
 import asyncio
+import functools
 import random
 import re
 from collections import defaultdict
 from io import BytesIO
-from itertools import product
 from pathlib import Path
 
 import discord
@@ -12,11 +12,39 @@ from discord.ext import commands
 
 from bot.bot import Bot
 from bot.constants import MODERATION_ROLES
+from bot.utils.assets import open_asset
+from bot.utils.caching import LRUCache
 from bot.utils.decorators import with_role
+from bot.utils.render import render_service
+from bot.utils.sessions import SessionRegistry
 
-DECK = list(product(*[(0, 1, 2)]*4))
+# Each card has 4 features with 3 options each, and its ID is its features read as a trinary number.
+FEATURES = 4
+DECK = range(3 ** FEATURES)
+
+
+def _build_completion_table() -> list[list[int]]:
+    """
+    Build the table of the card completing a flight with each pair of cards, indexed by their IDs.
+
+    Each feature of the completion is the same as the pair's if they match, and the third option otherwise,
+    which is the negated sum of the pair's options, modulo 3, either way.
+    """
+    features = [[card // 3 ** place % 3 for place in range(FEATURES)] for card in DECK]
+    return [
+        [
+            sum((-a - b) % 3 * 3 ** place for place, (a, b) in enumerate(zip(features_a, features_b, strict=True)))
+            for features_b in features
+        ]
+        for features_a in features
+    ]
+
+
+COMPLETION = _build_completion_table()
 
 GAME_DURATION = 180
+# Games end by themselves after GAME_DURATION, this only cleans up after ones which failed to
+GAME_TTL = GAME_DURATION + 60
 
 # Scoring
 CORRECT_SOLN = 1
@@ -31,15 +59,22 @@ INCORRECT_GOOSE = -1
 
 SOLN_DISTR = 0, 0.05, 0.05, 0.1, 0.15, 0.25, 0.2, 0.15, .05
 
-IMAGE_PATH = Path("bot", "resources", "fun", "all_cards.png")
+# Limits on custom board dimensions
+MIN_BOARD_SIDE = 3
+MAX_BOARD_SIDE = 6
+
 FONT_PATH = Path("bot", "resources", "fun", "LuckiestGuy-Regular.ttf")
 HELP_IMAGE_PATH = Path("bot", "resources", "fun", "ducks_help_ex.png")
 
-ALL_CARDS = Image.open(IMAGE_PATH)
 LABEL_FONT = ImageFont.truetype(str(FONT_PATH), size=16)
 CARD_WIDTH = 155
 CARD_HEIGHT = 97
 
+# Labelled cards memoised by each render worker, about 60 KiB each
+LABELLED_CARD_CACHE_SIZE = 256
+# Total size of the encoded board images cached by the cog
+BOARD_CACHE_SIZE = 8 * 1024 ** 2  # bytes
+
 EMOJI_WRONG = "\u274C"
 
 ANSWER_REGEX = re.compile(r"^\D*(\d+)\D+(\d+)\D+(\d+)\D*$")
@@ -65,39 +100,87 @@ The second flight is valid because there are no 2:1 splits; each feature is eith
 """
 
 
-def assemble_board_image(board: list[tuple[int]], rows: int, columns: int) -> Image:
-    """Cut and paste images representing the given cards into an image representing the board."""
+@functools.cache
+def card_sprites() -> tuple[Image.Image, ...]:
+    """
+    Slice the image containing all the cards into each card, indexed by card ID.
+
+    The master card image file should have 9x9 cards, arranged in order of their IDs.
+    The sprites are sliced once per process, and must never be modified in place.
+    """
+    all_cards = open_asset("fun/all_cards.png").convert("RGBA")
+    sprites = []
+    for card in DECK:
+        row, col = divmod(card, 9)
+        left, top = col * CARD_WIDTH, row * CARD_HEIGHT
+        sprites.append(all_cards.crop((left, top, left + CARD_WIDTH, top + CARD_HEIGHT)))
+    return tuple(sprites)
+
+
+@functools.lru_cache(maxsize=LABELLED_CARD_CACHE_SIZE)
+def labelled_card(card: int, index: int) -> Image.Image:
+    """Return the card with its board index drawn on, memoised so it must never be modified in place."""
+    image = card_sprites()[card].copy()
+    ImageDraw.Draw(image).text(
+        xy=(5, 5),  # magic numbers are buffers for the card labels
+        text=str(index),
+        fill=(0, 0, 0),
+        font=LABEL_FONT,
+    )
+    return image
+
+
+def assemble_board_image(board: list[int], rows: int, columns: int) -> Image:
+    """Paste the labelled images of the given cards into an image representing the board."""
     new_im = Image.new("RGBA", (CARD_WIDTH*columns, CARD_HEIGHT*rows))
-    draw = ImageDraw.Draw(new_im)
     for idx, card in enumerate(board):
-        card_image = get_card_image(card)
         row, col = divmod(idx, columns)
-        top, left = row * CARD_HEIGHT, col * CARD_WIDTH
-        new_im.paste(card_image, (left, top))
-        draw.text(
-            xy=(left+5, top+5),  # magic numbers are buffers for the card labels
-            text=str(idx),
-            fill=(0, 0, 0),
-            font=LABEL_FONT,
-        )
+        new_im.paste(labelled_card(card, idx), (col * CARD_WIDTH, row * CARD_HEIGHT))
     return new_im
 
 
-def get_card_image(card: tuple[int]) -> Image:
-    """Slice the image containing all the cards to get just this card."""
-    # The master card image file should have 9x9 cards,
-    # arranged such that their features can be interpreted as ordered trinary.
-    row, col = divmod(as_trinary(card), 9)
-    x1 = col * CARD_WIDTH
-    x2 = x1 + CARD_WIDTH
-    y1 = row * CARD_HEIGHT
-    y2 = y1 + CARD_HEIGHT
-    return ALL_CARDS.crop((x1, y1, x2, y2))
+def encode_board_image(board: list[int], rows: int, columns: int) -> bytes:
+    """
+    Assemble the board image and encode it as a PNG.
 
+    This is slow and blocking, so it should be submitted to the render service.
+    """
+    image_stream = BytesIO()
+    assemble_board_image(board, rows, columns).save(image_stream, format="png")
+    return image_stream.getvalue()
 
-def as_trinary(card: tuple[int]) -> int:
-    """Find the card's unique index by interpreting its features as trinary."""
-    return int("".join(str(x) for x in card), base=3)
+
+def generate_board(size: int, minimum_solutions: int) -> list[int]:
+    """
+    Build a board of `size` distinct cards with at least `minimum_solutions` flights.
+
+    Cards are added one at a time, each completing a flight with a random pair of cards already on the board
+    where possible, until there are enough flights. The rest of the board is filled with random cards.
+
+    Every card adds at least one flight, except the second and any card added once every pair's completion is
+    already on the board. That only happens at 3, 9 or 27 cards, which already hold at least that many flights,
+    so n cards always hold at least n - 3 flights and there's never a need to retry.
+    """
+    if minimum_solutions > size - 3:
+        raise ValueError(f"Can't guarantee {minimum_solutions} flights on a board of {size} cards.")
+
+    board = [random.choice(DECK)]
+    cards = set(board)
+    solutions = 0
+    while solutions < minimum_solutions:
+        pairs = [(a, b) for i, a in enumerate(board) for b in board[i + 1:] if COMPLETION[a][b] not in cards]
+        if pairs:
+            a, b = random.choice(pairs)
+            card = COMPLETION[a][b]
+        else:
+            card = random.choice([card for card in DECK if card not in cards])
+        solutions += sum(COMPLETION[card][other] in cards for other in board) // 2
+        board.append(card)
+        cards.add(card)
+
+    board += random.sample([card for card in DECK if card not in cards], size - len(board))
+    random.shuffle(board)
+    return board
 
 
 class DuckGame:
@@ -110,7 +193,7 @@ class DuckGame:
         minimum_solutions: int = 1,
     ):
         """
-        Take samples from the deck to generate a board.
+        Build a board with at least `minimum_solutions` flights.
 
         Args:
             rows (int, optional): Rows in the game board. Defaults to 4.
@@ -126,46 +209,36 @@ class DuckGame:
         self.scores = defaultdict(int)
         self.editing_embed = asyncio.Lock()
 
-        self.board = random.sample(DECK, size)
-        while len(self.solutions) < minimum_solutions:
-            self.board = random.sample(DECK, size)
+        self.board = generate_board(size, minimum_solutions)
 
         self.board_msg = None
         self.found_msg = None
 
     @property
-    def board(self) -> list[tuple[int]]:
+    def board(self) -> list[int]:
         """Accesses board property."""
         return self._board
 
     @board.setter
-    def board(self, val: list[tuple[int]]) -> None:
+    def board(self, val: list[int]) -> None:
         """Erases calculated solutions if the board changes."""
         self._solutions = None
         self._board = val
 
     @property
-    def solutions(self) -> None:
+    def solutions(self) -> set[tuple[int, int, int]]:
         """Calculate valid solutions and cache to avoid redoing work."""
         if self._solutions is None:
             self._solutions = set()
+            positions = {card: idx for idx, card in enumerate(self.board)}
             for idx_a, card_a in enumerate(self.board):
-                for idx_b, card_b in enumerate(self.board[idx_a+1:], start=idx_a+1):
+                completions = COMPLETION[card_a]
+                for idx_b in range(idx_a + 1, len(self.board)):
                     # Two points determine a line, and there are exactly 3 points per line in {0,1,2}^4.
-                    # The completion of a line will only be a duplicate point if the other two points are the same,
-                    # which is prevented by the triangle iteration.
-                    completion = tuple(
-                        feat_a if feat_a == feat_b else 3-feat_a-feat_b
-                        for feat_a, feat_b in zip(card_a, card_b, strict=True)
-                    )
-                    try:
-                        idx_c = self.board.index(completion)
-                    except ValueError:
-                        continue
-
-                    # Indices within the solution are sorted to detect duplicate solutions modulo order.
-                    solution = tuple(sorted((idx_a, idx_b, idx_c)))
-                    self._solutions.add(solution)
+                    # Only counting completions after both cards finds each solution once, with sorted indices.
+                    idx_c = positions.get(completions[self.board[idx_b]], -1)
+                    if idx_c > idx_b:
+                        self._solutions.add((idx_a, idx_b, idx_c))
 
         return self._solutions
 
@@ -175,7 +248,8 @@ class DuckGamesDirector(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.current_games = {}
+        self.current_games: SessionRegistry[DuckGame] = SessionRegistry(ttl=GAME_TTL)
+        self.board_images: LRUCache[tuple[tuple[int, ...], int], bytes] = LRUCache(BOARD_CACHE_SIZE)
 
     @commands.group(
         name="duckduckduckgoose",
@@ -183,29 +257,36 @@ class DuckGamesDirector(commands.Cog):
         invoke_without_command=True
     )
     @commands.cooldown(rate=1, per=2, type=commands.BucketType.channel)
-    async def start_game(self, ctx: commands.Context) -> None:
-        """Start a new Duck Duck Duck Goose game."""
-        if ctx.channel.id in self.current_games:
+    async def start_game(self, ctx: commands.Context, rows: int = 4, columns: int = 3) -> None:
+        """Start a new Duck Duck Duck Goose game, optionally with a custom number of rows and columns of cards."""
+        if self.current_games.by_channel(ctx.channel.id) is not None:
             await ctx.send("There's already a game running!")
             return
 
+        if not (MIN_BOARD_SIDE <= rows <= MAX_BOARD_SIDE and MIN_BOARD_SIDE <= columns <= MAX_BOARD_SIDE):
+            await ctx.send(f"Boards can have between {MIN_BOARD_SIDE} and {MAX_BOARD_SIDE} rows and columns.")
+            return
+
         minimum_solutions, = random.choices(range(len(SOLN_DISTR)), weights=SOLN_DISTR)
-        game = DuckGame(minimum_solutions=minimum_solutions)
+        # Small boards can't be guaranteed as many flights
+        minimum_solutions = min(minimum_solutions, rows * columns - 3)
+        game = DuckGame(rows, columns, minimum_solutions)
         game.running = True
-        self.current_games[ctx.channel.id] = game
-
-        game.board_msg = await self.send_board_embed(ctx, game)
-        game.found_msg = await self.send_found_embed(ctx)
-        await asyncio.sleep(GAME_DURATION)
+        self.current_games.add(game, channel=ctx.channel.id)
 
-        # Checking for the channel ID in the currently running games is not sufficient.
-        # The game could have been ended by a player, and a new game already started in the same channel.
-        if game.running:
-            try:
-                del self.current_games[ctx.channel.id]
+        try:
+            game.board_msg = await self.send_board_embed(ctx, game)
+            game.found_msg = await self.send_found_embed(ctx)
+            await asyncio.sleep(GAME_DURATION)
+
+            # Checking for the channel ID in the currently running games is not sufficient.
+            # The game could have been ended by a player, and a new game already started in the same channel.
+            if game.running:
+                self.current_games.finish(game, record=False)
                 await self.end_game(ctx.channel, game, end_message="Time's up!")
-            except KeyError:
-                pass
+        finally:
+            # Also frees the channel if the board couldn't be rendered or the command was cancelled.
+            self.current_games.finish(game, record=False)
 
     @commands.Cog.listener()
     async def on_message(self, msg: discord.Message) -> None:
@@ -214,19 +295,16 @@ class DuckGamesDirector(commands.Cog):
             return
 
         channel = msg.channel
-        if channel.id not in self.current_games:
+        game = self.current_games.by_channel(channel.id)
+        if game is None:
             return
 
-        game = self.current_games[channel.id]
         if msg.content.strip().lower() == "goose":
             # If all of the solutions have been claimed, i.e. the "goose" call is correct.
             if len(game.solutions) == len(game.claimed_answers):
-                try:
-                    del self.current_games[channel.id]
-                    game.scores[msg.author] += CORRECT_GOOSE
-                    await self.end_game(channel, game, end_message=f"{msg.author.display_name} GOOSED!")
-                except KeyError:
-                    pass
+                self.current_games.finish(game, record=False)
+                game.scores[msg.author] += CORRECT_GOOSE
+                await self.end_game(channel, game, end_message=f"{msg.author.display_name} GOOSED!")
             else:
                 await msg.add_reaction(EMOJI_WRONG)
                 game.scores[msg.author] += INCORRECT_GOOSE
@@ -255,11 +333,12 @@ class DuckGamesDirector(commands.Cog):
 
     async def send_board_embed(self, ctx: commands.Context, game: DuckGame) -> discord.Message:
         """Create and send an embed to display the board."""
-        image = assemble_board_image(game.board, game.rows, game.columns)
-        with BytesIO() as image_stream:
-            image.save(image_stream, format="png")
-            image_stream.seek(0)
-            file = discord.File(fp=image_stream, filename="board.png")
+        key = (tuple(game.board), game.columns)
+        image = self.board_images.get(key)
+        if image is None:
+            image = await render_service.submit(encode_board_image, game.board, game.rows, game.columns)
+            self.board_images.set(key, image)
+        file = discord.File(fp=BytesIO(image), filename="board.png")
         embed = discord.Embed(
             title="Duck Duck Duck Goose!",
             color=discord.Color.dark_purple(),
@@ -318,11 +397,11 @@ class DuckGamesDirector(commands.Cog):
     @with_role(*MODERATION_ROLES)
     async def stop_game(self, ctx: commands.Context) -> None:
         """Stop a currently running game. Only available to mods."""
-        try:
-            game = self.current_games.pop(ctx.channel.id)
-        except KeyError:
+        game = self.current_games.by_channel(ctx.channel.id)
+        if game is None:
             await ctx.send("No game currently running in this channel")
             return
+        self.current_games.finish(game, record=False)
         await self.end_game(ctx.channel, game, end_message="Game canceled.")
 
     @staticmethod
@@ -16,6 +16,7 @@ from pydis_core.utils.paste_service import PasteFile, PasteTooLongError, PasteUp
 from bot.bot import Bot
 from bot.constants import Channels, WHITELISTED_CHANNELS
 from bot.utils.decorators import whitelist_override
+from bot.utils.render import render_service
 
 log = get_logger(__name__)
 FORMATTED_CODE_REGEX = re.compile(
@@ -52,8 +53,12 @@ def _prepare_input(text: str) -> str:
     return text
 
 
-def _process_image(data: bytes, out_file: BinaryIO) -> None:
-    """Read `data` as an image file, and paste it on a white background."""
+def _process_image(data: bytes) -> bytes:
+    """
+    Read `data` as an image file, and paste it on a white background.
+
+    This is blocking, so it should be submitted to the render service.
+    """
     image = Image.open(BytesIO(data)).convert("RGBA")
     width, height = image.size
     background = Image.new("RGBA", (width + 2 * PAD, height + 2 * PAD), "WHITE")
@@ -62,7 +67,10 @@ def _process_image(data: bytes, out_file: BinaryIO) -> None:
     # when an RGBA image is passed as the mask, its alpha band is used.
     # this has the effect of skipping pasting the pixels where the image is transparent.
     background.paste(image, (PAD, PAD), image)
-    background.save(out_file)
+
+    out_file = BytesIO()
+    background.save(out_file, format="PNG")
+    return out_file.getvalue()
 
 
 class InvalidLatexError(Exception):
@@ -97,7 +105,8 @@ class Latex(commands.Cog):
             f"{LATEX_API_URL}/{response_json['filename']}",
             raise_for_status=True
         ) as response:
-            _process_image(await response.read(), out_file)
+            image = await render_service.submit(_process_image, await response.read())
+        out_file.write(image)
 
     async def _upload_to_pastebin(self, text: str) -> str | None:
         """Uploads `text` to the paste service, returning the url if successful."""
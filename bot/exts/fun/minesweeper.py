@@ -1,15 +1,21 @@
-from collections.abc import Iterator
+import functools
 from dataclasses import dataclass
-from random import randint, random
+from io import BytesIO
+from pathlib import Path
 
 import discord
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
 from discord.ext import commands
 from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.constants import Client
+from bot.exts.fun import _minesweeper_engine as engine
 from bot.utils.converters import CoordinateConverter
 from bot.utils.exceptions import UserNotPlayingError
+from bot.utils.render import render_service
+from bot.utils.sessions import SessionRegistry
 
 MESSAGE_MAPPING = {
     0: ":stop_button:",
@@ -21,28 +27,138 @@ MESSAGE_MAPPING = {
     6: ":six:",
     7: ":seven:",
     8: ":eight:",
-    9: ":nine:",
-    10: ":keycap_ten:",
-    "bomb": ":bomb:",
-    "hidden": ":grey_question:",
-    "flag": ":flag_black:",
-    "x": ":x:"
+    engine.HIDDEN_CELL: ":grey_question:",
+    engine.FLAG_CELL: ":flag_black:",
+    engine.MINE_CELL: ":bomb:",
+    engine.EXPLODED_CELL: ":x:",
 }
+ROW_EMOJIS = (
+    ":one:", ":two:", ":three:", ":four:", ":five:", ":six:", ":seven:", ":eight:", ":nine:", ":keycap_ten:"
+)
 
 log = get_logger(__name__)
 
-
-GameBoard = list[list[str | int]]
+# Games are played at the player's own pace, so only ones left untouched for a day count as abandoned
+GAME_TTL = 24 * 60 * 60  # seconds
+
+DEFAULT_SIZE = 10
+MIN_SIZE = 2
+MAX_WIDTH = 30
+MAX_HEIGHT = 30
+
+# Boards whose emoji don't fit in a single message are sent as an image instead
+MESSAGE_LIMIT = 2000
+
+# Board images
+CELL_SIZE = 32  # pixels
+FONT_PATH = Path("bot", "resources", "fun", "LuckiestGuy-Regular.ttf")
+CELL_FONT = ImageFont.truetype(str(FONT_PATH), size=22)
+LABEL_FONT = ImageFont.truetype(str(FONT_PATH), size=16)
+BACKGROUND_COLOUR = (49, 51, 56)
+LABEL_COLOUR = (220, 221, 222)
+HIDDEN_COLOUR = (189, 189, 189)
+REVEALED_COLOUR = (224, 224, 224)
+EXPLODED_COLOUR = (237, 66, 69)
+NUMBER_COLOURS = {
+    1: (0, 0, 255),
+    2: (0, 128, 0),
+    3: (255, 0, 0),
+    4: (0, 0, 128),
+    5: (128, 0, 0),
+    6: (0, 128, 128),
+    7: (0, 0, 0),
+    8: (128, 128, 128),
+}
 
 
-@dataclass
+def column_label(column: int) -> str:
+    """The letters of a column, lettered like a spreadsheet to match `CoordinateConverter`."""
+    label = ""
+    column += 1
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        label = chr(ord("a") + remainder) + label
+    return label
+
+
+def draw_cell(code: int) -> np.ndarray:
+    """Draws a single board cell, returning it as an RGB array."""
+    size = CELL_SIZE
+    centre = size / 2
+    hidden = code in (engine.HIDDEN_CELL, engine.FLAG_CELL)
+    if hidden:
+        background = HIDDEN_COLOUR
+    elif code == engine.EXPLODED_CELL:
+        background = EXPLODED_COLOUR
+    else:
+        background = REVEALED_COLOUR
+    tile = Image.new("RGB", (size, size), background)
+    draw = ImageDraw.Draw(tile)
+
+    if hidden:
+        # A raised button
+        draw.line((0, size - 1, 0, 0, size - 1, 0), fill=(255, 255, 255), width=3)
+        draw.line((1, size - 1, size - 1, size - 1, size - 1, 1), fill=(123, 123, 123), width=3)
+    else:
+        draw.rectangle((0, 0, size - 1, size - 1), outline=(128, 128, 128))
+
+    if code == engine.FLAG_CELL:
+        draw.line((centre + 2, size * 0.2, centre + 2, size * 0.8), fill=(0, 0, 0), width=2)
+        pennant = ((centre + 2, size * 0.2), (centre + 2, size * 0.55), (size * 0.2, size * 0.375))
+        draw.polygon(pennant, fill=(255, 0, 0))
+    elif code in (engine.MINE_CELL, engine.EXPLODED_CELL):
+        radius = size * 0.25
+        draw.ellipse((centre - radius, centre - radius, centre + radius, centre + radius), fill=(0, 0, 0))
+        draw.line((centre, size * 0.15, centre, size * 0.85), fill=(0, 0, 0), width=2)
+        draw.line((size * 0.15, centre, size * 0.85, centre), fill=(0, 0, 0), width=2)
+    elif code in NUMBER_COLOURS:
+        draw.text((centre, centre), str(code), fill=NUMBER_COLOURS[code], font=CELL_FONT, anchor="mm")
+
+    return np.asarray(tile)
+
+
+@functools.cache
+def cell_atlas() -> np.ndarray:
+    """Returns every cell drawing stacked into one array indexed by cell code, drawn once per process."""
+    return np.stack([draw_cell(code) for code in range(engine.CELL_CODES)])
+
+
+def draw_board_image(view: np.ndarray) -> Image.Image:
+    """Draws a board from `Board.view`, with its column letters along the top and row numbers down the side."""
+    height, width = view.shape
+    # (rows, columns, cell_height, cell_width, channels) -> (rows * cell_height, columns * cell_width, channels)
+    cells = cell_atlas()[view].swapaxes(1, 2).reshape(height * CELL_SIZE, width * CELL_SIZE, 3)
+
+    image = Image.new("RGB", ((width + 1) * CELL_SIZE, (height + 1) * CELL_SIZE), BACKGROUND_COLOUR)
+    image.paste(Image.fromarray(cells, "RGB"), (CELL_SIZE, CELL_SIZE))
+    draw = ImageDraw.Draw(image)
+    for column in range(width):
+        xy = ((column + 1.5) * CELL_SIZE, CELL_SIZE / 2)
+        draw.text(xy, column_label(column).upper(), fill=LABEL_COLOUR, font=LABEL_FONT, anchor="mm")
+    for row in range(height):
+        xy = (CELL_SIZE / 2, (row + 1.5) * CELL_SIZE)
+        draw.text(xy, str(row + 1), fill=LABEL_COLOUR, font=LABEL_FONT, anchor="mm")
+    return image
+
+
+def encode_board_image(view: np.ndarray) -> bytes:
+    """
+    Draw the board image and encode it as a PNG.
+
+    This is slow and blocking, so it should be submitted to the render service.
+    """
+    image_stream = BytesIO()
+    draw_board_image(view).save(image_stream, format="png")
+    return image_stream.getvalue()
+
+
+@dataclass(eq=False)
 class Game:
     """The data for a game."""
 
-    board: GameBoard
-    revealed: GameBoard
-    dm_msg: discord.Message
-    chat_msg: discord.Message
+    board: engine.Board
+    dm_msg: discord.Message | None
+    chat_msg: discord.Message | None
     activated_on_server: bool
 
 
@@ -51,7 +167,7 @@ class Minesweeper(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.games: dict[int, Game] = {}
+        self.games: SessionRegistry[Game] = SessionRegistry(ttl=GAME_TTL)
 
     @commands.group(name="minesweeper", aliases=("ms",), invoke_without_command=True)
     async def minesweeper_group(self, ctx: commands.Context) -> None:
@@ -59,61 +175,61 @@ class Minesweeper(commands.Cog):
         await self.bot.invoke_help_command(ctx)
 
     @staticmethod
-    def get_neighbours(x: int, y: int) -> Iterator[tuple[int, int]]:
-        """Get all the neighbouring x and y including it self."""
-        for x_ in [x - 1, x, x + 1]:
-            for y_ in [y - 1, y, y + 1]:
-                if x_ != -1 and x_ != 10 and y_ != -1 and y_ != 10:
-                    yield x_, y_
-
-    def generate_board(self, bomb_chance: float) -> GameBoard:
-        """Generate a 2d array for the board."""
-        board: GameBoard = [
-            [
-                "bomb" if random() <= bomb_chance else "number"
-                for _ in range(10)
-            ] for _ in range(10)
-        ]
-
-        # make sure there is always a free cell
-        board[randint(0, 9)][randint(0, 9)] = "number"
-
-        for y, row in enumerate(board):
-            for x, cell in enumerate(row):
-                if cell == "number":
-                    # calculate bombs near it
-                    bombs = 0
-                    for x_, y_ in self.get_neighbours(x, y):
-                        if board[y_][x_] == "bomb":
-                            bombs += 1
-                    board[y][x] = bombs
-        return board
-
-    @staticmethod
-    def format_for_discord(board: GameBoard) -> str:
-        """Format the board as a string for Discord."""
-        discord_msg = (
-            ":stop_button:    :regional_indicator_a: :regional_indicator_b: :regional_indicator_c: "
-            ":regional_indicator_d: :regional_indicator_e: :regional_indicator_f: :regional_indicator_g: "
-            ":regional_indicator_h: :regional_indicator_i: :regional_indicator_j:\n\n"
-        )
+    def format_for_discord(view: np.ndarray) -> str | None:
+        """Format the board as a string for Discord, or return None if there aren't enough emoji to label it."""
+        height, width = view.shape
+        if height > len(ROW_EMOJIS) or width > 26:
+            return None
+
+        discord_msg = ":stop_button:    " + " ".join(
+            f":regional_indicator_{column_label(column)}:" for column in range(width)
+        ) + "\n\n"
         rows = []
-        for row_number, row in enumerate(board):
-            new_row = f"{MESSAGE_MAPPING[row_number + 1]}    "
+        for row_number, row in enumerate(view.tolist()):
+            new_row = f"{ROW_EMOJIS[row_number]}    "
             new_row += " ".join(MESSAGE_MAPPING[cell] for cell in row)
             rows.append(new_row)
 
         discord_msg += "\n".join(rows)
         return discord_msg
 
+    @staticmethod
+    async def render_board(board: engine.Board, heading_length: int) -> tuple[str, bytes | None]:
+        """
+        Render the board as emoji if it fits in a message after a heading of the given length, or as a PNG otherwise.
+
+        Returns the emoji board, which is empty for an image, along with the image if there is one.
+        """
+        view = board.view()
+        text = Minesweeper.format_for_discord(view)
+        if text is not None and heading_length + len(text) <= MESSAGE_LIMIT:
+            return text, None
+        return "", await render_service.submit(encode_board_image, view)
+
     @minesweeper_group.command(name="start")
-    async def start_command(self, ctx: commands.Context, bomb_chance: float = .2) -> None:
-        """Start a game of Minesweeper."""
-        if ctx.author.id in self.games:  # Player is already playing
+    async def start_command(
+        self,
+        ctx: commands.Context,
+        bomb_chance: float = .2,
+        width: int = DEFAULT_SIZE,
+        height: int = DEFAULT_SIZE,
+    ) -> None:
+        """
+        Start a game of Minesweeper.
+
+        Boards can be up to 30x30 cells, such as 30x16 for expert, and are sent as images when too big for emoji.
+        """
+        if self.games.is_playing(ctx.author.id):  # Player is already playing
             await ctx.send(f"{ctx.author.mention} you already have a game running!", delete_after=2)
             await ctx.message.delete(delay=2)
             return
 
+        if not (MIN_SIZE <= width <= MAX_WIDTH and MIN_SIZE <= height <= MAX_HEIGHT):
+            await ctx.send(
+                f":x: {ctx.author.mention}, boards can be from {MIN_SIZE}x{MIN_SIZE} to {MAX_WIDTH}x{MAX_HEIGHT} cells."
+            )
+            return
+
         try:
             await ctx.author.send(
                 f"Play by typing: `{Client.prefix}ms reveal xy [xy]` or `{Client.prefix}ms flag xy [xy]` \n"
@@ -125,143 +241,112 @@ class Minesweeper(commands.Cog):
             return
 
         # Add game to list
-        board: GameBoard = self.generate_board(bomb_chance)
-        revealed_board: GameBoard = [["hidden"] * 10 for _ in range(10)]
-        dm_msg = await ctx.author.send(f"Here's your board!\n{self.format_for_discord(revealed_board)}")
-
-        if ctx.guild:
-            await ctx.send(f"{ctx.author.mention} is playing Minesweeper.")
-            chat_msg = await ctx.send(f"Here's their board!\n{self.format_for_discord(revealed_board)}")
-        else:
-            chat_msg = None
-
-        self.games[ctx.author.id] = Game(
-            board=board,
-            revealed=revealed_board,
-            dm_msg=dm_msg,
-            chat_msg=chat_msg,
-            activated_on_server=ctx.guild is not None
-        )
-
-    async def update_boards(self, ctx: commands.Context) -> None:
-        """Update both playing boards."""
-        game = self.games[ctx.author.id]
-        await game.dm_msg.delete()
-        game.dm_msg = await ctx.author.send(f"Here's your board!\n{self.format_for_discord(game.revealed)}")
+        board = engine.Board.generate(width, height, bomb_chance)
+        game = Game(board=board, dm_msg=None, chat_msg=None, activated_on_server=ctx.guild is not None)
+        self.games.add(game, players=[ctx.author.id])
+
+        try:
+            if ctx.guild:
+                await ctx.send(f"{ctx.author.mention} is playing Minesweeper.")
+            await self.send_boards(ctx, game)
+        except Exception:
+            self.games.finish(game, record=False)
+            raise
+
+    def get_game(self, ctx: commands.Context) -> Game:
+        """Get the game of the invoking player, keeping it from expiring."""
+        game = self.games.by_player(ctx.author.id)
+        if game is None:
+            raise UserNotPlayingError
+        self.games.touch(game)
+        return game
+
+    async def send_boards(self, ctx: commands.Context, game: Game, notice: str = "") -> None:
+        """Send the board to the player, replacing the previous one, and update the board in the server chat."""
+        dm_heading = f"{notice}Here's your board!\n"
+        chat_heading = f"{notice}Here's their board!\n"
+        text, image = await self.render_board(game.board, max(len(dm_heading), len(chat_heading)))
+
+        if game.dm_msg is not None:
+            await game.dm_msg.delete()
+        dm_file = image and discord.File(BytesIO(image), filename="minesweeper.png")
+        game.dm_msg = await ctx.author.send(dm_heading + text, file=dm_file)
+
         if game.activated_on_server:
-            await game.chat_msg.edit(content=f"Here's their board!\n{self.format_for_discord(game.revealed)}")
+            attachments = [discord.File(BytesIO(image), filename="minesweeper.png")] if image else []
+            if game.chat_msg is None:
+                game.chat_msg = await ctx.send(chat_heading + text, files=attachments)
+            else:
+                await game.chat_msg.edit(content=chat_heading + text, attachments=attachments)
 
     @commands.dm_only()
     @minesweeper_group.command(name="flag")
     async def flag_command(self, ctx: commands.Context, *coordinates: CoordinateConverter) -> None:
         """Place multiple flags on the board."""
-        if ctx.author.id not in self.games:
-            raise UserNotPlayingError
-        board: GameBoard = self.games[ctx.author.id].revealed
+        game = self.get_game(ctx)
+        if not await self.check_coordinates(ctx, game.board, coordinates):
+            return
+
         for x, y in coordinates:
-            if board[y][x] == "hidden":
-                board[y][x] = "flag"
+            game.board.flag(x, y)
 
-        await self.update_boards(ctx)
+        await self.send_boards(ctx, game)
 
     @staticmethod
-    def reveal_bombs(revealed: GameBoard, board: GameBoard) -> None:
-        """Reveals all the bombs."""
-        for y, row in enumerate(board):
-            for x, cell in enumerate(row):
-                if cell == "bomb":
-                    revealed[y][x] = cell
-
-    async def lost(self, ctx: commands.Context) -> None:
+    async def check_coordinates(
+        ctx: commands.Context, board: engine.Board, coordinates: tuple[tuple[int, int], ...]
+    ) -> bool:
+        """Check that all the coordinates are on the board, telling the player if they aren't."""
+        if all(board.contains(x, y) for x, y in coordinates):
+            return True
+
+        last_column = column_label(board.width - 1)
+        await ctx.send(f":x: Those aren't all on the board, which goes from a1 to {last_column}{board.height}.")
+        return False
+
+    async def lost(self, ctx: commands.Context, game: Game) -> None:
         """The player lost the game."""
-        game = self.games[ctx.author.id]
-        self.reveal_bombs(game.revealed, game.board)
         await ctx.author.send(":fire: You lost! :fire:")
         if game.activated_on_server:
             await game.chat_msg.channel.send(f":fire: {ctx.author.mention} just lost Minesweeper! :fire:")
 
-    async def won(self, ctx: commands.Context) -> None:
+    async def won(self, ctx: commands.Context, game: Game) -> None:
         """The player won the game."""
-        game = self.games[ctx.author.id]
         await ctx.author.send(":tada: You won! :tada:")
         if game.activated_on_server:
             await game.chat_msg.channel.send(f":tada: {ctx.author.mention} just won Minesweeper! :tada:")
 
-    def reveal_zeros(self, revealed: GameBoard, board: GameBoard, x: int, y: int) -> None:
-        """Recursively reveal adjacent cells when a 0 cell is encountered."""
-        for x_, y_ in self.get_neighbours(x, y):
-            if revealed[y_][x_] != "hidden":
-                continue
-            revealed[y_][x_] = board[y_][x_]
-            if board[y_][x_] == 0:
-                self.reveal_zeros(revealed, board, x_, y_)
-
-    async def check_if_won(self, ctx: commands.Context, revealed: GameBoard, board: GameBoard) -> bool:
-        """Checks if a player has won."""
-        if any(
-            revealed[y][x] in ["hidden", "flag"] and board[y][x] != "bomb"
-            for x in range(10)
-            for y in range(10)
-        ):
-            return False
-
-        await self.won(ctx)
-        return True
-
-    async def reveal_one(
-        self,
-        ctx: commands.Context,
-        revealed: GameBoard,
-        board: GameBoard,
-        x: int,
-        y: int
-    ) -> bool:
-        """
-        Reveal one square.
-
-        return is True if the game ended, breaking the loop in `reveal_command` and deleting the game.
-        """
-        revealed[y][x] = board[y][x]
-        if board[y][x] == "bomb":
-            await self.lost(ctx)
-            revealed[y][x] = "x"  # mark bomb that made you lose with a x
-            return True
-        if board[y][x] == 0:
-            self.reveal_zeros(revealed, board, x, y)
-        return await self.check_if_won(ctx, revealed, board)
-
     @commands.dm_only()
     @minesweeper_group.command(name="reveal")
     async def reveal_command(self, ctx: commands.Context, *coordinates: CoordinateConverter) -> None:
         """Reveal multiple cells."""
-        if ctx.author.id not in self.games:
-            raise UserNotPlayingError
-        game = self.games[ctx.author.id]
-        revealed: GameBoard = game.revealed
-        board: GameBoard = game.board
+        game = self.get_game(ctx)
+        board = game.board
+        if not await self.check_coordinates(ctx, board, coordinates):
+            return
 
         for x, y in coordinates:
-            # reveal_one returns True if the revealed cell is a bomb or the player won, ending the game
-            if await self.reveal_one(ctx, revealed, board, x, y):
-                await self.update_boards(ctx)
-                del self.games[ctx.author.id]
+            board.reveal(x, y)
+            # The game ends if the revealed cell is a bomb or the player won
+            if board.lost or board.won:
                 break
-        else:
-            await self.update_boards(ctx)
+
+        if board.lost:
+            await self.lost(ctx, game)
+        elif board.won:
+            await self.won(ctx, game)
+
+        await self.send_boards(ctx, game)
+        if board.lost or board.won:
+            self.games.finish(game, record=False)
 
     @minesweeper_group.command(name="end")
     async def end_command(self, ctx: commands.Context) -> None:
         """End your current game."""
-        if ctx.author.id not in self.games:
-            raise UserNotPlayingError
-        game = self.games[ctx.author.id]
-        game.revealed = game.board
-        await self.update_boards(ctx)
-        new_msg = f":no_entry: Game canceled. :no_entry:\n{game.dm_msg.content}"
-        await game.dm_msg.edit(content=new_msg)
-        if game.activated_on_server:
-            await game.chat_msg.edit(content=new_msg)
-        del self.games[ctx.author.id]
+        game = self.get_game(ctx)
+        game.board.reveal_all()
+        await self.send_boards(ctx, game, notice=":no_entry: Game canceled. :no_entry:\n")
+        self.games.finish(game, record=False)
 
 
 async def setup(bot: Bot) -> None:
@@ -1,27 +1,34 @@
 import asyncio
 import colorsys
+import json
 import os
 import random
 import re
 import string
 import textwrap
+import time
 import urllib
-from functools import partial
 from io import BytesIO
 from typing import Any
 
 from PIL import Image, ImageDraw, ImageFont
 from aiohttp import ClientTimeout
+from async_rediscache import RedisCache
 from discord import Colour, Embed, File, Member, Message, Reaction
 from discord.errors import HTTPException
+from discord.ext import tasks
 from discord.ext.commands import Cog, CommandError, Context, bot_has_permissions, group
+from pydis_core.utils import scheduling
 from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.constants import ERROR_REPLIES, Tokens
 from bot.exts.fun.snakes import _utils as utils
 from bot.exts.fun.snakes._converter import Snake
+from bot.utils.caching import LRUCache, image_size
 from bot.utils.decorators import locked
+from bot.utils.image_encoding import encode_image, image_extension
+from bot.utils.render import render_service
 
 log = get_logger(__name__)
 
@@ -91,6 +98,10 @@ MSG_MAX = 100
 
 # get_snek constants
 URL = "https://en.wikipedia.org/w/api.php?"
+SNEK_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+PREFETCH_INTERVAL = 60  # minutes
+PREFETCH_COUNT = 25  # how many of the most requested snakes to keep warm
+PREFETCH_DELAY = 5  # seconds between prefetches, to leave room for user requests
 
 # snake guess responses
 INCORRECT_GUESS = (
@@ -145,14 +156,28 @@ class Snakes(Cog):
     wiki_brief = re.compile(r"(.*?)(=+ (.*?) =+)", flags=re.DOTALL)
     valid_image_extensions = ("gif", "png", "jpeg", "jpg", "webp")
 
+    # RedisCache[snake name, JSON encoded {"fetched_at": timestamp, "info": snake info}]
+    snek_cache = RedisCache()
+    # RedisCache[snake name, number of times it's been requested]
+    snek_requests = RedisCache()
+
     def __init__(self, bot: Bot):
         self.active_sal = {}
+        # Player avatars resized for the Snakes and Ladders board, keyed by avatar
+        self.board_avatars: LRUCache[str, Image.Image] = LRUCache(utils.AVATAR_SPRITE_CACHE_SIZE, sizeof=image_size)
         self.bot = bot
         self.snake_names = utils.get_resource("snake_names")
         self.snake_idioms = utils.get_resource("snake_idioms")
         self.snake_quizzes = utils.get_resource("snake_quiz")
         self.snake_facts = utils.get_resource("snake_facts")
         self.num_movie_pages = None
+        # Wikipedia lookups currently in progress, so concurrent requests for a snake share a single fetch
+        self.snek_fetches: dict[str, asyncio.Future] = {}
+        self.prefetch_popular_sneks.start()
+
+    def cog_unload(self) -> None:
+        """Stop prefetching snakes."""
+        self.prefetch_popular_sneks.cancel()
 
     # region: Helper methods
     @staticmethod
@@ -248,11 +273,7 @@ class Snakes(Cog):
             offset += bottom - top + 4
 
         # Get the image contents as a BufferIO object
-        buffer = BytesIO()
-        full_image.save(buffer, "PNG")
-        buffer.seek(0)
-
-        return buffer
+        return BytesIO(encode_image(full_image))
 
     @staticmethod
     def _snakify(message: str) -> str:
@@ -301,10 +322,62 @@ class Snakes(Cog):
         return long_message
 
     async def _get_snek(self, name: str) -> dict[str, Any]:
+        """
+        Gets all the data from a wikipedia article about a snake, from the cache if possible.
+
+        Concurrent requests for the same snake are coalesced into a single Wikipedia lookup.
+        """
+        await self.snek_requests.increment(name)
+
+        snake_info = await self._get_cached_snek(name)
+        if snake_info is not None:
+            return snake_info
+
+        return await self._fetch_snek_once(name)
+
+    async def _get_cached_snek(self, name: str, max_age: float = SNEK_CACHE_TTL) -> dict[str, Any] | None:
+        """Returns the cached data about a snake if it was fetched less than `max_age` seconds ago, otherwise None."""
+        cached = await self.snek_cache.get(name)
+        if cached is None:
+            return None
+
+        cached = json.loads(cached)
+        if time.time() - cached["fetched_at"] > max_age:
+            return None
+        return cached["info"]
+
+    async def _fetch_snek_once(self, name: str) -> dict[str, Any]:
+        """Fetches and caches the data about a snake, joining the fetch already in progress for it if there is one."""
+        if name not in self.snek_fetches:
+            fetched = asyncio.get_running_loop().create_future()
+            fetched.add_done_callback(lambda _: self.snek_fetches.pop(name, None))
+            self.snek_fetches[name] = fetched
+            scheduling.create_task(self._fetch_snek_into(name, fetched))
+
+        # Shielded, so that one caller being cancelled doesn't cancel the fetch for everyone else
+        return await asyncio.shield(self.snek_fetches[name])
+
+    async def _fetch_snek_into(self, name: str, fetched: asyncio.Future) -> None:
+        """
+        Fetches the data about a snake into the `fetched` future, for `_fetch_snek_once`.
+
+        The scheduling task discards the return value of its coroutine, so the result is passed on through the future,
+        while any error is both raised to the waiting callers and logged by the task.
+        """
+        try:
+            fetched.set_result(await self._fetch_snek(name))
+        except asyncio.CancelledError:
+            fetched.cancel()
+            raise
+        except Exception as e:
+            fetched.set_exception(e)
+            raise
+
+    async def _fetch_snek(self, name: str) -> dict[str, Any]:
         """
         Fetches all the data from a wikipedia article about a snake.
 
-        Builds a dict that the .get() method can use.
+        Builds a dict that the .get() method can use, and caches it if the lookup succeeded.
 
         Created by Ava and eivl.
         """
@@ -319,11 +392,11 @@ class Snakes(Cog):
             "srlimit": "1",
         }
 
-        json = await self._fetch(URL, params=params)
+        response = await self._fetch(URL, params=params)
 
         # Wikipedia does have a error page
         try:
-            pageid = json["query"]["search"][0]["pageid"]
+            pageid = response["query"]["search"][0]["pageid"]
         except KeyError:
             # Wikipedia error page ID(?)
             pageid = 41118
@@ -340,15 +413,15 @@ class Snakes(Cog):
             "pageids": pageid
         }
 
-        json = await self._fetch(URL, params=params)
+        response = await self._fetch(URL, params=params)
 
         # Constructing dict - handle exceptions later
         try:
-            snake_info["title"] = json["query"]["pages"][f"{pageid}"]["title"]
-            snake_info["extract"] = json["query"]["pages"][f"{pageid}"]["extract"]
-            snake_info["images"] = json["query"]["pages"][f"{pageid}"]["images"]
-            snake_info["fullurl"] = json["query"]["pages"][f"{pageid}"]["fullurl"]
-            snake_info["pageid"] = json["query"]["pages"][f"{pageid}"]["pageid"]
+            snake_info["title"] = response["query"]["pages"][f"{pageid}"]["title"]
+            snake_info["extract"] = response["query"]["pages"][f"{pageid}"]["extract"]
+            snake_info["images"] = response["query"]["pages"][f"{pageid}"]["images"]
+            snake_info["fullurl"] = response["query"]["pages"][f"{pageid}"]["fullurl"]
+            snake_info["pageid"] = response["query"]["pages"][f"{pageid}"]["pageid"]
         except KeyError:
             snake_info["error"] = True
 
@@ -400,8 +473,37 @@ class Snakes(Cog):
 
         snake_info["info"] = info
 
+        if not snake_info.get("error"):
+            await self.snek_cache.set(name, json.dumps({"fetched_at": time.time(), "info": snake_info}))
+
         return snake_info
 
+    @tasks.loop(minutes=PREFETCH_INTERVAL)
+    async def prefetch_popular_sneks(self) -> None:
+        """
+        Keeps the most requested snakes cached, refreshing any that would expire before the next run.
+
+        Snakes are fetched one at a time with a delay in between, so this never competes with user requests.
+        """
+        requests = await self.snek_requests.to_dict()
+        popular = sorted(requests, key=requests.get, reverse=True)[:PREFETCH_COUNT]
+
+        for name in popular:
+            if await self._get_cached_snek(name, max_age=SNEK_CACHE_TTL - PREFETCH_INTERVAL * 60) is not None:
+                continue
+
+            log.trace(f"Prefetching snake {name!r}.")
+            try:
+                await self._fetch_snek_once(name)
+            except Exception:
+                log.exception(f"Failed to prefetch snake {name!r}.")
+            await asyncio.sleep(PREFETCH_DELAY)
+
+    @prefetch_popular_sneks.before_loop
+    async def before_prefetch(self) -> None:
+        """Wait for the bot to be ready before prefetching."""
+        await self.bot.wait_until_guild_available()
+
     async def _get_snake_name(self) -> dict[str, str]:
         """Gets a random snake name."""
         return random.choice(self.snake_names)
@@ -592,10 +694,12 @@ class Snakes(Cog):
         await board_id.clear_reactions()
 
     @snakes_group.command(name="draw")
-    async def draw_command(self, ctx: Context) -> None:
+    async def draw_command(self, ctx: Context, animated: bool = False) -> None:
         """
         Draws a random snek using Perlin noise.
 
+        If `animated` is given, the snek slithers around in a GIF instead.
+
         Written by Momo and kel.
         Modified by juan and lemon.
         """
@@ -616,19 +720,32 @@ class Snakes(Cog):
             # Build and send the snek
             text = random.choice(self.snake_idioms)["idiom"]
             factory = utils.PerlinNoiseFactory(dimension=1, octaves=2)
-            image_frame = utils.create_snek_frame(
-                factory,
-                snake_width=width,
-                snake_length=length,
-                snake_color=snek_color,
-                text=text,
-                text_color=text_color,
-                bg_color=bg_color
-            )
-            png_bytes = utils.frame_to_png_bytes(image_frame)
-            file = File(png_bytes, filename="snek.png")
+            snek_options = {
+                "snake_width": width,
+                "snake_length": length,
+                "snake_color": snek_color,
+                "text": text,
+                "text_color": text_color,
+                "bg_color": bg_color,
+            }
+            if animated:
+                gif_bytes = await render_service.submit(self._render_snek_gif, factory, snek_options)
+                file = File(gif_bytes, filename="snek.gif")
+            else:
+                png_bytes = await render_service.submit(self._render_snek_frame, factory, snek_options)
+                file = File(png_bytes, filename="snek.png")
             await ctx.send(file=file)
 
+    @staticmethod
+    def _render_snek_frame(factory: utils.PerlinNoiseFactory, snek_options: dict[str, Any]) -> BytesIO:
+        """Draw a single snek frame and encode it as a PNG, in the render service."""
+        return utils.frame_to_png_bytes(utils.create_snek_frame(factory, **snek_options))
+
+    @staticmethod
+    def _render_snek_gif(factory: utils.PerlinNoiseFactory, snek_options: dict[str, Any]) -> BytesIO:
+        """Draw a slithering snek GIF, in the render service."""
+        return utils.create_snek_gif(factory, **snek_options)
+
     @snakes_group.command(name="get")
     @bot_has_permissions(manage_messages=True)
     @locked()
@@ -1015,13 +1132,13 @@ class Snakes(Cog):
 
             stream.seek(0)
 
-            func = partial(self._generate_card, stream, content)
-            final_buffer = await self.bot.loop.run_in_executor(None, func)
+            final_buffer = await render_service.submit(self._generate_card, stream, content)
+            extension = image_extension(final_buffer.getvalue())
 
         # Send it!
         await ctx.send(
             f"A wild {content['name'].title()} appears!",
-            file=File(final_buffer, filename=content["name"].replace(" ", "") + ".png")
+            file=File(final_buffer, filename=content["name"].replace(" ", "") + f".{extension}")
         )
 
     @snakes_group.command(name="fact")
@@ -2,16 +2,22 @@ import io
 import json
 import math
 import random
-from itertools import product
+from collections.abc import Sequence
+from itertools import pairwise, product
 from pathlib import Path
 
+import numpy as np
 from PIL import Image
 from PIL.ImageDraw import ImageDraw
 from discord import File, Member, Reaction, User
 from discord.ext.commands import Cog, Context
+from numpy.typing import ArrayLike
 from pydis_core.utils.logging import get_logger
 
 from bot.constants import Emojis, MODERATION_ROLES
+from bot.utils.assets import open_asset
+from bot.utils.image_encoding import encode_image
+from bot.utils.render import render_service
 
 SNAKE_RESOURCES = Path("bot/resources/fun/snakes").absolute()
 
@@ -68,6 +74,9 @@ BOARD_MARGIN = (10, 0)       # margins, in pixels (for player icons)
 # Should a power of 2 and higher than BOARD_PLAYER_SIZE
 PLAYER_ICON_IMAGE_SIZE = 32
 MAX_PLAYERS = 4              # depends on the board size/quality, 4 is for the default board
+BOARD_ASSET = "fun/snakes/snakes_and_ladders/board.jpg"  # relative to the resources directory
+BOARD_JPEG_QUALITY = 85      # quality of the board image sent every round
+AVATAR_SPRITE_CACHE_SIZE = 1024 ** 2  # bytes of player avatars kept across games, resized for the board
 
 # board definition (from, to)
 BOARD = {
@@ -103,16 +112,17 @@ DEFAULT_IMAGE_DIMENSIONS = (200, 200)
 DEFAULT_SNAKE_LENGTH = 22
 DEFAULT_SNAKE_WIDTH = 8
 DEFAULT_SEGMENT_LENGTH_RANGE = (7, 10)
-DEFAULT_IMAGE_MARGINS = (50, 50)
 DEFAULT_TEXT = "snek\nit\nup"
 DEFAULT_TEXT_POSITION = (
     10,
     10
 )
 DEFAULT_TEXT_COLOR = 0xf2ea15
-X = 0
-Y = 1
 ANGLE_RANGE = math.pi * 2
+GRADIENT_TABLE_SIZE = 256
+DEFAULT_SNEK_FRAME_COUNT = 30
+DEFAULT_SNEK_FRAME_SHIFT = 0.05
+DEFAULT_SNEK_FRAME_DURATION = 80  # milliseconds
 
 
 def get_resource(file: str) -> list[dict]:
@@ -120,25 +130,21 @@ def get_resource(file: str) -> list[dict]:
     return json.loads((SNAKE_RESOURCES / f"{file}.json").read_text("utf-8"))
 
 
-def smoothstep(t: float) -> float:
+def smoothstep(t: float | np.ndarray) -> float | np.ndarray:
     """Smooth curve with a zero derivative at 0 and 1, making it useful for interpolating."""
     return t * t * (3. - 2. * t)
 
 
-def lerp(t: float, a: float, b: float) -> float:
-    """Linear interpolation between a and b, given a fraction t."""
-    return a + t * (b - a)
-
-
 class PerlinNoiseFactory:
     """
     Callable that produces Perlin noise for an arbitrary point in an arbitrary number of dimensions.
 
     The underlying grid is aligned with the integers.
 
-    There is no limit to the coordinates used; new gradients are generated on the fly as necessary.
+    Gradients are looked up from a fixed size table by hashing the grid coordinates, so memory use stays bounded
+    no matter which coordinates are used; the pattern repeats every `GRADIENT_TABLE_SIZE` units as a result.
 
-    Taken from: https://gist.github.com/eevee/26f547457522755cb1fb8739d0ea89a1
+    Based on: https://gist.github.com/eevee/26f547457522755cb1fb8739d0ea89a1
     Licensed under ISC
     """
 
@@ -168,11 +174,17 @@ class PerlinNoiseFactory:
         # by this to scale to ±1
         self.scale_factor = 2 * dimension ** -0.5
 
-        self.gradient = {}
+        permutation = list(range(GRADIENT_TABLE_SIZE))
+        random.shuffle(permutation)
+        self.permutation = np.array(permutation)
+        self.gradient = np.array([self._generate_gradient() for _ in range(GRADIENT_TABLE_SIZE)])
+
+        # Every corner of a grid cell, as offsets from its minimum corner
+        self.corners = np.array(list(product((0, 1), repeat=dimension)))
 
     def _generate_gradient(self) -> tuple[float, ...]:
         """
-        Generate a random unit vector at each grid point.
+        Generate a random unit vector for a grid point.
 
         This is the "gradient" vector, in that the grid tile slopes towards it
         """
@@ -190,71 +202,68 @@ class PerlinNoiseFactory:
         scale = sum(n * n for n in random_point) ** -0.5
         return tuple(coord * scale for coord in random_point)
 
+    def _points_array(self, points: ArrayLike) -> np.ndarray:
+        """Convert `points` to an array of shape (n, dimension), accepting a flat sequence in 1 dimension."""
+        points = np.asarray(points, dtype=float)
+        if self.dimension == 1 and points.ndim == 1:
+            points = points[:, np.newaxis]
+        if points.ndim != 2 or points.shape[1] != self.dimension:
+            raise ValueError(f"Expected points with {self.dimension} values, got an array of shape {points.shape}")
+        return points
+
+    def _gradients_at(self, grid_points: np.ndarray) -> np.ndarray:
+        """Look up the gradient of each of the given integer grid points, by hashing them into the table."""
+        index = np.zeros(len(grid_points), dtype=int)
+        for i in range(self.dimension):
+            index = self.permutation[(index + grid_points[:, i]) % GRADIENT_TABLE_SIZE]
+        return self.gradient[index]
+
+    def plain_noise(self, points: ArrayLike) -> np.ndarray:
+        """
+        Get plain noise for many points at once, without taking into account either octaves or tiling.
+
+        `points` should have the shape (n, dimension), or just (n,) in 1 dimension.
+        """
+        points = self._points_array(points)
+        min_coords = np.floor(points)
+        offsets = points - min_coords
+        min_coords = min_coords.astype(int)
+
+        # Interpolating with smoothstep smooths out the slope as you pass from one grid cell into the next.
+        weights = smoothstep(offsets)
+
+        noise = np.zeros(len(points))
+        for corner in self.corners:
+            # The dot product of each corner's gradient and the point's distance from that corner
+            # gives the corner's "influence" on the point, which is weighted by how close to it the point is.
+            dots = (self._gradients_at(min_coords + corner) * (offsets - corner)).sum(axis=1)
+            noise += dots * np.where(corner, weights, 1 - weights).prod(axis=1)
+
+        return noise * self.scale_factor
+
     def get_plain_noise(self, *point) -> float:
         """Get plain noise for a single point, without taking into account either octaves or tiling."""
         if len(point) != self.dimension:
             raise ValueError(
                 f"Expected {self.dimension} values, got {len(point)}"
             )
+        return float(self.plain_noise([point])[0])
 
-        # Build a list of the (min, max) bounds in each dimension
-        grid_coords = []
-        for coord in point:
-            min_coord = math.floor(coord)
-            max_coord = min_coord + 1
-            grid_coords.append((min_coord, max_coord))
-
-        # Compute the dot product of each gradient vector and the point's
-        # distance from the corresponding grid point.  This gives you each
-        # gradient's "influence" on the chosen point.
-        dots = []
-        for grid_point in product(*grid_coords):
-            if grid_point not in self.gradient:
-                self.gradient[grid_point] = self._generate_gradient()
-            gradient = self.gradient[grid_point]
-
-            dot = 0
-            for i in range(self.dimension):
-                dot += gradient[i] * (point[i] - grid_point[i])
-            dots.append(dot)
-
-        # Interpolate all those dot products together.  The interpolation is
-        # done with smoothstep to smooth out the slope as you pass from one
-        # grid cell into the next.
-        # Due to the way product() works, dot products are ordered such that
-        # the last dimension alternates: (..., min), (..., max), etc.  So we
-        # can interpolate adjacent pairs to "collapse" that last dimension.  Then
-        # the results will alternate in their second-to-last dimension, and so
-        # forth, until we only have a single value left.
-        dim = self.dimension
-        while len(dots) > 1:
-            dim -= 1
-            s = smoothstep(point[dim] - grid_coords[dim][0])
-
-            next_dots = []
-            while dots:
-                next_dots.append(lerp(s, dots.pop(0), dots.pop(0)))
-
-            dots = next_dots
-
-        return dots[0] * self.scale_factor
-
-    def __call__(self, *point) -> float:
+    def noise(self, points: ArrayLike) -> np.ndarray:
         """
-        Get the value of this Perlin noise function at the given point.
+        Get the value of this Perlin noise function at many points at once.
 
-        The number of values given should match the number of dimensions.
+        `points` should have the shape (n, dimension), or just (n,) in 1 dimension.
         """
-        ret = 0
+        points = self._points_array(points)
+        tile = np.array(self.tile[:self.dimension])
+
+        ret = np.zeros(len(points))
         for o in range(self.octaves):
             o2 = 1 << o
-            new_point = []
-            for i, coord in enumerate(point):
-                coord *= o2
-                if self.tile[i]:
-                    coord %= self.tile[i] * o2
-                new_point.append(coord)
-            ret += self.get_plain_noise(*new_point) / o2
+            new_points = points * o2
+            new_points = np.where(tile, new_points % np.where(tile, tile * o2, 1), new_points)
+            ret += self.plain_noise(new_points) / o2
 
         # Need to scale n back down since adding all those extra octaves has
         # probably expanded it beyond ±1
@@ -277,81 +286,184 @@ class PerlinNoiseFactory:
 
         return ret
 
+    def __call__(self, *point) -> float:
+        """
+        Get the value of this Perlin noise function at the given point.
 
-def create_snek_frame(
-        perlin_factory: PerlinNoiseFactory, perlin_lookup_vertical_shift: float = 0,
+        The number of values given should match the number of dimensions.
+        """
+        if len(point) != self.dimension:
+            raise ValueError(
+                f"Expected {self.dimension} values, got {len(point)}"
+            )
+        return float(self.noise([point])[0])
+
+
+def snek_paths(
+        perlin_factory: PerlinNoiseFactory, vertical_shifts: Sequence[float], segment_lengths: Sequence[int]
+) -> np.ndarray:
+    """
+    Computes the points along a snek for each of the given Perlin noise shifts, in a single noise lookup.
+
+    Each segment's angle comes from the noise along the snek's length, offset by the frame's shift in the
+    Y-dimension, so gradually increasing shifts make the snek slither.
+    Returns an array of shape (frames, segments + 1, 2), with every snek starting at the origin.
+    """
+    snake_length = len(segment_lengths)
+    positions = np.arange(1, snake_length + 1) / (snake_length + 1)
+    lookups = positions + np.asarray(vertical_shifts, dtype=float)[:, np.newaxis]
+    angles = perlin_factory.plain_noise(lookups.ravel()).reshape(lookups.shape) * ANGLE_RANGE
+
+    steps = np.stack((np.cos(angles), np.sin(angles)), axis=-1) * np.asarray(segment_lengths)[:, np.newaxis]
+    paths = np.zeros((len(lookups), snake_length + 1, 2))
+    paths[:, 1:] = np.cumsum(steps, axis=1)
+    return paths
+
+
+def draw_snek(
+        path: np.ndarray,
+        shift: np.ndarray,
         image_dimensions: tuple[int, int] = DEFAULT_IMAGE_DIMENSIONS,
-        image_margins: tuple[int, int] = DEFAULT_IMAGE_MARGINS,
-        snake_length: int = DEFAULT_SNAKE_LENGTH,
         snake_color: int = DEFAULT_SNAKE_COLOR, bg_color: int = DEFAULT_BACKGROUND_COLOR,
-        segment_length_range: tuple[int, int] = DEFAULT_SEGMENT_LENGTH_RANGE, snake_width: int = DEFAULT_SNAKE_WIDTH,
+        snake_width: int = DEFAULT_SNAKE_WIDTH,
         text: str = DEFAULT_TEXT, text_position: tuple[float, float] = DEFAULT_TEXT_POSITION,
         text_color: int = DEFAULT_TEXT_COLOR
 ) -> Image.Image:
-    """
-    Creates a single random snek frame using Perlin noise.
-
-    `perlin_lookup_vertical_shift` represents the Perlin noise shift in the Y-dimension for this frame.
-    If `text` is given, display the given text with the snek.
-    """
-    start_x = random.randint(image_margins[X], image_dimensions[X] - image_margins[X])
-    start_y = random.randint(image_margins[Y], image_dimensions[Y] - image_margins[Y])
-    points: list[tuple[float, float]] = [(start_x, start_y)]
-
-    for index in range(snake_length):
-        angle = perlin_factory.get_plain_noise(
-            ((1 / (snake_length + 1)) * (index + 1)) + perlin_lookup_vertical_shift
-        ) * ANGLE_RANGE
-        current_point = points[index]
-        segment_length = random.randint(segment_length_range[0], segment_length_range[1])
-        points.append((
-            current_point[X] + segment_length * math.cos(angle),
-            current_point[Y] + segment_length * math.sin(angle)
-        ))
-
-    # normalize bounds
-    min_dimensions: list[float] = [start_x, start_y]
-    max_dimensions: list[float] = [start_x, start_y]
-    for point in points:
-        min_dimensions[X] = min(point[X], min_dimensions[X])
-        min_dimensions[Y] = min(point[Y], min_dimensions[Y])
-        max_dimensions[X] = max(point[X], max_dimensions[X])
-        max_dimensions[Y] = max(point[Y], max_dimensions[Y])
-
-    # shift towards middle
-    dimension_range = (max_dimensions[X] - min_dimensions[X], max_dimensions[Y] - min_dimensions[Y])
-    shift = (
-        image_dimensions[X] / 2 - (dimension_range[X] / 2 + min_dimensions[X]),
-        image_dimensions[Y] / 2 - (dimension_range[Y] / 2 + min_dimensions[Y])
-    )
-
+    """Draws the snek along `path`, moved by `shift`, with the given text."""
     image = Image.new(mode="RGB", size=image_dimensions, color=bg_color)
     draw = ImageDraw(image)
-    for index in range(1, len(points)):
-        point = points[index]
-        previous = points[index - 1]
-        draw.line(
-            (
-                shift[X] + previous[X],
-                shift[Y] + previous[Y],
-                shift[X] + point[X],
-                shift[Y] + point[Y]
-            ),
-            width=snake_width,
-            fill=snake_color
-        )
+    points = [tuple(point) for point in (path + shift).tolist()]
+    for previous, point in pairwise(points):
+        draw.line((previous, point), width=snake_width, fill=snake_color)
     if text is not None:
         draw.multiline_text(text_position, text, fill=text_color)
     del draw
     return image
 
 
+def centring_shift(paths: np.ndarray, image_dimensions: tuple[int, int]) -> np.ndarray:
+    """Returns the shift which moves the middle of the bounds of all the given paths to the middle of the image."""
+    min_dimensions = paths.min(axis=(0, 1))
+    max_dimensions = paths.max(axis=(0, 1))
+    return np.array(image_dimensions) / 2 - (min_dimensions + max_dimensions) / 2
+
+
+def create_snek_frame(
+        perlin_factory: PerlinNoiseFactory, perlin_lookup_vertical_shift: float = 0,
+        image_dimensions: tuple[int, int] = DEFAULT_IMAGE_DIMENSIONS,
+        snake_length: int = DEFAULT_SNAKE_LENGTH,
+        segment_length_range: tuple[int, int] = DEFAULT_SEGMENT_LENGTH_RANGE,
+        **draw_options
+) -> Image.Image:
+    """
+    Creates a single random snek frame using Perlin noise.
+
+    `perlin_lookup_vertical_shift` represents the Perlin noise shift in the Y-dimension for this frame.
+    Any other keyword arguments, such as the colours, width and text, are passed on to `draw_snek`.
+    """
+    return create_snek_frames(
+        perlin_factory,
+        [perlin_lookup_vertical_shift],
+        image_dimensions=image_dimensions,
+        snake_length=snake_length,
+        segment_length_range=segment_length_range,
+        **draw_options
+    )[0]
+
+
+def create_snek_frames(
+        perlin_factory: PerlinNoiseFactory, vertical_shifts: Sequence[float],
+        image_dimensions: tuple[int, int] = DEFAULT_IMAGE_DIMENSIONS,
+        snake_length: int = DEFAULT_SNAKE_LENGTH,
+        segment_length_range: tuple[int, int] = DEFAULT_SEGMENT_LENGTH_RANGE,
+        **draw_options
+) -> list[Image.Image]:
+    """
+    Creates a frame of the same random snek for each of the given Perlin noise shifts in the Y-dimension.
+
+    The snek keeps its segment lengths across frames, and is centred on the bounds of all of them so it doesn't jump
+    around. Any other keyword arguments, such as the colours, width and text, are passed on to `draw_snek`.
+    """
+    segment_lengths = [random.randint(*segment_length_range) for _ in range(snake_length)]
+    paths = snek_paths(perlin_factory, vertical_shifts, segment_lengths)
+    shift = centring_shift(paths, image_dimensions)
+    return [draw_snek(path, shift, image_dimensions, **draw_options) for path in paths]
+
+
+def create_snek_gif(
+        perlin_factory: PerlinNoiseFactory,
+        frame_count: int = DEFAULT_SNEK_FRAME_COUNT,
+        frame_shift: float = DEFAULT_SNEK_FRAME_SHIFT,
+        frame_duration: int = DEFAULT_SNEK_FRAME_DURATION,
+        **snek_options
+) -> io.BytesIO:
+    """
+    Creates an animated GIF of a snek slithering, by shifting its Perlin noise lookup by `frame_shift` every frame.
+
+    Keyword arguments are passed on to `create_snek_frames`.
+    """
+    frames = create_snek_frames(
+        perlin_factory, [index * frame_shift for index in range(frame_count)], **snek_options
+    )
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=frame_duration, loop=0)
+    buffer.seek(0)
+    return buffer
+
+
 def frame_to_png_bytes(image: Image) -> io.BytesIO:
-    """Convert image to byte stream."""
-    stream = io.BytesIO()
-    image.save(stream, format="PNG")
-    stream.seek(0)
-    return stream
+    """Convert image to a PNG byte stream, using a palette if the image has few enough colours."""
+    return io.BytesIO(encode_image(image, lossless=True))
+
+
+def resize_avatar(avatar_bytes: bytes) -> Image.Image:
+    """
+    Decode an avatar and resize it to fit on a Snakes and Ladders board tile.
+
+    This is slow and blocking, so it should be submitted to the render service.
+    """
+    with Image.open(io.BytesIO(avatar_bytes)) as avatar:
+        return avatar.resize((BOARD_PLAYER_SIZE, BOARD_PLAYER_SIZE))
+
+
+def encode_board(board: Image.Image) -> bytes:
+    """
+    Encode a Snakes and Ladders board as a JPEG, like the board art it's drawn on.
+
+    This is slow and blocking, so it should be submitted to the render service.
+    """
+    buffer = io.BytesIO()
+    board.save(buffer, format="JPEG", quality=BOARD_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+class SnakesAndLaddersBoard:
+    """
+    The board image of a single game, with the players' avatars pasted onto it.
+
+    The board art is decoded once per process, and each game's copy is updated in place, so each round
+    only clears and pastes the avatars which moved. Avatars never overlap, as every player has their own
+    spot within a tile.
+    """
+
+    def __init__(self):
+        self.image = open_asset(BOARD_ASSET).copy()
+        self.placed: dict[int, tuple[int, int]] = {}  # player ID to where their avatar is pasted
+
+    def update(self, avatars: dict[int, tuple[Image.Image, tuple[int, int]]]) -> None:
+        """Move each player's avatar to its given position, clearing the avatars of players no longer given."""
+        background = open_asset(BOARD_ASSET)
+        for player_id, (x, y) in list(self.placed.items()):
+            if player_id in avatars and avatars[player_id][1] == (x, y):
+                continue
+            box = (x, y, x + BOARD_PLAYER_SIZE, y + BOARD_PLAYER_SIZE)
+            self.image.paste(background.crop(box), box)
+            del self.placed[player_id]
+
+        for player_id, (avatar, position) in avatars.items():
+            if player_id not in self.placed:
+                self.image.paste(avatar, box=position)
+                self.placed[player_id] = position
 
 
 log = get_logger(__name__)
@@ -384,6 +496,7 @@ class SnakeAndLaddersGame:
         self.player_tiles = {}
         self.round_has_rolled = {}
         self.avatar_images = {}
+        self.board_image = SnakesAndLaddersBoard()
         self.board = None
         self.positions = None
         self.rolls = []
@@ -462,9 +575,14 @@ class SnakeAndLaddersGame:
         self.players.append(user)
         self.player_tiles[user.id] = 1
 
-        avatar_bytes = await user.display_avatar.replace(size=PLAYER_ICON_IMAGE_SIZE).read()
-        im = Image.open(io.BytesIO(avatar_bytes)).resize((BOARD_PLAYER_SIZE, BOARD_PLAYER_SIZE))
-        self.avatar_images[user.id] = im
+        # Sprites are shared between games, and keyed by the avatar so that changing it isn't missed
+        avatar = user.display_avatar
+        sprite = self.snakes.board_avatars.get(avatar.key)
+        if sprite is None:
+            avatar_bytes = await avatar.replace(size=PLAYER_ICON_IMAGE_SIZE).read()
+            sprite = await render_service.submit(resize_avatar, avatar_bytes)
+            self.snakes.board_avatars.set(avatar.key, sprite)
+        self.avatar_images[user.id] = sprite
 
     async def player_join(self, user: User | Member) -> None:
         """
@@ -561,8 +679,8 @@ class SnakeAndLaddersGame:
         self.state = "roll"
         for user in self.players:
             self.round_has_rolled[user.id] = False
-        board_img = Image.open(SNAKE_RESOURCES / "snakes_and_ladders" / "board.jpg")
         player_row_size = math.ceil(MAX_PLAYERS / 2)
+        avatars = {}
 
         for i, player in enumerate(self.players):
             tile = self.player_tiles[player.id]
@@ -573,10 +691,11 @@ class SnakeAndLaddersGame:
                     (10 * BOARD_TILE_SIZE) - (9 - tile_coordinates[1]) * BOARD_TILE_SIZE - BOARD_PLAYER_SIZE)
             x_offset += BOARD_PLAYER_SIZE * (i % player_row_size)
             y_offset -= BOARD_PLAYER_SIZE * math.floor(i / player_row_size)
-            board_img.paste(self.avatar_images[player.id],
-                            box=(x_offset, y_offset))
+            avatars[player.id] = (self.avatar_images[player.id], (x_offset, y_offset))
 
-        board_file = File(frame_to_png_bytes(board_img), filename="Board.jpg")
+        self.board_image.update(avatars)
+        board_bytes = await render_service.submit(encode_board, self.board_image.image)
+        board_file = File(io.BytesIO(board_bytes), filename="board.jpg")
         player_list = "\n".join((user.mention + ": Tile " + str(self.player_tiles[user.id])) for user in self.players)
 
         # Store and send new messages
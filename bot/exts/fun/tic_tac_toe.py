@@ -1,36 +1,99 @@
 import random
 from collections.abc import Callable
+from typing import Literal
 
 import discord
 from discord.ext.commands import Cog, Context, check, group
+from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.constants import Emojis
 from bot.utils.pagination import LinePaginator
+from bot.utils.sessions import SessionRegistry
+
+log = get_logger(__name__)
 
 CONFIRMATION_MESSAGE = (
     "{opponent}, {requester} wants to play Tic-Tac-Toe against you."
     f"\nReact to this message with {Emojis.confirmation} to accept or with {Emojis.decline} to decline."
 )
 
+# Each player's marks are stored as a 9 bit mask, where bit `n - 1` is the field numbered `n`.
+FULL_BOARD = 0b111_111_111
+WIN_MASKS = (
+    # Horizontal
+    0b000_000_111,
+    0b000_111_000,
+    0b111_000_000,
+    # Vertical
+    0b001_001_001,
+    0b010_010_010,
+    0b100_100_100,
+    # Diagonal
+    0b100_010_001,
+    0b001_010_100,
+)
+
+# Maps number emojis to the field numbers they represent
+FIELD_NUMBERS = {emoji: field for field, emoji in Emojis.number_emojis.items()}
+
+# Games last at most a minute of confirmation and nine 30 second moves, so any older game has been abandoned
+GAME_TTL = 10 * 60  # seconds
+HISTORY_SIZE = 100
+
+# How often the AI plays a random move instead of the best one, for each difficulty
+MISTAKE_RATES = {
+    "easy": 0.4,
+    "normal": 0.15,
+    "perfect": 0,
+}
+
+
+def check_win(marks: int) -> bool:
+    """Check whether the given marks of a player complete a line."""
+    return any(marks & mask == mask for mask in WIN_MASKS)
+
+
+def position_key(own: int, opponent: int) -> int:
+    """Combine the marks of the player to move and their opponent into a single key for the perfect play table."""
+    return own | opponent << 9
+
+
+def build_perfect_play_table() -> dict[int, dict[int, int]]:
+    """
+    Score every legal move in every position reachable in a game, by minimax.
+
+    Positions are keyed by `position_key`, from the point of view of the player to move, so the table works for
+    either symbol. Each maps field numbers to scores: positive for a win, negative for a loss and 0 for a draw,
+    with quicker wins (and slower losses) scoring further from 0.
+    """
+    table = {}
+
+    def best_score(own: int, opponent: int) -> int:
+        key = position_key(own, opponent)
+        if key not in table:
+            scores = {}
+            for field in range(1, 10):
+                move = 1 << (field - 1)
+                if (own | opponent) & move:
+                    continue
+                marks = own | move
+                empty = (FULL_BOARD & ~(marks | opponent)).bit_count()
+                if check_win(marks):
+                    scores[field] = empty + 1
+                elif not empty:
+                    scores[field] = 0
+                else:
+                    scores[field] = -best_score(opponent, marks)
+            table[key] = scores
+        return max(table[key].values())
+
+    best_score(0, 0)
+    return table
 
-def check_win(board: dict[int, str]) -> bool:
-    """Check from board, is any player won game."""
-    return any(
-        (
-            # Horizontal
-            board[1] == board[2] == board[3],
-            board[4] == board[5] == board[6],
-            board[7] == board[8] == board[9],
-            # Vertical
-            board[1] == board[4] == board[7],
-            board[2] == board[5] == board[8],
-            board[3] == board[6] == board[9],
-            # Diagonal
-            board[1] == board[5] == board[9],
-            board[3] == board[5] == board[7],
-        )
-    )
+
+# Built in well under a second, so it's built on import rather than stored anywhere
+PERFECT_PLAY = build_perfect_play_table()
 
 
 class Player:
@@ -41,19 +104,21 @@ class Player:
         self.ctx = ctx
         self.symbol = symbol
 
-    async def get_move(self, board: dict[int, str], msg: discord.Message) -> tuple[bool, int | None]:
+    async def get_move(self, marks: dict[str, int], msg: discord.Message) -> tuple[bool, int | None]:
         """
         Get move from user.
 
         Return is timeout reached and position of field what user will fill when timeout don't reach.
         """
+        taken = sum(marks.values())
+
         def check_for_move(r: discord.Reaction, u: discord.User) -> bool:
-            """Check does user who reacted is user who we want, message is board and emoji is in board values."""
+            """Check does user who reacted is user who we want, message is board and emoji is a free field."""
             return (
                 u.id == self.user.id
                 and msg.id == r.message.id
-                and r.emoji in board.values()
-                and r.emoji in Emojis.number_emojis.values()
+                and r.emoji in FIELD_NUMBERS
+                and not taken & 1 << (FIELD_NUMBERS[r.emoji] - 1)
             )
 
         try:
@@ -61,7 +126,7 @@ class Player:
         except TimeoutError:
             return True, None
         else:
-            return False, list(Emojis.number_emojis.keys())[list(Emojis.number_emojis.values()).index(react.emoji)]
+            return False, FIELD_NUMBERS[react.emoji]
 
     def __str__(self) -> str:
         """Return mention of user."""
@@ -71,31 +136,26 @@ class Player:
 class AI:
     """Tic Tac Toe AI class for against computer gaming."""
 
-    def __init__(self, bot_user: discord.Member, symbol: str):
+    def __init__(self, bot_user: discord.Member, symbol: str, mistake_rate: float = MISTAKE_RATES["normal"]):
         self.user = bot_user
         self.symbol = symbol
+        self.mistake_rate = mistake_rate
 
-    @staticmethod
-    async def get_move(board: dict[int, str], _: discord.Message) -> tuple[bool, int]:
-        """Get move from AI. AI use Minimax strategy."""
-        possible_moves = [i for i, emoji in board.items() if emoji in list(Emojis.number_emojis.values())]
-
-        for symbol in (Emojis.o_square, Emojis.x_square):
-            for move in possible_moves:
-                board_copy = board.copy()
-                board_copy[move] = symbol
-                if check_win(board_copy):
-                    return False, move
+    async def get_move(self, marks: dict[str, int], _: discord.Message) -> tuple[bool, int]:
+        """
+        Get move from AI. AI looks up the minimax score of every move in the perfect play table.
 
-        open_corners = [i for i in possible_moves if i in (1, 3, 7, 9)]
-        if len(open_corners) > 0:
-            return False, random.choice(open_corners)
+        It plays one of the best moves, except for a `mistake_rate` chance of playing any move at random.
+        """
+        own = marks[self.symbol]
+        opponent = sum(marks.values()) - own
+        scores = PERFECT_PLAY[position_key(own, opponent)]
 
-        if 5 in possible_moves:
-            return False, 5
+        if random.random() < self.mistake_rate:
+            return False, random.choice(list(scores))
 
-        open_edges = [i for i in possible_moves if i in (2, 4, 6, 8)]
-        return False, random.choice(open_edges)
+        best = max(scores.values())
+        return False, random.choice([field for field, score in scores.items() if score == best])
 
     def __str__(self) -> str:
         """Return mention of @Sir Lancebot."""
@@ -109,17 +169,7 @@ class Game:
         self.players = players
         self.ctx = ctx
         self.channel = ctx.channel
-        self.board = {
-            1: Emojis.number_emojis[1],
-            2: Emojis.number_emojis[2],
-            3: Emojis.number_emojis[3],
-            4: Emojis.number_emojis[4],
-            5: Emojis.number_emojis[5],
-            6: Emojis.number_emojis[6],
-            7: Emojis.number_emojis[7],
-            8: Emojis.number_emojis[8],
-            9: Emojis.number_emojis[9]
-        }
+        self.marks = {player.symbol: 0 for player in players}
 
         self.current = self.players[0]
         self.next = self.players[1]
@@ -183,7 +233,11 @@ class Game:
 
     def format_board(self) -> str:
         """Get formatted tic-tac-toe board for message."""
-        board = list(self.board.values())
+        board = [Emojis.number_emojis[field] for field in range(1, 10)]
+        for symbol, marks in self.marks.items():
+            for field in range(9):
+                if marks & 1 << field:
+                    board[field] = symbol
         return "\n".join(
             f"{board[line]} {board[line + 1]} {board[line + 2]}"
             for line in range(0, len(board), 3)
@@ -203,7 +257,7 @@ class Game:
                     f"{self.current.user.mention}, it's your turn! "
                     "React with an emoji to take your go."
                 )
-            timeout, pos = await self.current.get_move(self.board, board)
+            timeout, pos = await self.current.get_move(self.marks, board)
             if isinstance(self.current, Player):
                 await announce.delete()
             if timeout:
@@ -211,12 +265,12 @@ class Game:
                 self.over = True
                 self.canceled = True
                 return
-            self.board[pos] = self.current.symbol
+            self.marks[self.current.symbol] |= 1 << (pos - 1)
             await board.edit(
                 embed=discord.Embed(description=self.format_board())
             )
             await board.clear_reaction(Emojis.number_emojis[pos])
-            if check_win(self.board):
+            if check_win(self.marks[self.current.symbol]):
                 self.winner = self.current
                 self.loser = self.next
                 await self.ctx.send(
@@ -234,16 +288,14 @@ class Game:
 def is_channel_free() -> Callable:
     """Check is channel where command will be invoked free."""
     async def predicate(ctx: Context) -> bool:
-        return all(game.channel != ctx.channel for game in ctx.cog.games if not game.over)
+        return ctx.cog.games.by_channel(ctx.channel.id) is None
     return check(predicate)
 
 
 def is_requester_free() -> Callable:
     """Check is requester not already in any game."""
     async def predicate(ctx: Context) -> bool:
-        return all(
-            ctx.author not in (player.user for player in game.players) for game in ctx.cog.games if not game.over
-        )
+        return not ctx.cog.games.is_playing(ctx.author.id)
     return check(predicate)
 
 
@@ -251,24 +303,31 @@ class TicTacToe(Cog):
     """TicTacToe cog contains tic-tac-toe game commands."""
 
     def __init__(self):
-        self.games: list[Game] = []
+        self.games: SessionRegistry[Game] = SessionRegistry(ttl=GAME_TTL, history_size=HISTORY_SIZE)
 
     @is_channel_free()
     @is_requester_free()
     @group(name="tictactoe", aliases=("ttt", "tic"), invoke_without_command=True)
-    async def tic_tac_toe(self, ctx: Context, opponent: discord.User | None) -> None:
-        """Tic Tac Toe game. Play against friends or AI. Use reactions to add your mark to field."""
+    async def tic_tac_toe(
+        self,
+        ctx: Context,
+        opponent: discord.User | None,
+        difficulty: Literal["easy", "normal", "perfect"] = "normal"
+    ) -> None:
+        """
+        Tic Tac Toe game. Play against friends or AI. Use reactions to add your mark to field.
+
+        When playing against the AI, the difficulty can be easy, normal or perfect.
+        """
         if opponent == ctx.author:
             await ctx.send("You can't play against yourself.")
             return
-        if opponent is not None and not all(
-            opponent not in (player.user for player in g.players) for g in ctx.cog.games if not g.over
-        ):
+        if opponent is not None and self.games.is_playing(opponent.id):
             await ctx.send("Opponent is already in game.")
             return
         if opponent is None:
             game = Game(
-                [Player(ctx.author, ctx, Emojis.x_square), AI(ctx.me, Emojis.o_square)],
+                [Player(ctx.author, ctx, Emojis.x_square), AI(ctx.me, Emojis.o_square, MISTAKE_RATES[difficulty])],
                 ctx
             )
         else:
@@ -276,37 +335,44 @@ class TicTacToe(Cog):
                 [Player(ctx.author, ctx, Emojis.x_square), Player(opponent, ctx, Emojis.o_square)],
                 ctx
             )
-        self.games.append(game)
-        if opponent is not None:
-            if opponent.bot:  # check whether the opponent is a bot or not
-                await ctx.send("You can't play Tic-Tac-Toe with bots!")
-                return
+        self.games.add(
+            game,
+            channel=ctx.channel.id,
+            players=[player.user.id for player in game.players if isinstance(player, Player)]
+        )
+        try:
+            if opponent is not None:
+                if opponent.bot:  # check whether the opponent is a bot or not
+                    await ctx.send("You can't play Tic-Tac-Toe with bots!")
+                    return
 
-            confirmed, msg = await game.get_confirmation()
+                confirmed, msg = await game.get_confirmation()
 
-            if not confirmed:
-                if msg:
-                    await ctx.send(msg)
-                return
-        await game.play()
+                if not confirmed:
+                    if msg:
+                        await ctx.send(msg)
+                    return
+            await game.play()
+        finally:
+            self.games.finish(game, record=game.over and not game.canceled)
 
     @tic_tac_toe.group(name="history", aliases=("log",), invoke_without_command=True)
     async def tic_tac_toe_logs(self, ctx: Context) -> None:
         """Show most recent tic-tac-toe games."""
-        if len(self.games) < 1:
+        history = self.games.history
+        if not history:
             await ctx.send("No recent games.")
             return
         log_games = []
-        for i, game in enumerate(self.games):
-            if game.over and not game.canceled:
-                if game.draw:
-                    log_games.append(
-                        f"**#{i+1}**: {game.players[0]} vs {game.players[1]} (draw)"
-                    )
-                else:
-                    log_games.append(
-                        f"**#{i+1}**: {game.winner} :trophy: vs {game.loser}"
-                    )
+        for i, game in enumerate(history):
+            if game.draw:
+                log_games.append(
+                    f"**#{i+1}**: {game.players[0]} vs {game.players[1]} (draw)"
+                )
+            else:
+                log_games.append(
+                    f"**#{i+1}**: {game.winner} :trophy: vs {game.loser}"
+                )
         await LinePaginator.paginate(
             log_games,
             ctx,
@@ -316,10 +382,11 @@ class TicTacToe(Cog):
     @tic_tac_toe_logs.command(name="show", aliases=("s",))
     async def show_tic_tac_toe_board(self, ctx: Context, game_id: int) -> None:
         """View game board by ID (ID is possible to get by `.tictactoe history`)."""
-        if len(self.games) < game_id:
+        history = self.games.history
+        if not 1 <= game_id <= len(history):
             await ctx.send("Game don't exist.")
             return
-        game = self.games[game_id - 1]
+        game = history[game_id - 1]
 
         if game.draw:
             description = f"{game.players[0]} vs {game.players[1]} (draw)\n\n{game.format_board()}"
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import json
 import operator
 import random
@@ -8,15 +9,18 @@ from collections import defaultdict
 from collections.abc import Callable
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
-from pathlib import Path
 
 import discord
+from aiohttp import ClientError
+from async_rediscache import RedisCache
 from discord.ext import commands, tasks
 from pydis_core.utils.logging import get_logger
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+from redis import RedisError
 
 from bot.bot import Bot
 from bot.constants import Client, Colours, MODERATION_ROLES, NEGATIVE_REPLIES
+from bot.exts.fun._trivia_question_bank import QuestionBank
 
 logger = get_logger(__name__)
 
@@ -25,6 +29,18 @@ STANDARD_VARIATION_TOLERANCE = 88
 DYNAMICALLY_GEN_VARIATION_TOLERANCE = 97
 
 MAX_ERROR_FETCH_TRIES = 3
+# How many days back to look for a Wikipedia feed, starting from yesterday's
+WIKI_FEED_LOOKBACK_DAYS = 3
+# Bounds of the random delay before retrying a Wikipedia feed, which doubles with each attempt
+WIKI_RETRY_BASE_DELAY = 2  # seconds
+WIKI_RETRY_MAX_DELAY = 60  # seconds
+WIKI_SNAPSHOT_KEY = "snapshot"
+WIKIPEDIA_CATEGORY_DESCRIPTION = "Guess the title of random wikipedia passages."
+
+# Punctuation which is ignored when comparing answers, leaving the characters which can change what an answer means,
+# such as the minus and caret in `m^2*kg*s^-3`. Most messages are ASCII, which is stripped as bytes as that's faster.
+IGNORED_ASCII_PUNCTUATION = b"'\"`.,!?;:"
+IGNORED_ANSWER_PUNCTUATION = str.maketrans("", "", IGNORED_ASCII_PUNCTUATION.decode() + "\u2018\u2019\u201c\u201d")
 
 WRONG_ANS_RESPONSE = [
     "No one answered correctly!",
@@ -77,6 +93,54 @@ UNITS_TO_BASE_UNITS = {
 }
 
 
+def normalise_answer(text: str) -> str:
+    """
+    Casefolds `text` and strips ignored punctuation and extra whitespace, unless that would leave nothing.
+
+    The result is never longer than `text.casefold()`.
+    """
+    text = text.casefold()
+    if text.isascii():
+        stripped = b" ".join(text.encode().translate(None, IGNORED_ASCII_PUNCTUATION).split()).decode()
+    else:
+        stripped = " ".join(text.translate(IGNORED_ANSWER_PUNCTUATION).split())
+    return stripped or " ".join(text.split())
+
+
+class AnswerMatcher:
+    """
+    Checks messages against a question's answers, which are normalised once up front.
+
+    A message can only be more similar to an answer than the variation tolerance if their lengths are close enough,
+    since `fuzz.ratio` is at most `200 * shorter / (shorter + longer)`. Messages outside those bounds for every answer
+    are rejected without being scored, and the rest are scored against all the answers in one `process.extractOne`.
+    Normalising never lengthens a message, so ones which are too short are rejected before being normalised.
+    """
+
+    def __init__(self, answers: list[str], var_tol: int):
+        self.answers = [normalise_answer(answer) for answer in answers]
+        self.var_tol = var_tol
+
+        lengths = [len(answer) for answer in self.answers]
+        self.min_length = min(lengths) * var_tol / (200 - var_tol)
+        self.max_length = max(lengths) * (200 - var_tol) / var_tol
+
+    def matches(self, text: str) -> bool:
+        """Whether `text` is more similar to any of the answers than the variation tolerance."""
+        text = text.casefold()
+        if len(text) <= self.min_length:
+            return False
+
+        text = normalise_answer(text)
+        if not self.min_length < len(text) < self.max_length:
+            return False
+
+        match = process.extractOne(
+            text, self.answers, scorer=fuzz.ratio, processor=None, score_cutoff=self.var_tol
+        )
+        return match is not None and match[1] > self.var_tol
+
+
 @dataclass(frozen=True)
 class QuizEntry:
     """Stores quiz entry (a question and a list of answers)."""
@@ -85,6 +149,11 @@ class QuizEntry:
     answers: list[str]
     var_tol: int
 
+    @functools.cached_property
+    def matcher(self) -> AnswerMatcher:
+        """The matcher for this entry's answers, built on first use."""
+        return AnswerMatcher(self.answers, self.var_tol)
+
 
 def linear_system(q_format: str, a_format: str) -> QuizEntry:
     """Generate a system of linear equations with two unknowns."""
@@ -209,13 +278,16 @@ DYNAMIC_QUESTIONS_FORMAT_FUNCS = {
 class TriviaQuiz(commands.Cog):
     """A cog for all quiz commands."""
 
+    # RedisCache["snapshot", JSON encoded {"date": feed date, "questions": wikipedia questions}]
+    wiki_snapshot = RedisCache()
+
     def __init__(self, bot: Bot):
         self.bot = bot
 
         self.game_status = {}  # A variable to store the game status: either running or not running.
         self.game_owners = {}  # A variable to store the person's ID who started the quiz game in a channel.
 
-        self.questions = self.load_questions()
+        self.questions = QuestionBank()
         self.question_limit = 0
 
         self.player_scores = defaultdict(int)  # A variable to store all player's scores for a bot session.
@@ -228,8 +300,9 @@ class TriviaQuiz(commands.Cog):
             "science": "Put your understanding of science to the test!",
             "cs": "A large variety of computer science questions.",
             "python": "Trivia on our amazing language, Python!",
-            "wikipedia": "Guess the title of random wikipedia passages.",
         }
+        # The wikipedia category is added once there are questions for it, and this is the date of their feed.
+        self.wiki_questions_date: str | None = None
 
         self.get_wiki_questions.start()
 
@@ -239,67 +312,131 @@ class TriviaQuiz(commands.Cog):
 
     @tasks.loop(hours=24.0)
     async def get_wiki_questions(self) -> None:
-        """Get yesterday's most read articles from wikipedia and format them like trivia questions."""
-        error_fetches = 0
+        """
+        Get the most read articles from wikipedia and format them like trivia questions.
+
+        The feed of the latest day is fetched, falling back to earlier days' feeds if it isn't available. The questions
+        are snapshotted to Redis, and the snapshot is served as soon as the cog loads, so the category is available
+        while the feed is being fetched, and stays available if every fetch fails.
+        """
+        if "wikipedia" not in self.questions:
+            await self.load_wiki_snapshot()
+
+        for days_ago in range(1, WIKI_FEED_LOOKBACK_DAYS + 1):
+            date = datetime.strftime(datetime.now(tz=UTC) - timedelta(days_ago), "%Y/%m/%d")
+            if self.wiki_questions_date is not None and date <= self.wiki_questions_date:
+                # The questions we have are already from this day's feed, or a later one.
+                return
+
+            articles = await self.fetch_wiki_articles(date)
+            if not articles:
+                continue
+
+            wiki_questions = self.make_wiki_questions(articles)
+            self.set_wiki_questions(date, wiki_questions)
+            # The fresh questions are already being served, so failing to snapshot them only loses them on restart.
+            try:
+                await self.wiki_snapshot.set(
+                    WIKI_SNAPSHOT_KEY, json.dumps({"date": date, "questions": wiki_questions})
+                )
+            except RedisError:
+                logger.exception(f"Couldn't snapshot the Wikipedia questions from {date}.")
+            return
+
+        if "wikipedia" in self.questions:
+            logger.warning(
+                f"Couldn't fetch any of the last {WIKI_FEED_LOOKBACK_DAYS} days' Wikipedia feeds, "
+                f"keeping the questions from {self.wiki_questions_date}."
+            )
+        else:
+            logger.warning(
+                f"Not loading wikipedia guess questions, couldn't fetch any of the last {WIKI_FEED_LOOKBACK_DAYS} "
+                "days' feeds and there's no snapshot."
+            )
+
+    async def load_wiki_snapshot(self) -> None:
+        """Serve the Wikipedia questions snapshotted by the last successful fetch, if there are any."""
+        try:
+            snapshot = await self.wiki_snapshot.get(WIKI_SNAPSHOT_KEY)
+            if snapshot is None:
+                return
+            snapshot = json.loads(snapshot)
+            date, questions = snapshot["date"], snapshot["questions"]
+        except (RedisError, ValueError, KeyError, TypeError):
+            logger.exception("Couldn't load the Wikipedia questions snapshot, waiting for the feed instead.")
+            return
+
+        self.set_wiki_questions(date, questions)
+        logger.info(f"Serving {len(questions)} Wikipedia questions from the {date} snapshot.")
+
+    def set_wiki_questions(self, date: str, wiki_questions: list[dict]) -> None:
+        """Make `wiki_questions`, from the feed of `date`, the questions of the wikipedia category."""
+        self.questions.set_category("wikipedia", wiki_questions)
+        self.wiki_questions_date = date
+        self.categories["wikipedia"] = WIKIPEDIA_CATEGORY_DESCRIPTION
+
+    async def fetch_wiki_articles(self, date: str) -> list[dict] | None:
+        """
+        Fetch the most read articles of `date`, retrying with exponential backoff and jitter.
+
+        Returns None if every attempt failed, or if the feed of `date` doesn't have its most read articles yet.
+        """
+        url = WIKI_FEED_API_URL.format(date=date)
+        for attempt in range(MAX_ERROR_FETCH_TRIES):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, min(WIKI_RETRY_MAX_DELAY, WIKI_RETRY_BASE_DELAY * 2 ** attempt)))
+
+            try:
+                async with self.bot.http_session.get(url=url) as r:
+                    if r.status == 200:
+                        raw_json = await r.json()
+                        return raw_json.get("mostread", {}).get("articles")
+                    logger.debug(f"Fetching the Wikipedia feed for {date} returned status {r.status}.")
+            except (ClientError, TimeoutError, ValueError) as e:
+                # ValueError is raised by a malformed feed body, which may well be fine on the next attempt.
+                logger.debug(f"Fetching the Wikipedia feed for {date} failed: {e!r}")
+
+        return None
+
+    @staticmethod
+    def make_wiki_questions(articles: list[dict]) -> list[dict]:
+        """Format Wikipedia articles like trivia questions, hiding their titles in their extracts."""
         wiki_questions = []
         # trivia_quiz.json follows a pattern, every new category starts with the next century.
         start_id = 501
-        yesterday = datetime.strftime(datetime.now(tz=UTC) - timedelta(1), "%Y/%m/%d")
-
-        while error_fetches < MAX_ERROR_FETCH_TRIES:
-            async with self.bot.http_session.get(url=WIKI_FEED_API_URL.format(date=yesterday)) as r:
-                if r.status != 200:
-                    error_fetches += 1
-                    continue
-                raw_json = await r.json()
-                articles_raw = raw_json["mostread"]["articles"]
-
-                for article in articles_raw:
-                    question = article.get("extract")
-                    if not question:
-                        continue
-
-                    # Normalize the wikipedia article title to remove all punctuations from it
-                    for word in re.split(r"[\s-]", title := article["normalizedtitle"]):
-                        cleaned_title = re.sub(
-                            rf"\b{word.strip(string.punctuation)}\b", word, title, flags=re.IGNORECASE
-                        )
-
-                    # Since the extract contains the article name sometimes this would replace all the matching words
-                    # in that article with *** of that length.
-                    # NOTE: This removes the "answer" for 99% of the cases, but sometimes the wikipedia article is
-                    # very different from the words in the extract, for example the title would be the nickname of a
-                    # person (Bob Ross) whereas in the extract it would the full name (Robert Norman Ross) so it comes
-                    # out as (Robert Norman ****) and (Robert Norman Ross) won't be a right answer :(
-                    for word in re.split(r"[\s-]", cleaned_title):
-                        word = word.strip(string.punctuation)
-                        secret_word = r"\*" * len(word)
-                        question = re.sub(rf"\b{word}\b", f"**{secret_word}**", question, flags=re.IGNORECASE)
-
-                    formatted_article_question = {
-                        "id": start_id,
-                        "question": f"Guess the title of the Wikipedia article.\n\n{question}",
-                        "answer": cleaned_title,
-                        "info": article["extract"]
-                    }
-                    start_id += 1
-                    wiki_questions.append(formatted_article_question)
-
-                # If everything has gone smoothly until now, we can break out of the while loop
-                break
 
-        if error_fetches < MAX_ERROR_FETCH_TRIES:
-            self.questions["wikipedia"] = wiki_questions.copy()
-        else:
-            del self.categories["wikipedia"]
-            logger.warning(f"Not loading wikipedia guess questions, hit max error fetches: {MAX_ERROR_FETCH_TRIES}.")
+        for article in articles:
+            question = article.get("extract")
+            if not question:
+                continue
 
-    @staticmethod
-    def load_questions() -> dict:
-        """Load the questions from the JSON file."""
-        p = Path("bot", "resources", "fun", "trivia_quiz.json")
+            # Normalize the wikipedia article title to remove all punctuations from it
+            for word in re.split(r"[\s-]", title := article["normalizedtitle"]):
+                cleaned_title = re.sub(
+                    rf"\b{word.strip(string.punctuation)}\b", word, title, flags=re.IGNORECASE
+                )
 
-        return json.loads(p.read_text(encoding="utf-8"))
+            # Since the extract contains the article name sometimes this would replace all the matching words
+            # in that article with *** of that length.
+            # NOTE: This removes the "answer" for 99% of the cases, but sometimes the wikipedia article is
+            # very different from the words in the extract, for example the title would be the nickname of a
+            # person (Bob Ross) whereas in the extract it would the full name (Robert Norman Ross) so it comes
+            # out as (Robert Norman ****) and (Robert Norman Ross) won't be a right answer :(
+            for word in re.split(r"[\s-]", cleaned_title):
+                word = word.strip(string.punctuation)
+                secret_word = r"\*" * len(word)
+                question = re.sub(rf"\b{word}\b", f"**{secret_word}**", question, flags=re.IGNORECASE)
+
+            formatted_article_question = {
+                "id": start_id,
+                "question": f"Guess the title of the Wikipedia article.\n\n{question}",
+                "answer": cleaned_title,
+                "info": article["extract"]
+            }
+            start_id += 1
+            wiki_questions.append(formatted_article_question)
+
+        return wiki_questions
 
     @commands.group(name="quiz", aliases=("trivia", "triviaquiz"), invoke_without_command=True)
     async def quiz_game(self, ctx: commands.Context, category: str | None, questions: int | None) -> None:
@@ -331,18 +468,20 @@ class TriviaQuiz(commands.Cog):
             )
             return
 
+        # Reloaded before the category is checked, as an edited file may have dropped or renamed it.
+        self.questions.reload_if_changed()
+
         # Send embed showing available categories if inputted category is invalid.
         if category is None:
-            category = random.choice(list(self.categories))
+            category = random.choice([name for name in self.categories if name in self.questions])
 
         category = category.lower()
-        if category not in self.categories:
+        if category not in self.questions:
             embed = self.category_embed()
             await ctx.send(embed=embed)
             return
 
-        topic = self.questions[category]
-        topic_length = len(topic)
+        topic_length = len(self.questions[category])
 
         if questions is None:
             self.question_limit = min(DEFAULT_QUESTION_LIMIT, topic_length)
@@ -376,13 +515,14 @@ class TriviaQuiz(commands.Cog):
             await ctx.send(embed=start_embed)  # send an embed with the rules
             await asyncio.sleep(5)
 
-        done_questions = []
+        questions_left = self.questions.draw(category, self.question_limit)
+        question_no = 0
         hint_no = 0
         quiz_entry = None
 
         while self.game_status[ctx.channel.id]:
             # Exit quiz if number of questions for a round are already sent.
-            if len(done_questions) == self.question_limit and hint_no == 0:
+            if question_no == self.question_limit and hint_no == 0:
                 await ctx.send("The round has ended.")
                 await self.declare_winner(ctx.channel, self.game_player_scores[ctx.channel.id])
 
@@ -394,12 +534,8 @@ class TriviaQuiz(commands.Cog):
 
             # If no hint has been sent or any time alert. Basically if hint_no = 0  means it is a new question.
             if hint_no == 0:
-                # Select a random question which has not been used yet.
-                while True:
-                    question_dict = random.choice(topic)
-                    if question_dict["id"] not in done_questions:
-                        done_questions.append(question_dict["id"])
-                        break
+                question_dict = next(questions_left)
+                question_no += 1
 
                 if "dynamic_id" not in question_dict:
                     quiz_entry = QuizEntry(
@@ -416,7 +552,7 @@ class TriviaQuiz(commands.Cog):
 
                 embed = discord.Embed(
                     colour=Colours.gold,
-                    title=f"Question #{len(done_questions)}",
+                    title=f"Question #{question_no}",
                     description=quiz_entry.question,
                 )
 
@@ -425,17 +561,14 @@ class TriviaQuiz(commands.Cog):
 
                 await ctx.send(embed=embed)
 
-            def check_func(variation_tolerance: int) -> Callable[[discord.Message], bool]:
+            def check_func(matcher: AnswerMatcher) -> Callable[[discord.Message], bool]:
                 def contains_correct_answer(m: discord.Message) -> bool:
-                    return m.channel == ctx.channel and any(
-                        fuzz.ratio(answer.lower(), m.content.lower()) > variation_tolerance
-                        for answer in quiz_entry.answers  # noqa: B023
-                    )
+                    return m.channel == ctx.channel and matcher.matches(m.content)
 
                 return contains_correct_answer
 
             try:
-                msg = await self.bot.wait_for("message", check=check_func(quiz_entry.var_tol), timeout=10)
+                msg = await self.bot.wait_for("message", check=check_func(quiz_entry.matcher), timeout=10)
             except TimeoutError:
                 # In case of TimeoutError and the game has been stopped, then do nothing.
                 if not self.game_status[ctx.channel.id]:
@@ -466,7 +599,7 @@ class TriviaQuiz(commands.Cog):
                         quiz_entry.answers,
                         False,
                         question_dict,
-                        self.question_limit - len(done_questions),
+                        self.question_limit - question_no,
                     )
                     await asyncio.sleep(1)
 
@@ -499,7 +632,7 @@ class TriviaQuiz(commands.Cog):
                     quiz_entry.answers,
                     True,
                     question_dict,
-                    self.question_limit - len(done_questions),
+                    self.question_limit - question_no,
                 )
                 await self.send_score(ctx.channel, self.game_player_scores[ctx.channel.id])
 
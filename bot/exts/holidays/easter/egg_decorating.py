@@ -5,12 +5,16 @@ from io import BytesIO
 from pathlib import Path
 
 import discord
+import numpy as np
 from PIL import Image
 from discord.ext import commands
 from pydis_core.utils.logging import get_logger
 
 from bot.bot import Bot
 from bot.utils import helpers
+from bot.utils.assets import open_asset
+from bot.utils.image_encoding import encode_image
+from bot.utils.render import render_service
 
 log = get_logger(__name__)
 
@@ -28,6 +32,46 @@ IRREPLACEABLE = [
 ]  # Colours that are meant to stay the same - Transparent and Black
 
 
+DESIGN_COUNT = 6
+
+
+def _load_design(design: int) -> tuple[np.ndarray, int]:
+    """
+    Load an egg design as an array of palette indices, along with how many replaceable colours it has.
+
+    The indices follow `IRREPLACEABLE`, then the design's replaceable colours in the order of `COLOURS`,
+    so decorating the egg only needs a new palette.
+    """
+    pixels = np.asarray(open_asset(f"holidays/easter/easter_eggs/design{design}.png").convert("RGBA"))
+    # Pack each RGBA pixel into a single integer, so the design's colours can be found in one go.
+    packed, pixel_colours = np.unique(pixels.view(np.uint32)[..., 0], return_inverse=True)
+    design_colours = [tuple(colour) for colour in packed.view(np.uint8).reshape(-1, 4).tolist()]
+
+    replaceable = sorted((colour for colour in design_colours if colour not in IRREPLACEABLE), key=COLOURS.index)
+    palette = [*IRREPLACEABLE, *replaceable]
+    indices = np.array([palette.index(colour) for colour in design_colours], dtype=np.uint8)
+    return indices[pixel_colours].reshape(pixels.shape[:2]), len(replaceable)
+
+
+DESIGNS = {design: _load_design(design) for design in range(1, DESIGN_COUNT + 1)}
+
+
+def decorate_egg(design: int, colours: list[tuple[int, int, int]]) -> bytes:
+    """
+    Recolour the given egg design with `colours`, returning the encoded PNG.
+
+    This is slow and blocking, so it should be submitted to the render service.
+    """
+    indices, replaceable = DESIGNS[design]
+    palette = [*IRREPLACEABLE, *((*colour, 255) for colour in colours[:replaceable])]
+
+    new_im = Image.fromarray(indices, "P")
+    new_im.putpalette([channel for colour in palette for channel in colour], rawmode="RGBA")
+
+    # Eggs only have a handful of colours, so this is always a palette PNG.
+    return encode_image(new_im, lossless=True)
+
+
 class EggDecorating(commands.Cog):
     """Decorate some easter eggs!"""
 
@@ -78,30 +122,14 @@ class EggDecorating(commands.Cog):
             if colours_n < 8:
                 q, r = divmod(8, colours_n)
                 colours = colours * q + colours[:r]
-            num = random.randint(1, 6)
-            im = Image.open(Path(f"bot/resources/holidays/easter/easter_eggs/design{num}.png"))
-            data = list(im.getdata())
-
-            replaceable = {x for x in data if x not in IRREPLACEABLE}
-            replaceable = sorted(replaceable, key=COLOURS.index)
-
-            replacing_colours = {colour: colours[i] for i, colour in enumerate(replaceable)}
-            new_data = []
-            for x in data:
-                if x in replacing_colours:
-                    new_data.append((*replacing_colours[x].to_rgb(), 255))
-                    # Also ensures that the alpha channel has a value
-                else:
-                    new_data.append(x)
-            new_im = Image.new(im.mode, im.size)
-            new_im.putdata(new_data)
-
-            bufferedio = BytesIO()
-            new_im.save(bufferedio, format="PNG")
-
-            bufferedio.seek(0)
-
-            file = discord.File(bufferedio, filename="egg.png")  # Creates file to be used in embed
+            num = random.randint(1, DESIGN_COUNT)
+            image = await render_service.submit(
+                decorate_egg,
+                num,
+                [colour.to_rgb() for colour in colours]
+            )
+
+            file = discord.File(BytesIO(image), filename="egg.png")  # Creates file to be used in embed
             embed = discord.Embed(
                 title="Your Colourful Easter Egg",
                 description="Here is your pretty little egg. Hope you like it!"
@@ -110,7 +138,8 @@ class EggDecorating(commands.Cog):
             embed.set_footer(text=f"Made by {ctx.author.display_name}", icon_url=ctx.author.display_avatar.url)
 
         await ctx.send(file=file, embed=embed)
-        return new_im
+        # Returned for .easterify, which puts the egg on the user's avatar
+        return Image.open(BytesIO(image))
 
 
 async def setup(bot: Bot) -> None:
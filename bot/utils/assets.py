@@ -0,0 +1,34 @@
+import functools
+from pathlib import Path
+
+from PIL import Image
+
+__all__ = ("open_asset", "resized_asset")
+
+RESOURCES = Path("bot/resources")
+
+
+@functools.cache
+def open_asset(path: str) -> Image.Image:
+    """
+    Opens and decodes the image at `path`, relative to the resources directory.
+
+    Each image is decoded only once per process, and the same object is returned on every call,
+    so it must never be modified in place.
+    """
+    image = Image.open(RESOURCES / path)
+    image.load()
+    return image
+
+
+@functools.lru_cache(maxsize=64)
+def resized_asset(path: str, size: tuple[int, int], mode: str | None = None) -> Image.Image:
+    """
+    Returns the image at `path` resized to `size`, and converted to `mode` if one is given.
+
+    The most recently used variants are memoised, so like `open_asset` the result must never be modified in place.
+    """
+    image = open_asset(path).resize(size)
+    if mode is not None:
+        image = image.convert(mode)
+    return image
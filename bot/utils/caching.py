@@ -0,0 +1,145 @@
+import hashlib
+import shutil
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from pathlib import Path
+
+from PIL import Image
+from pydis_core.utils.logging import get_logger
+
+__all__ = ("LRUCache", "image_size")
+
+log = get_logger(__name__)
+
+# The directory spilled entries are written to, inside the given spill directory
+SPILL_SUBDIRECTORY = "lru_cache_spill"
+
+
+def image_size(image: Image.Image) -> int:
+    """Returns the approximate size in bytes of the given image's pixel data, for caches of decoded images."""
+    return len(image.getbands()) * image.width * image.height
+
+
+class LRUCache[K: Hashable, V]:
+    """
+    A least recently used cache bounded by the total size of its values.
+
+    The size of each value is measured with `sizeof`, which defaults to `len`, and the least recently
+    used entries are evicted until the total is within `max_size`. Values larger than `max_size` are never stored.
+
+    If a `spill_directory` is given, evicted entries are written to disk instead of being dropped,
+    and are read back into memory the next time they're requested. Spilled files are in turn bounded
+    by `max_spill_size`. Spilling is only supported for `bytes` values. Entries are written to a
+    `SPILL_SUBDIRECTORY` of the spill directory, which is emptied on creation as entries from previous
+    runs can't be mapped back to their keys. Nothing else in the spill directory is touched.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        *,
+        sizeof: Callable[[V], int] = len,
+        spill_directory: Path | None = None,
+        max_spill_size: int = 0,
+    ):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.spill_directory = spill_directory / SPILL_SUBDIRECTORY if spill_directory is not None else None
+        self.max_spill_size = max_spill_size
+
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._size = 0
+
+        self._spilled: OrderedDict[K, int] = OrderedDict()
+        self._spilled_size = 0
+
+        if self.spill_directory is not None:
+            shutil.rmtree(self.spill_directory, ignore_errors=True)
+            self.spill_directory.mkdir(parents=True, exist_ok=True)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries or key in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """The total size of the values held in memory."""
+        return self._size
+
+    def get(self, key: K) -> V | None:
+        """Return the value cached for `key`, marking it as recently used, or None if there isn't one."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        if key in self._spilled:
+            value = self._unspill(key)
+            if value is not None:
+                self.set(key, value)
+            return value
+
+        return None
+
+    def set(self, key: K, value: V) -> None:
+        """Cache `value` under `key`, evicting the least recently used entries to make space for it."""
+        # Dropped even if the new value isn't cached, so that the old one isn't returned in its place.
+        self.pop(key)
+        size = self.sizeof(value)
+        if size > self.max_size:
+            log.trace(f"Not caching {key!r}, its value is larger than the whole cache.")
+            return
+
+        self._entries[key] = (value, size)
+        self._size += size
+
+        while self._size > self.max_size:
+            old_key, (old_value, old_size) = self._entries.popitem(last=False)
+            self._size -= old_size
+            self._spill(old_key, old_value, old_size)
+
+    def pop(self, key: K) -> None:
+        """Remove `key` from the cache, both in memory and on disk."""
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self._size -= size
+
+        if key in self._spilled:
+            self._spilled_size -= self._spilled.pop(key)
+            self._spill_path(key).unlink(missing_ok=True)
+
+    def _spill_path(self, key: K) -> Path:
+        """Return the path `key` is spilled to."""
+        return self.spill_directory / hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def _spill(self, key: K, value: V, size: int) -> None:
+        """Write an evicted entry to disk, if spilling is enabled."""
+        if self.spill_directory is None or size > self.max_spill_size:
+            return
+
+        try:
+            self._spill_path(key).write_bytes(value)
+        except OSError:
+            log.exception(f"Failed to spill {key!r} to disk.")
+            return
+
+        self._spilled[key] = size
+        self._spilled_size += size
+
+        while self._spilled_size > self.max_spill_size:
+            old_key, old_size = self._spilled.popitem(last=False)
+            self._spilled_size -= old_size
+            self._spill_path(old_key).unlink(missing_ok=True)
+
+    def _unspill(self, key: K) -> V | None:
+        """Read a spilled entry back from disk, removing it from the spilled entries."""
+        self._spilled_size -= self._spilled.pop(key)
+        path = self._spill_path(key)
+        try:
+            value = path.read_bytes()
+        except OSError:
+            log.exception(f"Failed to read spilled cache entry {key!r}.")
+            return None
+        path.unlink(missing_ok=True)
+        return value
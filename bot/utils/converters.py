@@ -1,3 +1,4 @@
+import re
 from datetime import UTC, datetime
 
 import discord
@@ -19,29 +20,29 @@ class WrappedMessageConverter(commands.MessageConverter):
 
 
 class CoordinateConverter(commands.Converter):
-    """Converter for Coordinates."""
+    """
+    Converter for Coordinates.
+
+    Columns are lettered like a spreadsheet, from `a` to `z` then `aa` to `zz`, and rows are numbered from 1.
+    Whether the coordinate is on the board is left to the command, as boards vary in size.
+    """
 
     @staticmethod
     async def convert(ctx: commands.Context, coordinate: str) -> tuple[int, int]:
         """Take in a coordinate string and turn it into an (x, y) tuple."""
-        if len(coordinate) not in (2, 3):
-            raise commands.BadArgument("Invalid co-ordinate provided.")
-
         coordinate = coordinate.lower()
-        if coordinate[0].isalpha():
-            digit = coordinate[1:]
-            letter = coordinate[0]
-        else:
-            digit = coordinate[:-1]
-            letter = coordinate[-1]
-
-        if not digit.isdecimal():
-            raise commands.BadArgument
+        match = re.fullmatch(r"([a-z]{1,2})(\d{1,2})", coordinate) or re.fullmatch(r"(\d{1,2})([a-z]{1,2})", coordinate)
+        if not match:
+            raise commands.BadArgument("Invalid co-ordinate provided.")
 
-        x = ord(letter) - ord("a")
-        y = int(digit) - 1
+        letters, digits = sorted(match.groups(), key=str.isdecimal)
+        x = 0
+        for letter in letters:
+            x = x * 26 + ord(letter) - ord("a") + 1
+        x -= 1
+        y = int(digits) - 1
 
-        if (not 0 <= x <= 9) or (not 0 <= y <= 9):
+        if y < 0:
             raise commands.BadArgument
         return x, y
 
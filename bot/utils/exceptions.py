@@ -19,3 +19,11 @@ class MovedCommandError(Exception):
 
     def __init__(self, new_command_name: str):
         self.new_command_name = new_command_name
+
+
+class RenderServiceBusyError(Exception):
+    """Raised when the render service has too many jobs queued to accept another one."""
+
+
+class RenderTimeoutError(Exception):
+    """Raised when a render job doesn't finish within its timeout."""
@@ -3,6 +3,8 @@ from random import choice, randint
 from PIL import Image, ImageOps
 from pydis_core.utils.logging import get_logger
 
+from bot.utils.assets import resized_asset
+
 log = get_logger()
 
 
@@ -21,8 +23,7 @@ def pentagram(im: Image.Image) -> Image.Image:
     """Adds pentagram to the image."""
     im = im.convert("RGB")
     wt, ht = im.size
-    penta = Image.open("bot/resources/holidays/halloween/bloody-pentagram.png")
-    penta = penta.resize((wt, ht))
+    penta = resized_asset("holidays/halloween/bloody-pentagram.png", (wt, ht))
     im.paste(penta, (0, 0), penta)
     return im
 
@@ -36,10 +37,9 @@ def bat(im: Image.Image) -> Image.Image:
     """
     im = im.convert("RGB")
     wt, _ = im.size
-    bat = Image.open("bot/resources/holidays/halloween/bat-clipart.png")
     bat_size = randint(wt//10, wt//7)
     rot = randint(0, 90)
-    bat = bat.resize((bat_size, bat_size))
+    bat = resized_asset("holidays/halloween/bat-clipart.png", (bat_size, bat_size))
     bat = bat.rotate(rot)
     x = randint(wt-(bat_size * 3), wt-bat_size)
     y = randint(10, bat_size)
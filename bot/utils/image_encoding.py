@@ -0,0 +1,73 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+__all__ = ("encode_image", "image_extension")
+
+# The size generated images should aim to stay under, in bytes
+DEFAULT_MAX_BYTES = 1024 ** 2
+
+# WebP qualities to try in turn, until the image fits in the byte budget
+WEBP_QUALITIES = (90, 80, 70, 60, 50)
+
+PALETTE_MODES = ("1", "L", "P")
+MAX_PALETTE_COLOURS = 256
+
+
+def _to_palette(image: Image.Image) -> Image.Image | None:
+    """Losslessly converts `image` to palette mode, or returns None if it has too many colours to fit in one."""
+    if image.mode in PALETTE_MODES:
+        return image
+
+    image = image.convert("RGBA")
+    colours = image.getcolors(MAX_PALETTE_COLOURS)
+    if colours is None:
+        return None
+
+    # Pack each RGBA pixel into a single integer, so that it can be matched to its palette index in one go.
+    palette = np.sort(np.array([colour for _, colour in colours], dtype=np.uint8).view(np.uint32).ravel())
+    pixels = np.asarray(image).view(np.uint32)[..., 0]
+    indices = np.searchsorted(palette, pixels).astype(np.uint8)
+
+    palette_image = Image.fromarray(indices, "P")
+    palette_image.putpalette(palette.view(np.uint8).tobytes(), rawmode="RGBA")
+    return palette_image
+
+
+def encode_image(image: Image.Image, *, max_bytes: int = DEFAULT_MAX_BYTES, lossless: bool = False) -> bytes:
+    """
+    Encodes `image` in whichever format suits its content, aiming to stay within `max_bytes`.
+
+    Images with few enough colours, such as quantized or drawn images, are saved as optimised palette PNGs.
+    Anything else is saved as lossy WebP, lowering the quality until it fits within `max_bytes`,
+    or as a plain PNG if `lossless` is given.
+
+    Use `image_extension` to find out which format was picked.
+    """
+    palette_image = _to_palette(image)
+    if palette_image is not None:
+        buffer = BytesIO()
+        palette_image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    if lossless:
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    for quality in WEBP_QUALITIES:
+        buffer = BytesIO()
+        image.save(buffer, format="WEBP", quality=quality)
+        if buffer.tell() <= max_bytes:
+            break
+    return buffer.getvalue()
+
+
+def image_extension(data: bytes) -> str:
+    """Returns the file extension for image data from `encode_image`, or an animated GIF."""
+    if data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return "png"
@@ -0,0 +1,115 @@
+import asyncio
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TypeVar
+
+from pydis_core.utils.logging import get_logger
+
+from bot.constants import Render
+from bot.utils.exceptions import RenderServiceBusyError, RenderTimeoutError
+
+__all__ = ("RenderService", "render_service")
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class RenderService:
+    """
+    A bounded process pool shared by every cog that renders images with Pillow, or does other CPU heavy work.
+
+    CPU-bound work such as Pillow rendering or game tree searches holds the GIL for most of its runtime,
+    so running it on the event loop (or in a thread pool) can stall the gateway heartbeat. Jobs
+    submitted here run in separate processes instead.
+
+    At most `max_workers + max_queue` jobs are accepted at once, any further submissions
+    are rejected with `RenderServiceBusyError` rather than piling up behind the others.
+    A job which doesn't finish within its timeout raises `RenderTimeoutError`, but keeps
+    its slot until the worker process is actually done with it.
+
+    Functions and arguments given to `submit` must be picklable, which means module level
+    functions (or static methods) taking and returning plain data, bytes or `PIL.Image`s.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Return the process pool, starting it on first use."""
+        if self._executor is None:
+            log.debug(f"Starting render process pool with {self.max_workers} workers.")
+            # Forking a process with the gateway, aiohttp and Redis threads running can copy locks in a held state,
+            # so workers are forked from a clean server process instead.
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("forkserver"))
+        return self._executor
+
+    @property
+    def in_flight(self) -> int:
+        """The number of jobs which are either queued or currently running."""
+        return self._in_flight
+
+    @property
+    def busy(self) -> bool:
+        """Whether new jobs would currently be rejected."""
+        return self._in_flight >= self.max_workers + self.max_queue
+
+    def _release(self, loop: asyncio.AbstractEventLoop, _future: Future) -> None:
+        """Free up the slot taken by a job, called from the executor's management thread."""
+        loop.call_soon_threadsafe(self._decrement)
+
+    def _decrement(self) -> None:
+        self._in_flight -= 1
+
+    async def submit(self, func: Callable[..., T], *args, timeout: float | None = None) -> T:
+        """
+        Run `func(*args)` in the render pool and return its result.
+
+        `timeout` defaults to the configured per-job timeout.
+        Raises `RenderServiceBusyError` if the queue is full and `RenderTimeoutError` if the job takes too long.
+        """
+        if self.busy:
+            log.info(f"Rejecting render job {func.__qualname__}, {self._in_flight} jobs already in flight.")
+            raise RenderServiceBusyError
+
+        log.trace(f"Submitting {func.__qualname__} to the render pool.")
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(func, *args)
+        except BrokenProcessPool:
+            # A worker died abruptly (e.g. killed by the OOM killer), so the pool has to be replaced.
+            log.warning("Render process pool was broken, restarting it.")
+            self._executor = None
+            future = self.executor.submit(func, *args)
+
+        self._in_flight += 1
+        future.add_done_callback(lambda fut: self._release(loop, fut))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except TimeoutError:
+            # Only succeeds if the job hasn't started yet, a running job has to finish by itself.
+            future.cancel()
+            log.warning(f"Render job {func.__qualname__} timed out.")
+            raise RenderTimeoutError
+
+    def shutdown(self) -> None:
+        """Shut down the process pool, cancelling any queued jobs without waiting for running ones."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+render_service = RenderService(
+    max_workers=Render.max_workers,
+    max_queue=Render.max_queue,
+    timeout=Render.timeout,
+)
@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Iterable, Iterator
+
+from pydis_core.utils.logging import get_logger
+
+__all__ = ("SessionRegistry",)
+
+log = get_logger(__name__)
+
+class SessionRegistry[S: Hashable]:
+    """
+    Tracks the running sessions of a game cog, indexed by channel and player ID.
+
+    Each session can belong to at most one channel and any number of players, and each of
+    those can only be part of one session at a time, so lookups and "is this user already playing" checks
+    are dictionary lookups rather than scans over every game.
+
+    Sessions which haven't been touched for `ttl` seconds are treated as abandoned and evicted.
+    Finished sessions are kept in a history of the last `history_size`, for the cogs' logs commands.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float | None = None,
+        history_size: int = 0,
+    ):
+        self.ttl = ttl
+
+        # Sessions in order of when they were last touched, mapped to that time
+        self._active: OrderedDict[S, float] = OrderedDict()
+        self._by_channel: dict[Hashable, S] = {}
+        self._by_player: dict[Hashable, S] = {}
+        # The keys of each session in the indexes above, so they can be removed along with it
+        self._keys: dict[S, tuple[Hashable | None, set[Hashable]]] = {}
+
+        self._history: deque[S] = deque(maxlen=history_size)
+
+    def __contains__(self, session: S) -> bool:
+        self._evict_expired()
+        return session in self._active
+
+    def __iter__(self) -> Iterator[S]:
+        self._evict_expired()
+        return iter(list(self._active))
+
+    def __len__(self) -> int:
+        self._evict_expired()
+        return len(self._active)
+
+    @property
+    def history(self) -> list[S]:
+        """The most recently finished sessions, oldest first."""
+        return list(self._history)
+
+    def add(
+        self,
+        session: S,
+        *,
+        channel: Hashable | None = None,
+        players: Iterable[Hashable] = (),
+    ) -> None:
+        """
+        Start tracking `session`, indexed by the given channel and player IDs.
+
+        Raises a `ValueError` if any of them is already part of another session.
+        """
+        self._evict_expired()
+        players = set(players)
+
+        if session in self._active:
+            raise ValueError(f"Session {session!r} is already registered.")
+        if channel is not None and channel in self._by_channel:
+            raise ValueError(f"Channel {channel!r} already has a session.")
+        if busy := players & self._by_player.keys():
+            raise ValueError(f"Players {busy!r} are already in a session.")
+
+        self._active[session] = time.monotonic()
+        self._keys[session] = (channel, players)
+        if channel is not None:
+            self._by_channel[channel] = session
+        for player in players:
+            self._by_player[player] = session
+
+    def touch(self, session: S) -> None:
+        """Mark an active `session` as still in use, resetting its TTL."""
+        self._active[session] = time.monotonic()
+        self._active.move_to_end(session)
+
+    def by_channel(self, channel: Hashable) -> S | None:
+        """Return the session running in `channel`, if there is one."""
+        self._evict_expired()
+        return self._by_channel.get(channel)
+
+    def by_player(self, player: Hashable) -> S | None:
+        """Return the session `player` is part of, if there is one."""
+        self._evict_expired()
+        return self._by_player.get(player)
+
+    def is_playing(self, player: Hashable) -> bool:
+        """Whether `player` is part of an active session."""
+        return self.by_player(player) is not None
+
+    def finish(self, session: S, *, record: bool = True) -> None:
+        """
+        Stop tracking `session`, adding it to the history if `record` is True.
+
+        Does nothing if the session isn't active, such as when it has already expired.
+        """
+        if session not in self._active:
+            return
+
+        self._remove(session)
+        if record and self._history.maxlen:
+            self._history.append(session)
+
+    def _remove(self, session: S) -> None:
+        """Remove an active session from every index."""
+        del self._active[session]
+        channel, players = self._keys.pop(session)
+        if channel is not None:
+            del self._by_channel[channel]
+        for player in players:
+            del self._by_player[player]
+
+    def _evict_expired(self) -> None:
+        """Remove every session which hasn't been touched within the TTL."""
+        if self.ttl is None:
+            return
+
+        cutoff = time.monotonic() - self.ttl
+        while self._active:
+            session, last_touched = next(iter(self._active.items()))
+            if last_touched > cutoff:
+                break
+
+            log.debug(f"Evicting abandoned game session {session!r}.")
+            self._remove(session)
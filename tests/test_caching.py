@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bot.utils.caching import LRUCache, SPILL_SUBDIRECTORY
+
+
+class LRUCacheTests(unittest.TestCase):
+    """Tests for the in-memory behaviour of `LRUCache`."""
+
+    def test_oversized_value_drops_old_value(self) -> None:
+        """Setting a value too large to cache removes the key's old value rather than keeping it."""
+        cache = LRUCache(4)
+        cache.set("a", b"12")
+        cache.set("a", b"123456")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 0)
+
+
+class LRUCacheSpillTests(unittest.TestCase):
+    """Tests for spilling evicted `LRUCache` entries to disk."""
+
+    def setUp(self) -> None:
+        """Creates a spill directory which is removed after each test."""
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = Path(temporary_directory.name)
+
+    def test_only_own_files_cleared(self) -> None:
+        """Creating a cache clears what previous caches spilled, without touching anything else in the directory."""
+        (self.directory / "notes.txt").write_text("keep me")
+        (self.directory / "nested").mkdir()
+        (self.directory / "nested" / "file").write_text("keep me too")
+        old_spill = self.directory / SPILL_SUBDIRECTORY
+        old_spill.mkdir()
+        (old_spill / "stale").write_bytes(b"old entry")
+
+        LRUCache(4, spill_directory=self.directory, max_spill_size=16)
+
+        self.assertEqual((self.directory / "notes.txt").read_text(), "keep me")
+        self.assertEqual((self.directory / "nested" / "file").read_text(), "keep me too")
+        self.assertEqual(list(old_spill.iterdir()), [])
+
+    def test_evicted_entries_read_back(self) -> None:
+        """Entries evicted from memory are spilled, and read back from disk when requested."""
+        cache = LRUCache(4, spill_directory=self.directory, max_spill_size=16)
+        cache.set("a", b"1234")
+        cache.set("b", b"5678")
+
+        self.assertNotIn("a", cache._entries)
+        self.assertEqual(cache.get("a"), b"1234")
+
+    def test_oversized_value_drops_spilled_value(self) -> None:
+        """Setting a value too large to cache removes the key's old value from disk too."""
+        cache = LRUCache(4, spill_directory=self.directory, max_spill_size=16)
+        cache.set("a", b"1234")
+        cache.set("b", b"5678")
+        cache.set("a", b"123456")
+
+        self.assertNotIn("a", cache)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(list((self.directory / SPILL_SUBDIRECTORY).iterdir()), [])
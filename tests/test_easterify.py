@@ -0,0 +1,65 @@
+import unittest
+from collections.abc import Callable
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import discord
+from PIL import Image
+from discord.ext import commands
+
+from bot.exts.avatar_modification import avatar_modify
+from bot.exts.avatar_modification._effects import PfpEffects
+from bot.exts.holidays.easter import egg_decorating
+
+
+async def run_inline(func: Callable, *args, **kwargs) -> object:
+    """Stand-in for `render_service.submit`, running the job in this process."""
+    return func(*args)
+
+
+class EasterifyTests(unittest.IsolatedAsyncioTestCase):
+    """Tests for the `.easterify` command."""
+
+    def setUp(self) -> None:
+        """Sets up the cogs, with a context which invokes commands directly."""
+        self.egg_cog = egg_decorating.EggDecorating()
+        bot = MagicMock()
+        bot.get_command.return_value = self.egg_cog.eggdecorate
+        bot.fetch_user = AsyncMock()
+        self.cog = avatar_modify.AvatarModify(bot)
+
+        self.ctx = MagicMock()
+        self.ctx.send = AsyncMock()
+        self.ctx.author.display_name = "Tester"
+
+        async def invoke(command: commands.Command, *args) -> object:
+            return await command.callback(command.cog, self.ctx, *args)
+
+        self.ctx.invoke = invoke
+
+    async def easterify(self, *colours: discord.Colour | str) -> AsyncMock:
+        """Runs `.easterify` with the given colours, returning the mocked `_apply_effect`."""
+        apply_effect = AsyncMock(return_value=MagicMock(filename="easterified_avatar.png"))
+        with (
+            patch.object(egg_decorating.render_service, "submit", run_inline),
+            patch.object(self.cog, "_apply_effect", apply_effect),
+        ):
+            await self.cog.avatareasterify.callback(self.cog, self.ctx, *colours)
+        return apply_effect
+
+    async def test_colours_give_egg_overlay(self) -> None:
+        """The egg decorated with the given colours is passed to the easter effect, and isn't cached."""
+        apply_effect = await self.easterify(discord.Colour.red(), discord.Colour.blue())
+
+        apply_effect.assert_awaited_once()
+        args, kwargs = apply_effect.call_args
+        self.assertIs(args[2], PfpEffects.easterify_effect)
+        self.assertIsInstance(args[3], Image.Image)
+        self.assertFalse(kwargs["cacheable"])
+
+    async def test_no_colours_give_default_overlay(self) -> None:
+        """Without colours, the easter effect uses its default bunny, and the result is cached."""
+        apply_effect = await self.easterify()
+
+        args, kwargs = apply_effect.call_args
+        self.assertIsNone(args[3])
+        self.assertTrue(kwargs["cacheable"])
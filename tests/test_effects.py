@@ -0,0 +1,57 @@
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+from bot.exts.avatar_modification import _effects
+from bot.exts.avatar_modification._effects import PfpEffects
+
+
+def noisy_gif(frame_count: int, size: int) -> bytes:
+    """An animated GIF of random noise, about the worst case there is for the GIF encoder."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(frame_count):
+        # Built as palette images, so that saving them doesn't have to quantize them
+        frame = Image.fromarray(rng.integers(0, 256, (size, size), dtype=np.uint8), "P")
+        frame.putpalette(rng.integers(0, 256, 256 * 3, dtype=np.uint8).tobytes())
+        frames.append(frame)
+    buffer = BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=80, loop=0)
+    return buffer.getvalue()
+
+
+class AnimatedEffectsTests(unittest.TestCase):
+    """Tests for applying the avatar effects to animated avatars."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Builds the source animation once, as it's shared by every test."""
+        cls.noise = noisy_gif(30, 512)
+
+    def test_noise_stays_within_budget(self) -> None:
+        """A noisy animation is scaled down until it fits in `MAX_GIF_BYTES`, keeping all of its frames."""
+        result, _ = PfpEffects.apply_effects_animated(self.noise, [(PfpEffects.flip_effect, ())])
+
+        self.assertLessEqual(len(result), _effects.MAX_GIF_BYTES)
+        gif = Image.open(BytesIO(result))
+        self.assertEqual(gif.n_frames, 30)
+        self.assertGreaterEqual(gif.width, _effects.MIN_GIF_SIZE)
+
+    def test_frames_dropped_past_minimum_size(self) -> None:
+        """Frames are dropped once the animation can't be scaled down any further, keeping its total duration."""
+        with patch.object(_effects, "MAX_GIF_BYTES", 256 * 1024):
+            result, _ = PfpEffects.apply_effects_animated(self.noise, [(PfpEffects.flip_effect, ())])
+
+        self.assertLessEqual(len(result), 256 * 1024)
+        gif = Image.open(BytesIO(result))
+        self.assertEqual(gif.size, (_effects.MIN_GIF_SIZE, _effects.MIN_GIF_SIZE))
+        self.assertLess(gif.n_frames, 30)
+
+        durations = []
+        for index in range(gif.n_frames):
+            gif.seek(index)
+            durations.append(gif.info["duration"])
+        self.assertEqual(sum(durations), 30 * 80)
@@ -0,0 +1,92 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis import RedisError
+
+from bot.exts.fun import trivia_quiz
+from bot.exts.fun._trivia_question_bank import QuestionBank
+
+ARTICLES = [{"normalizedtitle": "Python", "extract": "Python is a programming language."}]
+
+
+def feed_response(json: AsyncMock) -> MagicMock:
+    """A stand-in for the `http_session.get` context manager, with a 200 response whose body is read by `json`."""
+    response = MagicMock(status=200, json=json)
+    context_manager = MagicMock()
+    context_manager.__aenter__ = AsyncMock(return_value=response)
+    context_manager.__aexit__ = AsyncMock(return_value=False)
+    return context_manager
+
+
+class WikipediaQuestionsTests(unittest.IsolatedAsyncioTestCase):
+    """Tests for keeping the Wikipedia questions up to date through feed and Redis errors."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates the cog with its loop cancelled before it runs, and a stand-in for the Redis snapshot."""
+        self.cog = trivia_quiz.TriviaQuiz(MagicMock())
+        self.cog.cog_unload()
+        self.cog.wiki_snapshot = MagicMock(get=AsyncMock(return_value=None), set=AsyncMock())
+
+        retry_delay = patch.object(trivia_quiz, "WIKI_RETRY_BASE_DELAY", 0)
+        retry_delay.start()
+        self.addCleanup(retry_delay.stop)
+
+    async def test_malformed_feed_retried(self) -> None:
+        """A feed body which isn't valid JSON is retried instead of escaping the loop."""
+        json = AsyncMock(side_effect=[ValueError("Expecting value"), {"mostread": {"articles": ARTICLES}}])
+        self.cog.bot.http_session.get.return_value = feed_response(json)
+
+        self.assertEqual(await self.cog.fetch_wiki_articles("2026/10/16"), ARTICLES)
+        self.assertEqual(json.await_count, 2)
+
+    async def test_snapshot_write_failure_keeps_questions(self) -> None:
+        """Failing to snapshot freshly fetched questions still serves them."""
+        self.cog.bot.http_session.get.return_value = feed_response(
+            AsyncMock(return_value={"mostread": {"articles": ARTICLES}})
+        )
+        self.cog.wiki_snapshot.set.side_effect = RedisError("Connection refused")
+
+        await self.cog.get_wiki_questions()
+
+        self.assertIn("wikipedia", self.cog.questions)
+        self.assertIn("wikipedia", self.cog.categories)
+
+    async def test_snapshot_read_failure_still_fetches(self) -> None:
+        """Failing to read the snapshot falls through to fetching the feed."""
+        self.cog.bot.http_session.get.return_value = feed_response(
+            AsyncMock(return_value={"mostread": {"articles": ARTICLES}})
+        )
+        self.cog.wiki_snapshot.get.side_effect = RedisError("Connection refused")
+
+        await self.cog.get_wiki_questions()
+
+        self.assertIn("wikipedia", self.cog.questions)
+
+
+class QuizCategoryTests(unittest.IsolatedAsyncioTestCase):
+    """Tests for choosing the category of a quiz game."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates the cog with its loop cancelled, and a question file with only a general category."""
+        self.cog = trivia_quiz.TriviaQuiz(MagicMock())
+        self.cog.cog_unload()
+
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        path = Path(temporary_directory.name, "trivia_quiz.json")
+        path.write_text(json.dumps({"general": [{"id": 1, "question": "1 + 1?", "answer": "2"}]}))
+        self.cog.questions = QuestionBank(path)
+
+        self.ctx = MagicMock()
+        self.ctx.send = AsyncMock()
+
+    async def test_category_missing_from_file(self) -> None:
+        """A described category which is no longer in the question file shows the categories instead of failing."""
+        await self.cog.quiz_game.callback(self.cog, self.ctx, "retro", None)
+
+        self.ctx.send.assert_awaited_once()
+        self.assertEqual(self.ctx.send.call_args.kwargs["embed"].title, self.cog.category_embed().title)
+        self.assertFalse(self.cog.game_status[self.ctx.channel.id])
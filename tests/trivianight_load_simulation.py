@@ -0,0 +1,231 @@
+"""
+An offline load test of the Trivia Night answer buttons.
+
+Synthetic players click the buttons of a question through stand-ins for `discord.Interaction`, spread over the time
+the question is open, and the question is then ended onto a scoreboard. Nothing connects to Discord, so this can run
+in CI, with the per-click latency percentiles and the event loop lag logged as a report:
+
+    python -m tests.trivianight_load_simulation --players 500 --window 5
+
+It fails if any player didn't get a response or wasn't scored. Latencies depend on the machine it runs on, so they're
+only checked against a limit if `--max-p99` is given.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+
+from discord import Embed
+from pydis_core.utils.logging import get_logger
+
+from bot.exts.events.trivianight._game import QuestionData, TriviaNightGame
+from bot.exts.events.trivianight._questions import QuestionView
+from bot.exts.events.trivianight._scoreboard import Scoreboard
+
+log = get_logger(__name__)
+
+QUESTION: QuestionData = {
+    "number": "1",
+    "description": "Which of these is a Python web framework?",
+    "answers": ["Django", "Rails", "Laravel", "Spring"],
+    "correct": "Django",
+    "points": 10,
+    "time": 20,
+}
+
+# How often the event loop lag is sampled
+LAG_SAMPLE_INTERVAL = 0.01  # seconds
+
+
+@dataclass
+class User:
+    """Stand-in for the user who clicked a button."""
+
+    id: int
+    mention: str = ""
+
+
+@dataclass
+class InteractionResponse:
+    """Stand-in for `discord.InteractionResponse`, taking `delay` seconds to respond like a request to Discord would."""
+
+    delay: float
+    sent: list[Embed] = field(default_factory=list)
+    called_at: float | None = None
+
+    async def send_message(self, *, embed: Embed, ephemeral: bool = False) -> None:
+        """Wait for the simulated request to Discord, then record the embed that was sent."""
+        self.called_at = time.perf_counter()
+        await asyncio.sleep(self.delay)
+        self.sent.append(embed)
+
+
+@dataclass
+class Interaction:
+    """Stand-in for `discord.Interaction`, with only what the answer buttons use."""
+
+    user: User
+    response: InteractionResponse
+
+
+class Bot:
+    """Stand-in for the bot, with only what the scoreboard uses."""
+
+    async def fetch_user(self, user_id: int) -> User:
+        """Return a user without fetching them from Discord."""
+        return User(user_id, f"<@{user_id}>")
+
+
+@dataclass
+class Click:
+    """A click of an answer button by a synthetic player, `at` seconds after the question started."""
+
+    player: int
+    label: str
+    at: float
+
+
+def make_clicks(players: int, window: float, change_chance: float, rng: random.Random) -> list[Click]:
+    """
+    Make each player click a random answer at a random time within `window` seconds.
+
+    Players have a `change_chance` chance of clicking again later, and the same chance of a third click after that,
+    which the question will reject as they can only change their answer once.
+    """
+    labels = [chr(ord("A") + i) for i in range(len(QUESTION["answers"]))]
+    clicks = []
+    for player in range(players):
+        at = rng.uniform(0, window)
+        clicks.append(Click(player, rng.choice(labels), at))
+        for _ in range(2):
+            if rng.random() >= change_chance:
+                break
+            at = rng.uniform(at, window)
+            clicks.append(Click(player, rng.choice(labels), at))
+    return sorted(clicks, key=lambda click: click.at)
+
+
+async def sample_lag(lags: list[float], stop: asyncio.Event) -> None:
+    """Record how late the event loop wakes up from sleeping `LAG_SAMPLE_INTERVAL` seconds, until `stop` is set."""
+    while not stop.is_set():
+        expected = time.perf_counter() + LAG_SAMPLE_INTERVAL
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        lags.append(time.perf_counter() - expected)
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """The median, 90th, 99th percentile and maximum of `samples`, in milliseconds."""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p90": cuts[89] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(samples) * 1000,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    """Run one question of the load test, returning the latency percentiles of each stage."""
+    rng = random.Random(args.seed)
+    clicks = make_clicks(args.players, args.window, args.change_chance, rng)
+
+    game = TriviaNightGame([QUESTION])
+    question = game.next_question()
+    view = QuestionView(question)
+    buttons = {button.label: button for button in view.children}
+    responded = set()
+
+    # Clicks are handled concurrently, as discord.py dispatches each interaction in its own task.
+    in_flight = asyncio.Semaphore(args.concurrency)
+    callback_times = []
+    click_latencies = []
+
+    async def handle(click: Click, started: float) -> None:
+        await asyncio.sleep(max(0.0, started + click.at - time.perf_counter()))
+        arrived = time.perf_counter()
+        async with in_flight:
+            response = InteractionResponse(args.response_delay)
+            callback_started = time.perf_counter()
+            await buttons[click.label].callback(Interaction(User(click.player), response))
+            done = time.perf_counter()
+        if response.sent:
+            responded.add(click.player)
+        # The time spent in the bot's own code, up to sending the response
+        callback_times.append(response.called_at - callback_started)
+        click_latencies.append(done - arrived)
+
+    lags = []
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(lags, stop_sampling))
+
+    started = question.start()
+    await asyncio.gather(*(handle(click, started) for click in clicks))
+
+    scoreboard = Scoreboard(Bot())
+    end_started = time.perf_counter()
+    view.end_question(scoreboard)
+    game.end_question()
+    end_time = time.perf_counter() - end_started
+
+    display_started = time.perf_counter()
+    await scoreboard.display(speed_leaderboard=True)
+    display_time = time.perf_counter() - display_started
+
+    stop_sampling.set()
+    await sampler
+
+    if len(responded) != args.players or len(scoreboard.points) != args.players:
+        raise RuntimeError(
+            f"{args.players} players clicked, but {len(responded)} got a response "
+            f"and {len(scoreboard.points)} were scored."
+        )
+
+    log.info(f"{len(clicks)} clicks by {args.players} players over {args.window}s, at most {args.concurrency} at once.")
+    log.info(f"Ending the question took {end_time * 1000:.2f}ms, and the scoreboard {display_time * 1000:.2f}ms.")
+    return {
+        "click latency": percentiles(click_latencies),
+        "callback time": percentiles(callback_times),
+        "event loop lag": percentiles(lags),
+    }
+
+
+def main() -> None:
+    """Run the load test from the command line, exiting with an error if the p99 click latency is over the limit."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=500, help="how many players click (default: %(default)s)")
+    parser.add_argument(
+        "--window", type=float, default=5, help="seconds the clicks are spread over (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=1000, help="the most clicks handled at once (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--response-delay", type=float, default=0.05,
+        help="seconds each response to Discord takes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--change-chance", type=float, default=0.2,
+        help="chance of a player clicking again (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="seed for the synthetic clicks")
+    parser.add_argument(
+        "--max-p99", type=float, default=None, help="fail if the p99 click latency is over this many milliseconds"
+    )
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    lines = [f"{'':<16}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)"]
+    for name, stats in report.items():
+        lines.append(f"{name:<16}" + "".join(f"{value:>10.3f}" for value in stats.values()))
+    log.info("Latencies:\n" + "\n".join(lines))
+
+    if args.max_p99 is not None and report["click latency"]["p99"] > args.max_p99:
+        sys.exit(f"p99 click latency is over the limit of {args.max_p99}ms.")
+
+
+if __name__ == "__main__":
+    main()